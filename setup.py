@@ -35,7 +35,13 @@ import os
 PYTHON_CACHE = "__pycache__"
 sys.path.append(os.path.join(sys.path[0], 'src', 'main', 'python'))
 sys.path.append(os.path.join(sys.path[0], 'src', 'test', 'python'))
-from webtest import urilibtest, assertiontest, itest, curilibtest
+from webtest import urilibtest, assertiontest, itest, curilibtest, uribatchtest, querylibtest, \
+    uritemplatetest, urimaptest, codectest, uriiotest, pooltest, streamtest, bodytest, \
+    asynctest, requestbatchtest, httpcachetest, decodingtest, retrytest, \
+    hedgingtest, resolvertest
+from webbench import urilibbench, uribatchbench, uritemplatebench, urimapbench, codecbench, uriiobench, \
+    asyncbench, requestbatchbench, httpcachebench, decodingbench, hedgingbench, \
+    resolverbench
 from webtest.webserver import DEFAULT_PORT_NUMBER
 
 MANIFEST_FILE_NAME = "MANIFEST"
@@ -47,8 +53,37 @@ VERSION = '1.0-SNAPSHOT'
 TEST_MODULES = [urilibtest,
                 assertiontest,
                 curilibtest,
+                uribatchtest,
+                querylibtest,
+                uritemplatetest,
+                urimaptest,
+                codectest,
+                uriiotest,
+                pooltest,
+                streamtest,
+                bodytest,
+                asynctest,
+                requestbatchtest,
+                httpcachetest,
+                decodingtest,
+                retrytest,
+                hedgingtest,
+                resolvertest,
                 ]
 ITEST_MODULES = [itest]
+BENCH_MODULES = [urilibbench,
+                 uribatchbench,
+                 uritemplatebench,
+                 urimapbench,
+                 codecbench,
+                 uriiobench,
+                 asyncbench,
+                 requestbatchbench,
+                 httpcachebench,
+                 decodingbench,
+                 hedgingbench,
+                 resolverbench,
+                 ]
 
 class DistutilsTestError(DistutilsError):
     """Unable to complite the test without errors."""
@@ -202,6 +237,22 @@ def test(test_modules=TEST_MODULES, message="running tests"):
         raise DistutilsTestError('Exit due to a test error!')
 
 
+class Bench(Command):
+    description = "Launch the micro benchmarks"
+    user_options = []
+
+    def initialize_options(self):
+        pass
+
+    def finalize_options(self):
+        pass
+
+    def run(self):
+        for module in BENCH_MODULES:
+            log.info("running benchmark %s", module.__name__)
+            module.main()
+
+
 class Verify(Command):
     description = "Verify package by running the integration tests agains a local http server"
     user_options = [
@@ -250,7 +301,7 @@ class build_scripts(_build_scripts):
 #cmdclass={'build_py': build_py}, used to test.
 setup(
     cmdclass={'build_py': build_py, 'build_scripts': build_scripts, 'clean': Clean, 'deploy': Deploy, 'verify': Verify,
-              'test': Test},
+              'test': Test, 'bench': Bench},
     name='curi',
     version=VERSION,
     description='URI manipulation',
@@ -38,16 +38,119 @@ FRAGMENT_SEPARATOR = "#"
 USER_INFO_SEPARATOR = "@"
 PORT_SEPARATOR = ":"
 
+# Default number of parsed URI instances kept by the parse cache.
+DEFAULT_URI_CACHE_SIZE = 4096
+
 def uri(uri):
     from web.urilib import _uri
 
     return _uri(uri)
 
 
-def request(uri, method=HTTP_GET, body=None, headers=None):
+def uri_batch(uris):
+    """
+    Parses an iterable of URI strings into a columnar web.uribatch.URIBatch table.
+    """
+    from web.uribatch import URIBatch
+
+    return URIBatch(uris)
+
+
+def query_params(query=None, separator="&"):
+    """
+    Creates a web.querylib.QueryParams multi-dict from an encoded query string,
+    a mapping or an iterable of (key, value) pairs.
+    """
+    from web.querylib import QueryParams
+
+    return QueryParams(query, separator)
+
+
+def uri_template(pattern):
+    """
+    Compiles an RFC 6570 URI template, see web.uritemplate.URITemplate.
+    """
+    from web.uritemplate import URITemplate
+
+    return URITemplate(pattern)
+
+
+def uri_map(rules=None):
+    """
+    Creates a web.urimap.URIMap indexing the given (rule, value) pairs for longest-prefix matching.
+    """
+    from web.urimap import URIMap
+
+    return URIMap(rules)
+
+
+def uri_set(rules=None):
+    """
+    Creates a web.urimap.URISet of the given prefix rules.
+    """
+    from web.urimap import URISet
+
+    return URISet(rules)
+
+
+def dump_uris(uris):
+    """
+    Returns the bytes of a flat buffer holding the given URIs, see web.uriio.
+    """
+    from web.uriio import dump_uris
+
+    return dump_uris(uris)
+
+
+def load_uris(buffer):
+    """
+    Returns the list of the URIs held by a buffer returned by dump_uris, see web.uriio.
+    """
+    from web.uriio import load_uris
+
+    return load_uris(buffer)
+
+
+def set_uri_cache(maxsize=DEFAULT_URI_CACHE_SIZE):
+    """
+    Enable the parse cache used by web.uri() and bound it to maxsize entries.
+    When maxsize is None or lower than 1 the cache is disabled.
+    """
+    from web.urilib import _set_uri_cache
+
+    _set_uri_cache(maxsize)
+
+
+def uri_cache_info():
+    """
+    Returns the statistics of the parse cache as a URICacheInfo named tuple
+    (hits, misses, evictions, maxsize, currsize) or None if the cache is disabled.
+    """
+    from web.urilib import _uri_cache_info
+
+    return _uri_cache_info()
+
+
+def request(uri, method=HTTP_GET, body=None, headers=None, stream=False):
+    """
+    Sends a request with the current request handler. If stream is True the body
+    of the response is read on demand, see web.urilib.Response. The body of the
+    request can be a file, a buffer or an iterable of chunks which are sent
+    without being loaded in memory, see web.body.send_request.
+    """
     from web.urilib import _request
 
-    return _request(uri, method, headers, body)
+    return _request(uri, method, headers, body, stream)
+
+
+def request_many(requests, max_workers=10, per_host_limit=None, ordered=False):
+    """
+    Sends the given requests concurrently with the current request handler and
+    returns the iterator of their results, see web.requestbatch.request_many.
+    """
+    from web.requestbatch import request_many
+
+    return request_many(requests, max_workers, per_host_limit, ordered)
 
 
 def set_request_handler(request_handler):
@@ -55,3 +158,19 @@ def set_request_handler(request_handler):
 
     _set_request_handler(request_handler)
 
+
+
+async def arequest(uri, method=HTTP_GET, body=None, headers=None, stream=False):
+    """
+    Sends a request with the current asynchronous request handler and returns
+    its web.urilib.Response, see web.asynclib.AsyncHttpRequestHandler.
+    """
+    from web.asynclib import _arequest
+
+    return await _arequest(uri, method, headers, body, stream)
+
+
+def set_async_request_handler(request_handler):
+    from web.asynclib import _set_async_request_handler
+
+    _set_async_request_handler(request_handler)
@@ -0,0 +1,718 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+HTTP/1.1 requests over asyncio streams.
+
+The AsyncHttpRequestHandler keeps its connections in an AsyncConnectionPool,
+bounded per (scheme, host, port) like web.pool.ConnectionPool, and returns
+the same web.urilib.Response as the blocking handler. The body of a streamed
+response is read with the coroutines aread, aiter_bytes and aiter_lines:
+
+    async with await arequest(export_uri, stream=True) as response:
+        async for chunk in response.aiter_bytes():
+            output.write(chunk)
+
+A pool belongs to the event loop running its checkouts: when it is used from
+another loop, the connections opened by the previous one are dropped.
+"""
+import asyncio
+from collections import deque
+from email.parser import Parser
+from http.client import HTTPMessage, RemoteDisconnected, BadStatusLine, IncompleteRead, InvalidURL, \
+    _contains_disallowed_method_pchar_re, _contains_disallowed_url_pchar_re, _is_legal_header_name, \
+    _is_illegal_header_value
+import ssl
+from time import monotonic
+from .assertion import assert_that_argument_type_is, raise_illegal_argument
+from .body import BodyLengthError, body_length, _view, _regular_file_size, CONTENT_LENGTH, TRANSFER_ENCODING, \
+    CHUNKED, DEFAULT_CHUNK_SIZE, SMALL_CHUNK_SIZE
+from .pool import PoolStatistics, PoolExhaustedError, DEFAULT_MAX_SIZE, DEFAULT_IDLE_TIMEOUT, HTTPS_SCHEME
+from .decoding import content_decoder
+from .resolver import DEFAULT_CONNECTION_ATTEMPT_DELAY
+from .retry import RetryStatistics, NO_RETRY, STALE_CONNECTION_ERRORS, RETRY_AFTER, rewinder
+from .urilib import Response, _uri, _request_target, _accept_encoding, DEFAULT_PORTS
+from web import HTTP_GET as GET, HTTP_HEAD, HTTP_POST, HTTP_PUT
+
+__author__ = 'Romain Gilles'
+
+HTTP_VERSIONS = {"HTTP/1.1": 11, "HTTP/1.0": 10}
+# the methods sending Content-Length: 0 without body, as http.client
+_METHODS_EXPECTING_BODY = frozenset((HTTP_POST, HTTP_PUT, "PATCH"))
+_NO_BODY_STATUSES = frozenset((204, 304))
+_SWITCHING_PROTOCOLS = 101
+# the interim responses are 1xx
+_FIRST_FINAL_STATUS = 200
+
+_CRLF = b"\r\n"
+_LAST_CHUNK = b"0\r\n\r\n"
+_HEADER_ENCODING = "iso-8859-1"
+
+
+class _AsyncConnection(object):
+    __slots__ = 'key', 'reader', 'writer', 'created', 'released', 'checkouts'
+
+    def __init__(self, key, reader, writer, created):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.created = created
+        self.released = created
+        self.checkouts = 0
+
+    def is_dropped(self):
+        """
+        Returns True if the peer closed this idle connection.
+        """
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    def close(self):
+        try:
+            self.writer.close()
+        except RuntimeError:
+            # the event loop of the connection is closed
+            pass
+
+
+class _AsyncHostPool(object):
+    __slots__ = 'idle', 'in_use', 'waiters'
+
+    def __init__(self):
+        # LIFO stack of the idle connections, the most recently released last
+        self.idle = []
+        self.in_use = 0
+        # futures of the checkouts waiting for a connection, first in first served
+        self.waiters = deque()
+
+
+class AsyncConnectionPool(object):
+    """
+    Bounded pool of asyncio stream connections per (scheme, host, port).
+
+    A checkout returns the most recently released idle connection of the key,
+    after dropping the ones closed by the peer or expired, or opens a new one
+    while the key has less than max_size connections. Otherwise it waits for a
+    connection to be released, until the timeout if any. The release is not a
+    coroutine, it can be called from a callback.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, timeout=None, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 max_lifetime=None, connection_timeout=None, ssl_context=None, clock=monotonic):
+        """
+        @param max_size the maximum number of connections, idle and checked out, per key.
+        @param timeout the default maximum time in seconds a checkout waits, None to wait forever.
+        @param idle_timeout the time in seconds after which an idle connection is closed, None to keep it.
+        @param max_lifetime the time in seconds after its creation a connection is closed, None to keep it.
+        @param connection_timeout the maximum time in seconds to open a connection, None to wait forever.
+        @param ssl_context the SSLContext of the https connections, ssl.create_default_context() if None.
+        """
+        if max_size < 1:
+            raise_illegal_argument("max_size must be positive: {0}".format(max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.connection_timeout = connection_timeout
+        self.__ssl_context = ssl_context
+        self.__clock = clock
+        self.__loop = None
+        self.__hosts = {}
+        # host pools of the checked out connections
+        self.__checked_out = {}
+        self.__created = 0
+        self.__reused = 0
+        self.__dropped = 0
+        self.__expired = 0
+        self.__waits = 0
+        self.__timeouts = 0
+
+    @property
+    def ssl_context(self):
+        """
+        The SSLContext of the https connections, the default one is only created
+        for the first https connection.
+        """
+        if self.__ssl_context is None:
+            self.__ssl_context = ssl.create_default_context()
+        return self.__ssl_context
+
+    def __check_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self.__loop:
+            self.clear()
+            self.__hosts = {}
+            self.__checked_out = {}
+            self.__loop = loop
+        return loop
+
+    def __is_expired(self, connection, now):
+        if self.max_lifetime is not None and now - connection.created >= self.max_lifetime:
+            return True
+        return self.idle_timeout is not None and now - connection.released >= self.idle_timeout
+
+    def __check_out(self, host_pool, connection):
+        host_pool.in_use += 1
+        connection.checkouts += 1
+        self.__checked_out[connection] = host_pool
+        return connection
+
+    async def __open(self, key):
+        scheme, host, port = key
+        # the event loop races the addresses of the dual-stack servers as the web.resolver.Connector
+        if scheme == HTTPS_SCHEME:
+            opening = asyncio.open_connection(host, port, ssl=self.ssl_context, server_hostname=host,
+                                              happy_eyeballs_delay=DEFAULT_CONNECTION_ATTEMPT_DELAY, interleave=1)
+        else:
+            opening = asyncio.open_connection(host, port, happy_eyeballs_delay=DEFAULT_CONNECTION_ATTEMPT_DELAY,
+                                              interleave=1)
+        if self.connection_timeout is not None:
+            opening = asyncio.wait_for(opening, self.connection_timeout)
+        reader, writer = await opening
+        return _AsyncConnection(key, reader, writer, self.__clock())
+
+    async def acquire(self, scheme, host, port, timeout=None):
+        """
+        Checks out a connection to the given server.
+
+        @param timeout None for the default timeout of the pool.
+        @exception PoolExhaustedError if no connection is released before the timeout.
+        """
+        loop = self.__check_loop()
+        key = scheme, host, port
+        timeout = self.timeout if timeout is None else timeout
+        host_pool = self.__hosts.get(key)
+        if host_pool is None:
+            host_pool = self.__hosts[key] = _AsyncHostPool()
+        deadline = None
+        while True:
+            now = self.__clock()
+            while host_pool.idle:
+                connection = host_pool.idle.pop()
+                if self.__is_expired(connection, now):
+                    self.__expired += 1
+                elif connection.is_dropped():
+                    self.__dropped += 1
+                else:
+                    self.__reused += 1
+                    return self.__check_out(host_pool, connection)
+                connection.close()
+            if host_pool.in_use < self.max_size:
+                # the slot is taken while the connection is opened
+                host_pool.in_use += 1
+                try:
+                    connection = await self.__open(key)
+                except BaseException:
+                    host_pool.in_use -= 1
+                    self.__notify(host_pool)
+                    raise
+                host_pool.in_use -= 1
+                self.__created += 1
+                return self.__check_out(host_pool, connection)
+            if deadline is None:
+                self.__waits += 1
+                deadline = float("inf") if timeout is None else monotonic() + timeout
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                self.__timeouts += 1
+                raise PoolExhaustedError(key)
+            waiter = loop.create_future()
+            host_pool.waiters.append(waiter)
+            try:
+                await (waiter if timeout is None else asyncio.wait_for(waiter, remaining))
+            except asyncio.TimeoutError:
+                self.__timeouts += 1
+                raise PoolExhaustedError(key) from None
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    # the connection released to this cancelled checkout goes to the next one
+                    self.__notify(host_pool)
+                raise
+            finally:
+                if not waiter.done():
+                    waiter.cancel()
+
+    @staticmethod
+    def __notify(host_pool):
+        waiters = host_pool.waiters
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def release(self, connection, reusable=True):
+        """
+        Returns a checked out connection to the pool. A connection which is not
+        reusable (response not read, connection: close, error...) is closed.
+        """
+        host_pool = self.__checked_out.pop(connection, None)
+        if host_pool is None:
+            # checked out before the pool moved to another event loop
+            connection.close()
+            return
+        host_pool.in_use -= 1
+        now = self.__clock()
+        connection.released = now
+        if reusable and not self.__is_expired(connection, now):
+            host_pool.idle.append(connection)
+        else:
+            if reusable:
+                self.__expired += 1
+            connection.close()
+        self.__notify(host_pool)
+
+    def clear(self):
+        """
+        Closes the idle connections. The checked out connections are not
+        affected and the pool stays usable.
+        """
+        for host_pool in self.__hosts.values():
+            idle, host_pool.idle = host_pool.idle, []
+            for connection in idle:
+                connection.close()
+
+    def statistics(self):
+        """
+        Returns the web.pool.PoolStatistics of this pool.
+        """
+        return PoolStatistics(self.__created, self.__reused, self.__dropped, self.__expired, self.__waits,
+                              self.__timeouts, len(self.__checked_out),
+                              sum(len(host_pool.idle) for host_pool in self.__hosts.values()))
+
+
+class _AsyncBody(object):
+    """
+    Body of a response read from an asyncio stream: Content-Length delimited,
+    chunked, or delimited by the end of the connection.
+    """
+    __slots__ = '__reader', '__remaining', '__chunked', '__done', 'will_close'
+
+    def __init__(self, reader, length, chunked, will_close):
+        """
+        @param length the length of the body, None if chunked or read until the end of the connection.
+        """
+        self.__reader = reader
+        self.__remaining = 0 if chunked else length
+        self.__chunked = chunked
+        self.__done = length == 0 and not chunked
+        self.will_close = will_close
+
+    def isclosed(self):
+        """
+        Returns True once the body is consumed, the name of http.client.HTTPResponse.
+        """
+        return self.__done
+
+    def close(self):
+        self.__done = True
+
+    def read(self, size=-1):
+        raise RuntimeError("the body of an asynchronous response is read with aread, aiter_bytes or aiter_lines")
+
+    readinto = read
+
+    async def __next_chunk(self):
+        """
+        Reads the size line of the next chunk, the trailer after the last one.
+        """
+        line = await self.__reader.readline()
+        try:
+            size = int(line.split(b";", 1)[0], 16)
+        except ValueError:
+            raise IncompleteRead(b"") from None
+        if not size:
+            while True:
+                line = await self.__reader.readline()
+                if line in (_CRLF, b"\n", b""):
+                    break
+            self.__done = True
+        self.__remaining = size
+
+    async def __read_all(self):
+        reader = self.__reader
+        if not self.__chunked:
+            if self.__remaining is None:
+                data = await reader.read()
+            else:
+                data = await self.__read_exactly(self.__remaining)
+            self.__done = True
+            return data
+        parts = []
+        while True:
+            if not self.__remaining:
+                await self.__next_chunk()
+                if self.__done:
+                    return b"".join(parts)
+            parts.append(await self.__read_exactly(self.__remaining))
+            await self.__read_exactly(len(_CRLF))
+            self.__remaining = 0
+
+    async def __read_exactly(self, size):
+        try:
+            return await self.__reader.readexactly(size)
+        except asyncio.IncompleteReadError as error:
+            raise IncompleteRead(error.partial, error.expected - len(error.partial)) from None
+
+    async def aread(self, size=-1):
+        if self.__done:
+            return b""
+        if size < 0:
+            return await self.__read_all()
+        if not size:
+            return b""
+        if self.__chunked and not self.__remaining:
+            await self.__next_chunk()
+            if self.__done:
+                return b""
+        remaining = self.__remaining
+        data = await self.__reader.read(size if remaining is None else min(size, remaining))
+        if remaining is None:
+            self.__done = not data
+            return data
+        if not data:
+            raise IncompleteRead(b"", remaining)
+        self.__remaining = remaining - len(data)
+        if not self.__remaining:
+            if self.__chunked:
+                await self.__read_exactly(len(_CRLF))
+            else:
+                self.__done = True
+        return data
+
+
+def _host_header(host, port, scheme):
+    host = host.encode("idna").decode("ascii")
+    if ":" in host:
+        host = "[{0}]".format(host)
+    return host if port == DEFAULT_PORTS.get(scheme) else "{0}:{1}".format(host, port)
+
+
+async def _write(writer, view, chunked):
+    if not chunked:
+        writer.write(view)
+    elif view.nbytes <= SMALL_CHUNK_SIZE:
+        writer.write(b"".join((b"%X\r\n" % view.nbytes, view, _CRLF)))
+    else:
+        writer.write(b"%X\r\n" % view.nbytes)
+        writer.write(view)
+        writer.write(_CRLF)
+    # the transport buffers what the socket does not take, at most one chunk
+    await writer.drain()
+
+
+async def _write_file(writer, file, length, chunked, chunk_size):
+    if length and not chunked and _regular_file_size(file) is not None:
+        # os.sendfile on plain connections, chunks read by the loop over TLS; the file position is updated
+        sent = await asyncio.get_running_loop().sendfile(writer.transport, file, file.tell(), length)
+        if sent < length:
+            raise BodyLengthError(length, sent)
+        return
+    remaining = length
+    while remaining is None or remaining > 0:
+        data = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+        if not data:
+            if remaining is not None:
+                raise BodyLengthError(length, length - remaining)
+            break
+        await _write(writer, memoryview(data), chunked)
+        if remaining is not None:
+            remaining -= len(data)
+
+
+async def _write_chunks(writer, chunks, chunked):
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            await _write_chunk(writer, chunk, chunked)
+    else:
+        for chunk in chunks:
+            await _write_chunk(writer, chunk, chunked)
+
+
+async def _write_chunk(writer, chunk, chunked):
+    if isinstance(chunk, str):
+        chunk = chunk.encode(_HEADER_ENCODING)
+    view = _view(chunk)
+    if view is None:
+        raise_illegal_argument("a body chunk must be bytes or a buffer: {0!r}".format(chunk))
+    if view:
+        await _write(writer, view, chunked)
+
+
+def _validate_head(method, target, host, headers):
+    """
+    Checks the request line and the headers as http.client does, against the
+    injection of a line by a control character.
+
+    @exception ValueError if the method, a header name or value is not valid.
+    @exception InvalidURL if the target or the host holds a control character or a space.
+    """
+    match = _contains_disallowed_method_pchar_re.search(method)
+    if match:
+        raise ValueError("method can't contain control characters. {0!r} (found at least {1!r})"
+                         .format(method, match.group()))
+    for url in (target, host):
+        match = _contains_disallowed_url_pchar_re.search(url)
+        if match:
+            raise InvalidURL("URL can't contain control characters. {0!r} (found at least {1!r})"
+                             .format(url, match.group()))
+    for name, value in headers.items():
+        if not _is_legal_header_name(name.encode("ascii") if hasattr(name, "encode") else name):
+            raise ValueError("Invalid header name {0!r}".format(name))
+        if hasattr(value, "encode"):
+            value = value.encode(_HEADER_ENCODING)
+        elif isinstance(value, int):
+            value = str(value).encode("ascii")
+        if _is_illegal_header_value(value):
+            raise ValueError("Invalid header value {0!r}".format(value))
+
+
+async def send_request(connection, method, target, host, headers, body, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Writes a request on the given connection, the body being streamed as by
+    web.body.send_request: the buffers by slices of chunk_size bytes, the
+    regular files by loop.sendfile, the other files and the iterables, also
+    the asynchronous ones, chunk by chunk. The files are read by blocking calls.
+
+    @param host the value of the Host header if not given in the headers.
+    @exception ValueError if the method or a header is not valid, InvalidURL if the target is not valid.
+    """
+    _validate_head(method, target, host, headers)
+    writer = connection.writer
+    names = {name.lower() for name in headers}
+    lines = ["{0} {1} HTTP/1.1".format(method, target)]
+    if "host" not in names:
+        lines.append("Host: " + host)
+    if "accept-encoding" not in names:
+        lines.append("Accept-Encoding: identity")
+    lines.extend("{0}: {1}".format(name, value) for name, value in headers.items())
+    if isinstance(body, str):
+        body = body.encode(_HEADER_ENCODING)
+    length = body_length(body)
+    chunked = TRANSFER_ENCODING.lower() in names
+    if not chunked and CONTENT_LENGTH.lower() not in names:
+        if length is None:
+            lines.append("{0}: {1}".format(TRANSFER_ENCODING, CHUNKED))
+            chunked = True
+        elif length or body is not None or method in _METHODS_EXPECTING_BODY:
+            lines.append("{0}: {1}".format(CONTENT_LENGTH, length))
+    lines.append("\r\n")
+    head = "\r\n".join(lines).encode(_HEADER_ENCODING)
+    view = _view(body) if body is not None else None
+    if view is not None and view.nbytes <= SMALL_CHUNK_SIZE and not chunked:
+        # the head and a small body in one write
+        writer.write(head + view)
+        await writer.drain()
+        return
+    writer.write(head)
+    if view is not None:
+        for start in range(0, view.nbytes, chunk_size):
+            await _write(writer, view[start:start + chunk_size], chunked)
+    elif hasattr(body, "read"):
+        await _write_file(writer, body, None if chunked else length, chunked, chunk_size)
+    elif body is not None:
+        await _write_chunks(writer, body, chunked)
+    if chunked:
+        writer.write(_LAST_CHUNK)
+    await writer.drain()
+
+
+async def _read_status(reader):
+    line = await reader.readline()
+    if not line:
+        raise RemoteDisconnected("Remote end closed connection without response")
+    try:
+        version, status, reason = (line.decode(_HEADER_ENCODING).rstrip("\r\n").split(None, 2) + [""])[:3]
+        return HTTP_VERSIONS[version], int(status), reason
+    except (KeyError, ValueError):
+        raise BadStatusLine(line) from None
+
+
+async def _read_headers(reader):
+    lines = []
+    while True:
+        line = await reader.readline()
+        if line in (_CRLF, b"\n", b""):
+            break
+        lines.append(line)
+    return Parser(_class=HTTPMessage).parsestr(b"".join(lines).decode(_HEADER_ENCODING))
+
+
+async def read_response(reader, method):
+    """
+    Reads the status line and the headers of a response, skipping the interim
+    responses. Returns the (version, status, reason, headers, body) tuple, the
+    body being read on demand by its aread coroutine.
+    """
+    while True:
+        version, status, reason = await _read_status(reader)
+        headers = await _read_headers(reader)
+        if status >= _FIRST_FINAL_STATUS or status == _SWITCHING_PROTOCOLS:
+            break
+    connection = headers.get("Connection", "").lower()
+    will_close = "close" in connection or (version == 10 and "keep-alive" not in connection)
+    if method == HTTP_HEAD or status in _NO_BODY_STATUSES or status < _FIRST_FINAL_STATUS:
+        return version, status, reason, headers, _AsyncBody(reader, 0, False, will_close)
+    if "chunked" in headers.get(TRANSFER_ENCODING, "").lower():
+        return version, status, reason, headers, _AsyncBody(reader, None, True, will_close)
+    length = headers.get(CONTENT_LENGTH)
+    if length is not None:
+        try:
+            length = int(length)
+        except ValueError:
+            length = None
+    if length is None or length < 0:
+        # delimited by the end of the connection
+        return version, status, reason, headers, _AsyncBody(reader, None, False, True)
+    return version, status, reason, headers, _AsyncBody(reader, length, False, will_close)
+
+
+class AbstractAsyncRequestHandler(object):
+    async def request(self, uri, method=GET, headers=None, body=None, stream=False):
+        pass
+
+
+class AsyncHttpRequestHandler(AbstractAsyncRequestHandler):
+    """
+    Asynchronous request handler sending the requests through an AsyncConnectionPool
+    of its own. The https URIs are requested over TLS.
+    """
+
+    def __init__(self, pool=None, ssl_context=None, decompress=False, max_decompressed_size=None,
+                 retry_policy=None):
+        """
+        @param pool the AsyncConnectionPool of this handler, a default one if None.
+        @param ssl_context the ssl.SSLContext of the https connections of the default
+                           pool, ssl.create_default_context() if None.
+        @param decompress if True the gzip and deflate bodies are accepted and decompressed,
+                          see web.urilib.HttpRequestHandler.
+        @param max_decompressed_size the maximum size in bytes of a decompressed body, None for no limit.
+        @param retry_policy the web.retry.RetryPolicy of the failed idempotent requests,
+                            web.retry.NO_RETRY if None.
+        """
+        if pool is not None and ssl_context is not None:
+            raise_illegal_argument("the ssl_context is given to the pool")
+        self.pool = pool if pool is not None else AsyncConnectionPool(ssl_context=ssl_context)
+        self.decompress = decompress
+        self.max_decompressed_size = max_decompressed_size
+        self.retry_policy = retry_policy if retry_policy is not None else NO_RETRY
+        self.__replayed = 0
+        self.__retries = 0
+        self.__exhausted = 0
+
+    async def request(self, uri, method=GET, headers=None, body=None, stream=False):
+        """
+        Sends the request and returns its web.urilib.Response. The failed idempotent
+        requests are replayed and retried as by web.urilib.HttpRequestHandler.
+
+        @param body None, bytes, str, a buffer, a binary file, an iterable or an
+                    asynchronous iterable of byte chunks, see send_request.
+        @param stream if True the response is returned once its headers are read,
+                      its connection is only released when its body is consumed
+                      or the response closed.
+        """
+        uri = _uri(uri) if isinstance(uri, str) else uri
+        headers = headers if headers is not None else {}
+        if self.decompress:
+            headers = _accept_encoding(headers)
+        scheme = uri.scheme.lower()
+        host = uri.hostname
+        port = uri.port or DEFAULT_PORTS.get(scheme)
+        policy = self.retry_policy
+        rewind = rewinder(body) if policy.replays(method) else None
+        retries = replays = 0
+        while True:
+            connection = await self.pool.acquire(scheme, host, port)
+            reused = connection.checkouts > 1
+            try:
+                response = await self.__send(connection, uri, method, host, port, scheme, headers, body, stream)
+            except Exception as error:
+                if rewind is None:
+                    raise
+                # every idle connection of the pool may have been closed, not more
+                if reused and isinstance(error, STALE_CONNECTION_ERRORS) and replays <= self.pool.max_size:
+                    replays += 1
+                    self.__replayed += 1
+                elif not isinstance(error, policy.errors):
+                    raise
+                elif retries == policy.max_retries:
+                    if retries:
+                        self.__exhausted += 1
+                    raise
+                else:
+                    retries += 1
+                    self.__retries += 1
+                    await asyncio.sleep(policy.backoff(retries))
+                rewind()
+                continue
+            if rewind is None or response.status_code not in policy.statuses:
+                return response
+            if retries == policy.max_retries:
+                if retries:
+                    self.__exhausted += 1
+                return response
+            retries += 1
+            self.__retries += 1
+            async with response:
+                await response.aread()
+            await asyncio.sleep(policy.backoff(retries, response.headers.get(RETRY_AFTER)))
+            rewind()
+
+    async def __send(self, connection, uri, method, host, port, scheme, headers, body, stream):
+        """
+        Sends one attempt of a request on the given checked out connection.
+        """
+        pool = self.pool
+        try:
+            await send_request(connection, method, _request_target(uri), _host_header(host, port, scheme),
+                               headers, body)
+            version, status, reason, message, response_body = await read_response(connection.reader, method)
+            decoder = content_decoder(response_body, message, self.max_decompressed_size) \
+                if self.decompress else None
+            if stream:
+                return Response(message, None, status, reason, version, decoder or response_body,
+                                lambda reusable: pool.release(connection, reusable))
+            data = await (decoder or response_body).aread()
+        except BaseException:
+            pool.release(connection, reusable=False)
+            raise
+        pool.release(connection, reusable=not response_body.will_close)
+        return Response(message, data, status, reason, version,
+                        compressed_size=decoder.compressed_size if decoder is not None else None)
+
+    def statistics(self):
+        """
+        Returns the web.retry.RetryStatistics of this handler.
+        """
+        return RetryStatistics(self.__replayed, self.__retries, self.__exhausted)
+
+    def close(self):
+        """
+        Closes the idle connections of the pool.
+        """
+        self.pool.clear()
+
+
+DEFAULT_ASYNC_REQUEST_HANDLER = AsyncHttpRequestHandler()
+ASYNC_REQUEST_HANDLER = DEFAULT_ASYNC_REQUEST_HANDLER
+
+
+def _set_async_request_handler(request_handler):
+    assert_that_argument_type_is(request_handler, AbstractAsyncRequestHandler, "request_handler")
+    global ASYNC_REQUEST_HANDLER
+    ASYNC_REQUEST_HANDLER = request_handler
+
+
+async def _arequest(uri, method, headers, body, stream=False):
+    return await ASYNC_REQUEST_HANDLER.request(uri, method, headers, body, stream=stream)
@@ -0,0 +1,212 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Request bodies sent without being loaded in memory.
+
+The bodies supporting the buffer protocol (bytearray, memoryview, mmap...)
+are written from a view of their memory, the binary files by chunks read into
+one reused buffer or by socket.sendfile for the regular files sent over plain
+HTTP, the iterables chunk by chunk. The bodies of known length are sent with a
+Content-Length header, the other ones with the chunked transfer coding.
+"""
+import io
+import os
+import ssl
+import stat
+from .assertion import raise_illegal_argument
+
+__author__ = 'Romain Gilles'
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# chunks up to this size are sent with their framing in one write
+SMALL_CHUNK_SIZE = 16 * 1024
+
+CONTENT_LENGTH = "Content-Length"
+TRANSFER_ENCODING = "Transfer-Encoding"
+CHUNKED = "chunked"
+
+_CRLF = b"\r\n"
+_LAST_CHUNK = b"0\r\n\r\n"
+
+
+class BodyLengthError(Exception):
+    """
+    This error is raised when a file body ends before the length announced by
+    the Content-Length header. The connection can not be reused, the server
+    waits for the missing bytes.
+    """
+
+    def __init__(self, length, sent):
+        super().__init__(length, sent)
+        self.length = length
+        self.sent = sent
+
+    @property
+    def message(self):
+        return "body ended after {0} of its {1} bytes".format(self.sent, self.length)
+
+
+def _view(body):
+    """
+    Returns a byte view of the given body if it supports the buffer protocol, None otherwise.
+    """
+    try:
+        return memoryview(body).cast("B")
+    except TypeError:
+        return None
+
+
+def _regular_file_size(file):
+    try:
+        status = os.fstat(file.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+    return status.st_size if stat.S_ISREG(status.st_mode) else None
+
+
+def file_length(file):
+    """
+    Returns the number of bytes of the given binary file from its current
+    position to its end, None if it is not seekable.
+    """
+    size = _regular_file_size(file)
+    if size is not None:
+        return max(size - file.tell(), 0)
+    try:
+        if not file.seekable():
+            return None
+        position = file.tell()
+        end = file.seek(0, io.SEEK_END)
+        file.seek(position)
+    except (AttributeError, OSError):
+        return None
+    return max(end - position, 0)
+
+
+def body_length(body):
+    """
+    Returns the length in bytes of the given request body, None if it is only
+    known once the body is sent.
+    @exception IllegalArgumentError if the body is not bytes, str, a buffer,
+                                    a binary file or an iterable of chunks.
+    """
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("iso-8859-1"))
+    view = _view(body)
+    if view is not None:
+        return view.nbytes
+    if hasattr(body, "read"):
+        if isinstance(body, io.TextIOBase):
+            raise_illegal_argument("body must be a binary file: {0!r}".format(body))
+        return file_length(body)
+    if hasattr(body, "__iter__") or hasattr(body, "__aiter__"):
+        return None
+    raise_illegal_argument("body must be bytes, a buffer, a binary file or an iterable of chunks: {0!r}"
+                           .format(body))
+
+
+def _send_chunk(connection, view, chunked):
+    if not chunked:
+        connection.send(view)
+    elif view.nbytes <= SMALL_CHUNK_SIZE:
+        connection.send(b"".join((b"%X\r\n" % view.nbytes, view, _CRLF)))
+    else:
+        connection.send(b"%X\r\n" % view.nbytes)
+        connection.send(view)
+        connection.send(_CRLF)
+
+
+def _send_file(connection, file, length, chunked, chunk_size):
+    sock = connection.sock
+    if length and not chunked and not isinstance(sock, ssl.SSLSocket) and _regular_file_size(file) is not None:
+        # the kernel copies the file to the socket, the file position is updated
+        sent = sock.sendfile(file, file.tell(), length)
+        if sent < length:
+            raise BodyLengthError(length, sent)
+        return
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    readinto = getattr(file, "readinto", None)
+    remaining = length
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        if readinto is not None:
+            count = readinto(view[:size])
+            data = view[:count or 0]
+        else:
+            data = memoryview(file.read(size) or b"")
+        if not data:
+            if remaining is not None:
+                raise BodyLengthError(length, length - remaining)
+            break
+        _send_chunk(connection, data, chunked)
+        if remaining is not None:
+            remaining -= data.nbytes
+
+
+def _send_chunks(connection, chunks, chunked):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            # as http.client for the str bodies
+            chunk = chunk.encode("iso-8859-1")
+        view = _view(chunk)
+        if view is None:
+            raise_illegal_argument("a body chunk must be bytes or a buffer: {0!r}".format(chunk))
+        if view:
+            _send_chunk(connection, view, chunked)
+
+
+def send_request(connection, method, target, headers, body, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Sends a request through the given http.client connection, the body being
+    streamed. The bytes and str bodies are sent by HTTPConnection.request.
+    A Content-Length or Transfer-Encoding header given by the caller is kept,
+    otherwise it is set from the length of the body.
+
+    @param headers the mapping of the request headers.
+    @param body None, bytes, str, a buffer (bytearray, memoryview, mmap...), a binary
+                file, sent from its current position, or an iterable of byte chunks.
+    @exception BodyLengthError if a file ends before the length it had when the headers were sent.
+    """
+    if body is None or isinstance(body, (bytes, str)):
+        connection.request(method, target, body, headers)
+        return
+    length = body_length(body)
+    names = {name.lower() for name in headers}
+    connection.putrequest(method, target, skip_host="host" in names,
+                          skip_accept_encoding="accept-encoding" in names)
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    chunked = TRANSFER_ENCODING.lower() in names
+    if not chunked and CONTENT_LENGTH.lower() not in names:
+        if length is None:
+            connection.putheader(TRANSFER_ENCODING, CHUNKED)
+            chunked = True
+        else:
+            connection.putheader(CONTENT_LENGTH, str(length))
+    connection.endheaders()
+    view = _view(body)
+    if view is not None:
+        if view:
+            _send_chunk(connection, view, chunked)
+    elif hasattr(body, "read"):
+        _send_file(connection, body, None if chunked else length, chunked, chunk_size)
+    else:
+        _send_chunks(connection, body, chunked)
+    if chunked:
+        connection.send(_LAST_CHUNK)
@@ -0,0 +1,179 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Percent-encoding and decoding of the URI components (RFC 3986 section 2.1).
+
+Every component class has a table giving the encoded form of each byte
+value, built once at import. ASCII strings are encoded by a single
+str.translate call, the other ones byte by byte through the table.
+The bulk functions encode or decode a whole segment tuple or query at once.
+"""
+from string import ascii_letters, digits, hexdigits
+from web import SEGMENT_SEPARATOR
+
+__author__ = 'Romain Gilles'
+
+DEFAULT_QUERY_SEPARATOR = "&"
+KEY_VALUE_SEPARATOR = "="
+PERCENT = "%"
+PLUS = "+"
+SPACE = " "
+
+UNRESERVED = ascii_letters + digits + "-._~"
+SUB_DELIMS = "!$&'()*+,;="
+
+# characters of each component class which are not percent-encoded
+SEGMENT_SAFE_CHARACTERS = UNRESERVED + SUB_DELIMS + ":@"
+QUERY_SAFE_CHARACTERS = SEGMENT_SAFE_CHARACTERS + "/?"
+FRAGMENT_SAFE_CHARACTERS = SEGMENT_SAFE_CHARACTERS + "/?"
+USER_INFO_SAFE_CHARACTERS = UNRESERVED + SUB_DELIMS + ":"
+# a query key or value, the separators of the parameters are encoded
+QUERY_PARAM_SAFE_CHARACTERS = UNRESERVED + "!$'()*,/:@?"
+
+
+def _create_encoding_table(safe_characters):
+    """
+    Returns the list of the encoded form of every byte value.
+    """
+    safe_bytes = frozenset(safe_characters.encode("ascii"))
+    return tuple(chr(byte) if byte in safe_bytes else "%{0:02X}".format(byte) for byte in range(256))
+
+
+SEGMENT_TABLE = _create_encoding_table(SEGMENT_SAFE_CHARACTERS)
+QUERY_TABLE = _create_encoding_table(QUERY_SAFE_CHARACTERS)
+FRAGMENT_TABLE = _create_encoding_table(FRAGMENT_SAFE_CHARACTERS)
+USER_INFO_TABLE = _create_encoding_table(USER_INFO_SAFE_CHARACTERS)
+QUERY_PARAM_TABLE = _create_encoding_table(QUERY_PARAM_SAFE_CHARACTERS)
+
+# the segment table keeping the separator, to encode joined segments at once
+_JOINED_SEGMENTS_TABLE = SEGMENT_TABLE[:ord(SEGMENT_SEPARATOR)] + (SEGMENT_SEPARATOR,) + \
+                         SEGMENT_TABLE[ord(SEGMENT_SEPARATOR) + 1:]
+
+# byte value of every two hexadecimal digits
+_HEX_TO_BYTE = {first + second: bytes((int(first + second, 16),)) for first in hexdigits for second in hexdigits}
+
+
+def encode(value, table):
+    """
+    Returns the percent-encoded form of the given string according to the given
+    encoding table, the non ASCII characters are encoded in UTF-8.
+    """
+    if value.isascii():
+        # the first 128 entries of the table map the ASCII characters
+        return value.translate(table)
+    return "".join([table[byte] for byte in value.encode("utf-8")])
+
+
+def decode(value):
+    """
+    Returns the decoded form of the given percent-encoded string. The sequences
+    which are not valid percent-encoded triplets are kept as is and the invalid
+    UTF-8 sequences are replaced.
+    """
+    if PERCENT not in value:
+        return value
+    parts = value.split(PERCENT)
+    result = [parts[0].encode("utf-8")]
+    hex_to_byte = _HEX_TO_BYTE
+    for part in parts[1:]:
+        byte = hex_to_byte.get(part[:2])
+        if byte is None:
+            result.append(b"%")
+            result.append(part.encode("utf-8"))
+        else:
+            result.append(byte)
+            result.append(part[2:].encode("utf-8"))
+    return b"".join(result).decode("utf-8", "replace")
+
+
+def encode_segment(segment):
+    return encode(segment, SEGMENT_TABLE)
+
+
+def encode_segments(segments):
+    """
+    Returns the tuple of the percent-encoded forms of the given segments. The
+    ASCII segments without separator are joined and encoded by one translation.
+    """
+    segments = tuple(segments)
+    joined = SEGMENT_SEPARATOR.join(segments)
+    if joined.isascii() and joined.count(SEGMENT_SEPARATOR) == len(segments) - 1:
+        return tuple(joined.translate(_JOINED_SEGMENTS_TABLE).split(SEGMENT_SEPARATOR))
+    table = SEGMENT_TABLE
+    return tuple([encode(segment, table) for segment in segments])
+
+
+def decode_segments(segments):
+    """
+    Returns the tuple of the decoded forms of the given segments.
+    """
+    segments = tuple(segments)
+    joined = SEGMENT_SEPARATOR.join(segments)
+    if PERCENT not in joined:
+        return segments
+    return tuple([decode(segment) for segment in segments])
+
+
+def encode_query(query):
+    return encode(query, QUERY_TABLE)
+
+
+def encode_fragment(fragment):
+    return encode(fragment, FRAGMENT_TABLE)
+
+
+def encode_user_info(user_info):
+    return encode(user_info, USER_INFO_TABLE)
+
+
+def encode_query_param(value):
+    """
+    Returns the percent-encoded form of a query key or value.
+    """
+    return encode(str(value), QUERY_PARAM_TABLE)
+
+
+def decode_query_param(value):
+    """
+    Returns the decoded form of a query key or value, '+' is decoded as a space.
+    """
+    if PLUS in value:
+        value = value.replace(PLUS, SPACE)
+    return decode(value)
+
+
+def encode_query_params(params, separator=DEFAULT_QUERY_SEPARATOR):
+    """
+    Returns the query string of the given mapping or iterable of (key, value)
+    pairs, the keys and the values being percent-encoded.
+    """
+    if hasattr(params, "items"):
+        params = params.items()
+    table = QUERY_PARAM_TABLE
+    return separator.join([encode(str(key), table) + KEY_VALUE_SEPARATOR + encode(str(value), table)
+                           for key, value in params])
+
+
+def decode_query_params(query, separator=DEFAULT_QUERY_SEPARATOR):
+    """
+    Returns the list of the decoded (key, value) pairs of the given query string.
+    """
+    params = []
+    for param in query.split(separator):
+        if param:
+            key, _, value = param.partition(KEY_VALUE_SEPARATOR)
+            params.append((decode_query_param(key), decode_query_param(value)))
+    return params
@@ -0,0 +1,217 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Incremental decoding of the gzip and deflate content codings.
+
+A ContentDecoder wraps the body stream of a response and decompresses it as
+it is read, never more than the requested size at once, so a streamed body
+is decoded in bounded memory. The decompressed size is checked against a
+limit to stop the responses inflating without bound.
+"""
+import zlib
+from .body import DEFAULT_CHUNK_SIZE
+
+__author__ = 'Romain Gilles'
+
+ACCEPT_ENCODING = "gzip, deflate"
+
+GZIP_CODINGS = frozenset(("gzip", "x-gzip"))
+DEFLATE_CODING = "deflate"
+IDENTITY_CODING = "identity"
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+# the deflate coding is a zlib stream, some servers send a raw deflate stream
+_ZLIB_WBITS = zlib.MAX_WBITS
+_RAW_DEFLATE_WBITS = -zlib.MAX_WBITS
+
+
+class DecompressionLimitError(Exception):
+    """
+    This error is raised when the decompressed body of a response exceeds the
+    size limit of its request handler.
+    """
+
+    def __init__(self, limit):
+        super().__init__(limit)
+        self.limit = limit
+
+    @property
+    def message(self):
+        return "the decompressed body exceeds {0} bytes".format(self.limit)
+
+
+def _coding(headers):
+    """
+    Returns the content coding of the given response headers to decode, None if
+    the body is not encoded or by a coding which is not supported.
+    """
+    value = headers.get("Content-Encoding")
+    if not value:
+        return None
+    codings = [coding.strip().lower() for coding in value.split(",")]
+    codings = [coding for coding in codings if coding and coding != IDENTITY_CODING]
+    if len(codings) != 1:
+        return None
+    coding = codings[0]
+    return coding if coding in GZIP_CODINGS or coding == DEFLATE_CODING else None
+
+
+def content_decoder(stream, headers, max_size=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Returns the ContentDecoder of the given body stream if its Content-Encoding
+    is gzip or deflate, None otherwise.
+    """
+    coding = _coding(headers)
+    return ContentDecoder(stream, coding, max_size, chunk_size) if coding is not None else None
+
+
+class ContentDecoder(object):
+    """
+    File-like object reading the decompressed body of a response from its
+    encoded body stream, an http.client.HTTPResponse or the body of an
+    asynchronous response read by aread.
+    """
+
+    def __init__(self, stream, coding, max_size=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        @param coding gzip, x-gzip or deflate.
+        @param max_size the maximum size in bytes of the decompressed body, None for no limit.
+        @param chunk_size the size of the encoded chunks read from the stream.
+        """
+        self.__stream = stream
+        self.__gzip = coding in GZIP_CODINGS
+        self.__decompressor = zlib.decompressobj(_GZIP_WBITS if self.__gzip else _ZLIB_WBITS)
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        # encoded bytes received and not decoded yet
+        self.__tail = b""
+        self.__decoded = False
+        self.__finished = False
+        self.compressed_size = 0
+        self.decompressed_size = 0
+
+    @property
+    def will_close(self):
+        return self.__stream.will_close
+
+    def isclosed(self):
+        """
+        Returns True once the encoded body is consumed and every byte decoded.
+        """
+        return self.__finished and not self.__tail and self.__stream.isclosed()
+
+    def close(self):
+        self.__stream.close()
+
+    def __decompress(self, size):
+        if self.max_size is not None:
+            # one byte more than the limit is enough to detect that it is exceeded
+            allowed = self.max_size - self.decompressed_size + 1
+            size = allowed if size <= 0 else min(size, allowed)
+        try:
+            return self.__decompressor.decompress(self.__tail, max(size, 0))
+        except zlib.error:
+            if self.__gzip or self.__decoded:
+                raise
+            self.__decompressor = zlib.decompressobj(_RAW_DEFLATE_WBITS)
+            return self.__decompressor.decompress(self.__tail, max(size, 0))
+
+    def __decode(self, size):
+        """
+        Decodes up to size bytes of the encoded bytes received, all of them if size is not positive.
+        """
+        decompressor = self.__decompressor
+        if self.__tail and not decompressor.eof:
+            data = self.__decompress(size)
+            decompressor = self.__decompressor
+            self.__tail = decompressor.unconsumed_tail
+        elif self.__finished and not decompressor.eof:
+            data = decompressor.flush()
+        else:
+            data = b""
+        if decompressor.eof:
+            self.__tail = decompressor.unused_data
+            if self.__tail and self.__gzip:
+                # a gzip body can hold several members
+                self.__decompressor = zlib.decompressobj(_GZIP_WBITS)
+            else:
+                self.__tail = b""
+        if data:
+            self.__decoded = True
+            self.decompressed_size += len(data)
+            if self.max_size is not None and self.decompressed_size > self.max_size:
+                raise DecompressionLimitError(self.max_size)
+        return data
+
+    def __received(self, data):
+        if data:
+            self.compressed_size += len(data)
+            self.__tail += data
+        else:
+            self.__finished = True
+
+    def __done(self):
+        return self.__finished and not self.__tail
+
+    def read(self, size=-1):
+        """
+        Reads and returns up to size bytes of the decompressed body, all the
+        remaining bytes if size is negative.
+        """
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(self.chunk_size), b""))
+        if not size:
+            return b""
+        stream = self.__stream
+        read1 = getattr(stream, "read1", None)
+        while True:
+            data = self.__decode(size)
+            if data or self.__done():
+                return data
+            if read1 is None:
+                self.__received(stream.read(self.chunk_size))
+                continue
+            # read1 returns the bytes already received instead of waiting for a full chunk
+            data = read1(self.chunk_size)
+            if not data:
+                # http.client read1 does not close the response at the end of a Content-Length body
+                stream.read()
+            self.__received(data)
+
+    def readinto(self, buffer):
+        with memoryview(buffer) as view:
+            data = self.read(view.nbytes)
+            view[:len(data)] = data
+        return len(data)
+
+    async def aread(self, size=-1):
+        """
+        Coroutine reading up to size bytes of the decompressed body of an asynchronous response.
+        """
+        if size is None or size < 0:
+            parts = []
+            while True:
+                data = await self.aread(self.chunk_size)
+                if not data:
+                    return b"".join(parts)
+                parts.append(data)
+        if not size:
+            return b""
+        while True:
+            data = self.__decode(size)
+            if data or self.__done():
+                return data
+            self.__received(await self.__stream.aread(self.chunk_size))
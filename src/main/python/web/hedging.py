@@ -0,0 +1,317 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Hedged requests, against the tail latency of the idempotent requests.
+
+A hedging handler decorates a request handler. When an idempotent request has
+not answered after the hedge delay, a duplicate is sent on another connection
+of the pool and the first response wins: the other attempt is cancelled, or
+closed when it completes. The delay is fixed or the given percentile of the
+latencies of the idempotent requests recently observed, so that only the
+slowest requests are hedged.
+The budget bounds the extra load: the hedges sent never exceed this fraction
+of the requests.
+
+    set_request_handler(HedgingRequestHandler(HttpRequestHandler(), percentile=95, budget=0.05))
+
+HedgingRequestHandler sends every hedged request from a thread of its own
+executor, AsyncHedgingRequestHandler from a task of the running loop.
+"""
+import asyncio
+from bisect import insort, bisect_left
+from collections import namedtuple, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from time import monotonic
+from .asynclib import AbstractAsyncRequestHandler, DEFAULT_ASYNC_REQUEST_HANDLER
+from .assertion import assert_that_argument_type_is, raise_illegal_argument
+from .body import _view
+from .retry import IDEMPOTENT_METHODS
+from .urilib import AbstractRequestHandler, DEFAULT_REQUEST_HANDLER, _handler_request
+from web import HTTP_GET as GET
+
+__author__ = 'Romain Gilles'
+
+# seconds before a hedge when the latency percentile is not known yet
+DEFAULT_DELAY = 0.1
+# maximum fraction of the requests which are hedged
+DEFAULT_BUDGET = 0.05
+# number of recent latencies of which the percentile is taken
+DEFAULT_WINDOW = 1000
+# latencies recorded before the percentile is used
+DEFAULT_MIN_SAMPLES = 100
+DEFAULT_MAX_WORKERS = 32
+
+HedgeStatistics = namedtuple("HedgeStatistics", "requests hedges wins denied")
+HedgeStatistics.__doc__ = """
+Counters of a hedging handler: the requests which could be hedged, the hedges
+sent, the hedges whose response won, and the hedges not sent because the
+budget was spent.
+"""
+
+
+class LatencyWindow(object):
+    """
+    The last latencies of a handler, kept sorted to read their percentiles.
+    Not thread-safe.
+    """
+    __slots__ = 'size', '__recent', '__sorted'
+
+    def __init__(self, size=DEFAULT_WINDOW):
+        if size < 1:
+            raise_illegal_argument("size must be positive: {0}".format(size))
+        self.size = size
+        self.__recent = deque()
+        self.__sorted = []
+
+    def record(self, latency):
+        recent = self.__recent
+        if len(recent) == self.size:
+            oldest = recent.popleft()
+            del self.__sorted[bisect_left(self.__sorted, oldest)]
+        recent.append(latency)
+        insort(self.__sorted, latency)
+
+    def percentile(self, percentile):
+        """
+        Returns the latency below which the given percentage of the recorded
+        latencies fall (nearest rank), None if none is recorded.
+        """
+        latencies = self.__sorted
+        if not latencies:
+            return None
+        rank = max(1, -(-percentile * len(latencies) // 100))
+        return latencies[int(rank) - 1]
+
+    def __len__(self):
+        return len(self.__recent)
+
+
+def _hedgeable(method, body):
+    """
+    Returns whether a request can be sent twice at once: an idempotent method
+    and a body held in memory.
+    """
+    return method.upper() in IDEMPOTENT_METHODS and \
+        (body is None or isinstance(body, (bytes, str)) or _view(body) is not None)
+
+
+class _Hedging(object):
+    """
+    Delay, budget and counters shared by the hedging handlers.
+    """
+
+    def __init__(self, delay, percentile, budget, window, min_samples):
+        if delay < 0:
+            raise_illegal_argument("delay must not be negative: {0}".format(delay))
+        if percentile is not None and not 0 < percentile <= 100:
+            raise_illegal_argument("percentile must be between 0 and 100: {0}".format(percentile))
+        if not 0 <= budget <= 1:
+            raise_illegal_argument("budget must be between 0 and 1: {0}".format(budget))
+        self.delay = delay
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.__latencies = LatencyWindow(window)
+        self.__lock = Lock()
+        self.__requests = 0
+        self.__hedges = 0
+        self.__wins = 0
+        self.__denied = 0
+
+    def _started(self):
+        """
+        Counts a hedgeable request, returns its hedge delay.
+        """
+        with self.__lock:
+            self.__requests += 1
+            if self.percentile is None or len(self.__latencies) < self.min_samples:
+                return self.delay
+            return self.__latencies.percentile(self.percentile)
+
+    def _record(self, start, response):
+        """
+        Records the latency of a hedgeable request started at the given time,
+        from its first attempt to its response, returns the response.
+        """
+        latency = monotonic() - start
+        with self.__lock:
+            self.__latencies.record(latency)
+        return response
+
+    def _hedge(self):
+        """
+        Returns whether a hedge can be sent within the budget, counts it if so.
+        """
+        with self.__lock:
+            if self.__hedges + 1 > self.budget * self.__requests:
+                self.__denied += 1
+                return False
+            self.__hedges += 1
+            return True
+
+    def _won(self):
+        with self.__lock:
+            self.__wins += 1
+
+    def statistics(self):
+        """
+        Returns the HedgeStatistics of this handler.
+        """
+        with self.__lock:
+            return HedgeStatistics(self.__requests, self.__hedges, self.__wins, self.__denied)
+
+
+def _close(future):
+    """
+    Closes the response of a losing attempt once it completes.
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class HedgingRequestHandler(_Hedging, AbstractRequestHandler):
+    """
+    Request handler sending a hedge of the idempotent requests which are slower
+    than the hedge delay, see web.hedging. The requests are sent from the threads
+    of an executor, as many at once as max_workers, the requests which can not
+    be hedged (unsafe method, file or iterable body) from the calling thread.
+    """
+
+    def __init__(self, handler=None, delay=DEFAULT_DELAY, percentile=None, budget=DEFAULT_BUDGET,
+                 window=DEFAULT_WINDOW, min_samples=DEFAULT_MIN_SAMPLES, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        @param handler the decorated AbstractRequestHandler, the default HttpRequestHandler if None.
+        @param delay the time in seconds after which a request is hedged, until min_samples
+                     latencies are recorded if a percentile is given.
+        @param percentile None for the fixed delay, or the percentile of the recent
+                          latencies used as delay, 95 to hedge the slowest 5% requests.
+        @param budget the maximum ratio of the hedges sent to the hedgeable requests.
+        @param window the number of recent latencies of which the percentile is taken.
+        @param min_samples the number of latencies recorded before the percentile is used.
+        @param max_workers the number of threads sending the hedgeable requests.
+        """
+        handler = handler if handler is not None else DEFAULT_REQUEST_HANDLER
+        assert_that_argument_type_is(handler, AbstractRequestHandler, "handler")
+        super().__init__(delay, percentile, budget, window, min_samples)
+        self.handler = handler
+        self.__executor = ThreadPoolExecutor(max_workers, thread_name_prefix="hedging")
+
+    def __start(self, started, uri, method, headers, body, stream):
+        started.set_result(monotonic())
+        return _handler_request(self.handler, uri, method, headers, body, stream)
+
+    def request(self, uri, method=GET, headers=None, body=None, stream=False):
+        """
+        Sends the request and returns the first Response, of the request or of its
+        hedge. The error of the first failed attempt is raised if both fail.
+        """
+        if not _hedgeable(method, body):
+            # the latencies of the other requests would skew the hedge delay
+            return _handler_request(self.handler, uri, method, headers, body, stream)
+        delay = self._started()
+        submit = self.__executor.submit
+        started = Future()
+        first = submit(self.__start, started, uri, method, headers, body, stream)
+        # the time spent in the queue of the executor, all its threads being busy,
+        # is not a latency of the request
+        start = started.result()
+        if wait((first,), max(0.0, start + delay - monotonic())).done or not self._hedge():
+            return self._record(start, first.result())
+        pending = {first, submit(_handler_request, self.handler, uri, method, headers, body, stream)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is not None:
+                    error = error or attempt.exception()
+                    continue
+                for loser in pending:
+                    if not loser.cancel():
+                        loser.add_done_callback(_close)
+                if attempt is not first:
+                    self._won()
+                response = self._record(start, attempt.result())
+                for loser in done - {attempt}:
+                    _close(loser)
+                return response
+        raise error
+
+    def close(self):
+        """
+        Stops the executor and closes the decorated handler.
+        """
+        self.__executor.shutdown(wait=False)
+        close = getattr(self.handler, "close", None)
+        if close is not None:
+            close()
+
+
+class AsyncHedgingRequestHandler(_Hedging, AbstractAsyncRequestHandler):
+    """
+    Asynchronous request handler sending a hedge of the idempotent requests which
+    are slower than the hedge delay, see web.hedging. The losing attempt is cancelled.
+    """
+
+    def __init__(self, handler=None, delay=DEFAULT_DELAY, percentile=None, budget=DEFAULT_BUDGET,
+                 window=DEFAULT_WINDOW, min_samples=DEFAULT_MIN_SAMPLES):
+        """
+        @param handler the decorated AbstractAsyncRequestHandler, the default
+                       AsyncHttpRequestHandler if None.
+        @see HedgingRequestHandler
+        """
+        handler = handler if handler is not None else DEFAULT_ASYNC_REQUEST_HANDLER
+        assert_that_argument_type_is(handler, AbstractAsyncRequestHandler, "handler")
+        super().__init__(delay, percentile, budget, window, min_samples)
+        self.handler = handler
+
+    async def request(self, uri, method=GET, headers=None, body=None, stream=False):
+        if not _hedgeable(method, body):
+            return await self.handler.request(uri, method, headers, body, stream=stream)
+        start = monotonic()
+        delay = self._started()
+        first = asyncio.ensure_future(self.handler.request(uri, method, headers, body, stream=stream))
+        try:
+            done, _ = await asyncio.wait((first,), timeout=delay)
+        except BaseException:
+            first.cancel()
+            raise
+        if done or not self._hedge():
+            return self._record(start, await first)
+        pending = {first, asyncio.ensure_future(self.handler.request(uri, method, headers, body, stream=stream))}
+        try:
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is not None:
+                        error = error or attempt.exception()
+                        continue
+                    if attempt is not first:
+                        self._won()
+                    for loser in done - {attempt}:
+                        _close(loser)
+                    return self._record(start, attempt.result())
+            raise error
+        finally:
+            for loser in pending:
+                if not loser.cancel():
+                    loser.add_done_callback(_close)
+
+    def close(self):
+        close = getattr(self.handler, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,509 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Private HTTP cache of the responses (RFC 9111).
+
+The CachingRequestHandler decorates a request handler. The responses to the
+GET requests are stored in a size-bounded LRU keyed by the normalized URI
+without fragment, and optionally in a store shared by the processes such as a
+DiskStore. A stored response is served while it is fresh according to
+Cache-Control max-age, Expires or the Last-Modified heuristic, otherwise it is
+revalidated by a conditional request (If-None-Match, If-Modified-Since). A
+response having a Vary header is stored per value of the listed request headers.
+
+    set_request_handler(CachingRequestHandler(HttpRequestHandler(), max_entries=10000))
+"""
+from base64 import b64encode, b64decode
+from collections import namedtuple, OrderedDict
+from copy import copy
+from email.utils import parsedate_tz, mktime_tz
+from hashlib import sha256
+from http.client import HTTPMessage
+import json
+import os
+import tempfile
+from threading import Lock
+from time import time
+from .assertion import assert_that_argument_type_is, raise_illegal_argument
+from .urilib import AbstractRequestHandler, Response, DEFAULT_REQUEST_HANDLER, _uri, _handler_request
+from web import HTTP_GET as GET, HTTP_HEAD
+
+__author__ = 'Romain Gilles'
+
+DEFAULT_MAX_ENTRIES = 1024
+# bodies larger than this size in bytes are not stored
+DEFAULT_MAX_ENTRY_SIZE = 1024 * 1024
+# fraction of the time since the last modification used as freshness lifetime
+HEURISTIC_FRACTION = 0.1
+# RFC 9111 section 4.2.2: the heuristic lifetime is capped
+MAX_HEURISTIC_LIFETIME = 24 * 3600
+
+# the statuses which are heuristically cacheable (RFC 9110 section 15.1)
+HEURISTICALLY_CACHEABLE = frozenset((200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501))
+NOT_MODIFIED = 304
+GATEWAY_TIMEOUT = 504
+_SAFE_METHODS = frozenset((GET, HTTP_HEAD, "OPTIONS", "TRACE"))
+_CONDITIONAL_HEADERS = frozenset(("if-none-match", "if-modified-since", "if-match", "if-unmodified-since",
+                                  "if-range"))
+# headers of a 304 response which do not update the stored response
+_NOT_UPDATED_HEADERS = frozenset(("content-length", "content-encoding", "transfer-encoding"))
+
+CacheStatistics = namedtuple("CacheStatistics", "hits misses revalidations not_modified stores evictions entries")
+CacheStatistics.__doc__ = """
+Counters of a CachingRequestHandler: the requests served by a fresh stored
+response, the requests sent without stored response, the conditional requests
+sent to revalidate a stored response and the ones answered by 304 Not
+Modified, the responses stored, the responses evicted from the memory and the
+current number of URIs in the memory.
+"""
+
+
+def _parse_cache_control(values):
+    """
+    Returns the dictionary of the directives of the given Cache-Control header
+    values, the lower case names mapping their argument or None.
+    """
+    directives = {}
+    for value in values:
+        for directive in value.split(","):
+            name, separator, argument = directive.partition("=")
+            name = name.strip().lower()
+            if name:
+                directives[name] = argument.strip().strip('"') if separator else None
+    return directives
+
+
+def _seconds(directives, name):
+    """
+    Returns the delta-seconds argument of a directive, None if it is missing or invalid.
+    """
+    value = directives.get(name)
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+
+def _parse_date(value):
+    """
+    Returns the timestamp of an HTTP date, None if it is missing or invalid.
+    """
+    if not value:
+        return None
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    try:
+        return mktime_tz(parsed)
+    except (OverflowError, ValueError):
+        return None
+
+
+def _cache_key(uri):
+    return str(uri.normalize()).partition("#")[0]
+
+
+def _header_dict(headers):
+    """
+    Returns the request headers with lower case names.
+    """
+    return {name.lower(): str(value) for name, value in headers.items()}
+
+
+def _fields(headers):
+    """
+    Returns the dictionary of the values of the given header (name, value) pairs
+    by lower case name.
+    """
+    fields = {}
+    for name, value in headers:
+        fields.setdefault(name.lower(), []).append(value)
+    return fields
+
+
+def _normalize_field(value):
+    return None if value is None else ",".join(part.strip() for part in value.split(","))
+
+
+class _Entry(object):
+    """
+    Stored response and the freshness information computed when it is stored
+    or revalidated.
+    """
+    __slots__ = ('status', 'reason', 'version', 'headers', 'body', 'vary', 'lifetime', 'initial_age',
+                 'response_time', 'no_cache', 'must_revalidate', 'etag', 'last_modified')
+
+    def __init__(self, response, vary, request_time, response_time):
+        self.status = response.status_code
+        self.reason = response.reason_phrase
+        self.version = response.http_version
+        self.body = response.body
+        self.vary = vary
+        self.update(list(response.headers.items()), request_time, response_time)
+
+    def update(self, headers, request_time, response_time):
+        """
+        Computes the freshness of the stored response from the given header
+        (name, value) pairs received between the given times.
+        """
+        self.headers = tuple(headers)
+        self.response_time = response_time
+        fields = _fields(self.headers)
+        directives = _parse_cache_control(fields.get("cache-control", ()))
+        date = _parse_date(fields.get("date", [None])[0])
+        # RFC 9111 section 4.2.3
+        age_value = fields.get("age", ["0"])[0].strip()
+        age_value = int(age_value) if age_value.isdigit() else 0
+        apparent_age = max(0.0, response_time - date) if date is not None else 0.0
+        self.initial_age = max(apparent_age, age_value + response_time - request_time)
+        self.no_cache = "no-cache" in directives
+        self.must_revalidate = "must-revalidate" in directives
+        self.etag = fields.get("etag", [None])[0]
+        self.last_modified = fields.get("last-modified", [None])[0]
+        self.lifetime = self.__lifetime(directives, fields, date if date is not None else response_time)
+
+    def __lifetime(self, directives, fields, date):
+        """
+        Returns the freshness lifetime in seconds (RFC 9111 section 4.2.1).
+        """
+        max_age = _seconds(directives, "max-age")
+        if max_age is not None:
+            return max_age
+        if "expires" in fields:
+            # an invalid date means already expired
+            expires = _parse_date(fields["expires"][0])
+            return max(0, expires - date) if expires is not None else 0
+        last_modified = _parse_date(self.last_modified)
+        if last_modified is not None and self.status in HEURISTICALLY_CACHEABLE:
+            return min(max(0.0, date - last_modified) * HEURISTIC_FRACTION, MAX_HEURISTIC_LIFETIME)
+        return 0
+
+    def updated(self, headers, request_time, response_time):
+        """
+        Returns a copy of this entry updated by the headers of a 304 response
+        (RFC 9111 section 4.3.4).
+        """
+        replaced = {name.lower() for name, _ in headers} - _NOT_UPDATED_HEADERS
+        entry = copy(self)
+        entry.update([(name, value) for name, value in self.headers if name.lower() not in replaced] +
+                     [(name, value) for name, value in headers if name.lower() in replaced],
+                     request_time, response_time)
+        return entry
+
+    def _state(self):
+        """
+        Returns the JSON serializable dict from which _from_state creates this entry again.
+        """
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["body"] = b64encode(self.body).decode("ascii")
+        return state
+
+    @classmethod
+    def _from_state(cls, state):
+        """
+        Creates an entry from the dict returned by _state.
+
+        @exception ValueError, TypeError or KeyError if the state is not valid.
+        """
+        entry = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(entry, name, state[name])
+        entry.body = b64decode(state["body"], validate=True)
+        entry.headers = tuple((str(name), str(value)) for name, value in state["headers"])
+        entry.vary = tuple((str(name), value) for name, value in state["vary"])
+        return entry
+
+    def age(self, now):
+        return self.initial_age + max(0.0, now - self.response_time)
+
+    def matches(self, request_headers):
+        """
+        Returns whether the request headers listed by the Vary header of the stored
+        response have the values of the request which stored it.
+        """
+        for name, value in self.vary:
+            if _normalize_field(request_headers.get(name)) != value:
+                return False
+        return True
+
+    def response(self, now):
+        headers = HTTPMessage()
+        for name, value in self.headers:
+            if name.lower() != "age":
+                headers[name] = value
+        headers["Age"] = str(int(self.age(now)))
+        return Response(headers, self.body, self.status, self.reason, self.version)
+
+
+class DiskStore(object):
+    """
+    Store of the cached responses in a directory, one JSON file per URI,
+    which can be shared by the processes of a host. The files are replaced
+    atomically. They hold data only, not code, but anyone who can write in the
+    directory can change the responses served: it is created readable by its
+    owner only.
+    """
+
+    def __init__(self, directory):
+        """
+        @param directory the directory of the files, created if missing.
+        """
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.directory = directory
+
+    def __path(self, key):
+        return os.path.join(self.directory, sha256(key.encode("utf-8")).hexdigest())
+
+    def get(self, key):
+        """
+        Returns the list of the stored responses of the given key, None if none.
+        """
+        try:
+            with open(self.__path(key), "rb") as file:
+                stored_key, states = json.load(file)
+            entries = [_Entry._from_state(state) for state in states]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, KeyError):
+            self.delete(key)
+            return None
+        return entries if stored_key == key else None
+
+    def set(self, key, entries):
+        descriptor, path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                json.dump([key, [entry._state() for entry in entries]], file, separators=(",", ":"))
+            os.replace(path, self.__path(key))
+        except BaseException:
+            os.unlink(path)
+            raise
+
+    def delete(self, key):
+        try:
+            os.unlink(self.__path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.unlink(os.path.join(self.directory, name))
+
+
+class CachingRequestHandler(AbstractRequestHandler):
+    """
+    Request handler serving the GET requests from a private HTTP cache and
+    sending the other requests to the decorated handler. The unsafe methods
+    invalidate the stored responses of their URI.
+
+    The requests with conditional headers and the streamed requests which can
+    not be served from the cache are sent as is, their responses are not stored.
+    """
+
+    def __init__(self, handler=None, max_entries=DEFAULT_MAX_ENTRIES, store=None,
+                 max_entry_size=DEFAULT_MAX_ENTRY_SIZE, clock=time):
+        """
+        @param handler the decorated AbstractRequestHandler, the default HttpRequestHandler if None.
+        @param max_entries the maximum number of URIs whose responses are kept in memory.
+        @param store None or the second level store, an object having the get(key),
+                     set(key, entries) and delete(key) methods of DiskStore.
+        @param max_entry_size the maximum size in bytes of a stored body.
+        @param clock the function returning the current time as a timestamp.
+        """
+        handler = handler if handler is not None else DEFAULT_REQUEST_HANDLER
+        assert_that_argument_type_is(handler, AbstractRequestHandler, "handler")
+        if max_entries < 1:
+            raise_illegal_argument("max_entries must be positive: {0}".format(max_entries))
+        self.handler = handler
+        self.max_entries = max_entries
+        self.store = store
+        self.max_entry_size = max_entry_size
+        self.__clock = clock
+        self.__lock = Lock()
+        self.__entries = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__revalidations = 0
+        self.__not_modified = 0
+        self.__stores = 0
+        self.__evictions = 0
+
+    def __send(self, uri, method, headers, body, stream=False):
+        return _handler_request(self.handler, uri, method, headers, body, stream)
+
+    def __variants(self, key):
+        with self.__lock:
+            entries = self.__entries.get(key)
+            if entries is not None:
+                self.__entries.move_to_end(key)
+                return entries
+        if self.store is None:
+            return None
+        entries = self.store.get(key)
+        if entries:
+            self.__keep(key, entries)
+        return entries
+
+    def __keep(self, key, entries):
+        with self.__lock:
+            self.__entries[key] = entries
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
+
+    def __save(self, key, entry):
+        entries = [variant for variant in (self.__variants(key) or ()) if variant.vary != entry.vary]
+        entries.append(entry)
+        self.__keep(key, entries)
+        if self.store is not None:
+            self.store.set(key, entries)
+        with self.__lock:
+            self.__stores += 1
+
+    def invalidate(self, uri):
+        """
+        Removes the stored responses of the given URI.
+        """
+        key = _cache_key(_uri(uri) if isinstance(uri, str) else uri)
+        with self.__lock:
+            self.__entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(key)
+
+    @staticmethod
+    def __is_usable(entry, directives, now):
+        """
+        Returns whether the stored response can be served without revalidation.
+        """
+        if entry.no_cache or "no-cache" in directives:
+            return False
+        age = entry.age(now)
+        max_age = _seconds(directives, "max-age")
+        if max_age is not None and age > max_age:
+            return False
+        min_fresh = _seconds(directives, "min-fresh")
+        if min_fresh is not None and entry.lifetime - age < min_fresh:
+            return False
+        if entry.lifetime > age:
+            return True
+        if "max-stale" not in directives or entry.must_revalidate:
+            return False
+        max_stale = _seconds(directives, "max-stale")
+        return max_stale is None or age - entry.lifetime <= max_stale
+
+    def __storable(self, response, request_headers):
+        """
+        Returns the Vary (name, value) pairs of a storable response, None if it is not storable.
+        """
+        fields = _fields(response.headers.items())
+        if response.status_code not in HEURISTICALLY_CACHEABLE or \
+                "no-store" in _parse_cache_control(fields.get("cache-control", ())):
+            return None
+        if response.body is None or len(response.body) > self.max_entry_size:
+            return None
+        vary = []
+        for value in fields.get("vary", ()):
+            for name in value.split(","):
+                name = name.strip().lower()
+                if name == "*":
+                    return None
+                if name:
+                    vary.append((name, _normalize_field(request_headers.get(name))))
+        return tuple(vary)
+
+    def request(self, uri, method=GET, headers=None, body=None, stream=False):
+        """
+        Sends the request, or serves it from the cache if it is a GET request
+        having a usable stored response.
+        """
+        uri = _uri(uri) if isinstance(uri, str) else uri
+        headers = headers if headers is not None else {}
+        if method != GET:
+            response = self.__send(uri, method, headers, body, stream)
+            if method not in _SAFE_METHODS and response.status_code < 400:
+                self.invalidate(uri)
+            return response
+        request_headers = _header_dict(headers)
+        directives = _parse_cache_control((request_headers.get("cache-control", ""),))
+        if "cache-control" not in request_headers and "no-cache" in request_headers.get("pragma", ""):
+            directives["no-cache"] = None
+        if "no-store" in directives or not _CONDITIONAL_HEADERS.isdisjoint(request_headers):
+            return self.__send(uri, method, headers, body, stream)
+        key = _cache_key(uri)
+        now = self.__clock()
+        entry = None
+        for variant in self.__variants(key) or ():
+            if variant.matches(request_headers):
+                entry = variant
+                break
+        if entry is not None and self.__is_usable(entry, directives, now):
+            with self.__lock:
+                self.__hits += 1
+            return entry.response(now)
+        if "only-if-cached" in directives:
+            with self.__lock:
+                self.__misses += 1
+            return Response(HTTPMessage(), b"", GATEWAY_TIMEOUT, "Gateway Timeout", 11)
+        validators = {}
+        if entry is not None:
+            if entry.etag is not None:
+                validators["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                validators["If-Modified-Since"] = entry.last_modified
+        with self.__lock:
+            if validators:
+                self.__revalidations += 1
+            else:
+                self.__misses += 1
+        if not validators:
+            if stream:
+                return self.__send(uri, method, headers, body, stream)
+            entry = None
+        request_time = self.__clock()
+        response = self.__send(uri, method, dict(headers, **validators) if validators else headers, body)
+        response_time = self.__clock()
+        if entry is not None and response.status_code == NOT_MODIFIED:
+            entry = entry.updated(list(response.headers.items()), request_time, response_time)
+            with self.__lock:
+                self.__not_modified += 1
+            self.__save(key, entry)
+            return entry.response(response_time)
+        vary = self.__storable(response, request_headers)
+        if vary is not None:
+            stored = _Entry(response, vary, request_time, response_time)
+            if stored.lifetime > 0 or stored.etag is not None or stored.last_modified is not None:
+                self.__save(key, stored)
+        return response
+
+    def clear(self):
+        """
+        Removes the responses kept in memory, the store is not affected.
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def statistics(self):
+        """
+        Returns the CacheStatistics of this handler.
+        """
+        with self.__lock:
+            return CacheStatistics(self.__hits, self.__misses, self.__revalidations, self.__not_modified,
+                                   self.__stores, self.__evictions, len(self.__entries))
+
+    def close(self):
+        close = getattr(self.handler, "close", None)
+        if close is not None:
+            close()
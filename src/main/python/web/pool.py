@@ -0,0 +1,386 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Thread-safe pool of HTTP connections.
+
+The connections are pooled per (scheme, host, port) key. The idle connections
+of a key form a LIFO stack: the most recently used connection, the most likely
+to be still open, is checked out first and the idle timeout evicts the bottom
+of the stack.
+
+The https connections share one SSLContext and the TLS session of the last
+connection to a server is given to the next one, so that a new socket to the
+same server resumes the session instead of doing a full handshake. The sockets
+are opened by a web.resolver.Connector, caching the resolved names and racing
+the addresses of the dual-stack servers.
+"""
+from collections import namedtuple, OrderedDict
+from http.client import HTTPConnection, HTTPSConnection
+import select
+import socket
+import ssl
+from threading import Lock, Condition
+from time import monotonic
+from .assertion import raise_illegal_argument
+from .resolver import Connector
+
+__author__ = 'Romain Gilles'
+
+DEFAULT_MAX_SIZE = 10
+# seconds an idle connection is kept
+DEFAULT_IDLE_TIMEOUT = 60.0
+# servers whose TLS session is kept for resumption
+DEFAULT_MAX_TLS_SESSIONS = 1024
+
+HTTPS_SCHEME = "https"
+
+PoolStatistics = namedtuple("PoolStatistics", "created reused dropped expired waits timeouts in_use idle")
+PoolStatistics.__doc__ = """
+Counters of a ConnectionPool: the connections created, the checkouts served by
+an idle connection, the idle connections found closed on checkout, the
+connections evicted by the idle timeout or the max lifetime, the checkouts
+which had to wait, the ones which failed, and the current number of checked
+out and idle connections.
+"""
+
+
+class PoolExhaustedError(Exception):
+    """
+    This error is raised when no connection of a key can be checked out,
+    immediately for a non blocking checkout or after the timeout.
+    """
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.key = key
+
+    @property
+    def message(self):
+        return "no connection available for {0}://{1}:{2}".format(*self.key)
+
+
+TLSStatistics = namedtuple("TLSStatistics", "handshakes resumed")
+TLSStatistics.__doc__ = """
+Counters of a ConnectionFactory: the TLS handshakes done and the ones which
+resumed a previous session.
+"""
+
+
+class _HTTPSConnection(HTTPSConnection):
+    """
+    HTTPSConnection offering the last session of its server on connect.
+    """
+
+    def __init__(self, host, port, timeout, factory):
+        super().__init__(host, port, timeout=timeout, context=factory.ssl_context)
+        self.__factory = factory
+
+    def __session_key(self):
+        return self._tunnel_host or self.host, self.port
+
+    def connect(self):
+        HTTPConnection.connect(self)
+        key = self.__session_key()
+        self.sock = self.__factory.ssl_context.wrap_socket(self.sock, server_hostname=key[0],
+                                                           session=self.__factory._session(key))
+        self.__factory._connected(key, self.sock)
+
+    def getresponse(self):
+        response = super().getresponse()
+        # the TLS 1.3 session tickets are only received with the first response
+        if self.sock is not None:
+            self.__factory._connected(self.__session_key(), self.sock, handshake=False)
+        return response
+
+
+class ConnectionFactory(object):
+    """
+    Default connection factory of the pools: HTTPConnection for the http scheme
+    and HTTPSConnection sharing the ssl_context and resuming the TLS sessions
+    for the https scheme. The sockets of the connections are opened by the connector.
+    """
+
+    def __init__(self, ssl_context=None, max_sessions=DEFAULT_MAX_TLS_SESSIONS, connector=None):
+        """
+        @param ssl_context the SSLContext of the https connections, ssl.create_default_context() if None.
+        @param max_sessions the number of servers whose last TLS session is kept.
+        @param connector the callable opening the sockets, with the signature of
+                         socket.create_connection, a web.resolver.Connector if None.
+        """
+        self.__ssl_context = ssl_context
+        self.max_sessions = max_sessions
+        self.connector = connector if connector is not None else Connector()
+        self.__lock = Lock()
+        self.__sessions = OrderedDict()
+        self.__handshakes = 0
+        self.__resumed = 0
+
+    @property
+    def ssl_context(self):
+        """
+        The SSLContext shared by the https connections, the default one is only
+        created for the first https connection.
+        """
+        if self.__ssl_context is None:
+            with self.__lock:
+                if self.__ssl_context is None:
+                    self.__ssl_context = ssl.create_default_context()
+        return self.__ssl_context
+
+    def __call__(self, scheme, host, port, timeout):
+        if timeout is None:
+            # the default timeout of the socket module, as the connections created by http.client
+            timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+        if scheme == HTTPS_SCHEME:
+            connection = _HTTPSConnection(host, port, timeout, self)
+        else:
+            connection = HTTPConnection(host, port, timeout=timeout)
+        # HTTPConnection.connect opens its socket with this function
+        connection._create_connection = self.connector
+        return connection
+
+    def _session(self, key):
+        with self.__lock:
+            return self.__sessions.get(key)
+
+    def _connected(self, key, sock, handshake=True):
+        """
+        Records the session of the given TLS socket as the last one of its server.
+        """
+        session = sock.session
+        with self.__lock:
+            if handshake:
+                self.__handshakes += 1
+                if sock.session_reused:
+                    self.__resumed += 1
+            if session is None:
+                return
+            self.__sessions[key] = session
+            self.__sessions.move_to_end(key)
+            if len(self.__sessions) > self.max_sessions:
+                self.__sessions.popitem(last=False)
+
+    def statistics(self):
+        """
+        Returns the TLSStatistics of the connections created by this factory.
+        """
+        with self.__lock:
+            return TLSStatistics(self.__handshakes, self.__resumed)
+
+
+def _is_dropped(connection):
+    """
+    Returns True if the given idle connection can not be reused: its socket is
+    closed, or readable which means the peer closed it or sent unexpected data.
+    """
+    sock = connection.sock
+    if sock is None:
+        return True
+    try:
+        if hasattr(select, "poll"):
+            poller = select.poll()
+            poller.register(sock, select.POLLIN)
+            return bool(poller.poll(0))
+        return bool(select.select([sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class _Entry(object):
+    __slots__ = 'connection', 'created', 'released'
+
+    def __init__(self, connection, created):
+        self.connection = connection
+        self.created = created
+        self.released = created
+
+
+class _HostPool(object):
+    """
+    Connections of one key, guarded by the lock of the ConnectionPool.
+    """
+    __slots__ = 'idle', 'in_use', 'available'
+
+    def __init__(self, lock):
+        # LIFO stack of the idle entries, the most recently released last
+        self.idle = []
+        self.in_use = 0
+        self.available = Condition(lock)
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of HTTP connections per (scheme, host, port).
+
+    A checkout returns an idle connection of the key if any, after dropping the
+    idle connections closed by the peer or expired, or creates a new one while
+    the key has less than max_size connections. Otherwise a blocking checkout
+    waits for a connection to be released, until the timeout if any, and a non
+    blocking checkout fails immediately with PoolExhaustedError.
+
+    connection = pool.acquire("http", "www.google.com", 80)
+    try:
+        connection.request("GET", "/")
+        response = connection.getresponse()
+        response.read()
+    finally:
+        pool.release(connection, reusable=not response.will_close)
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, block=True, timeout=None, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 max_lifetime=None, connection_timeout=None, factory=None, clock=monotonic):
+        """
+        @param max_size the maximum number of connections, idle and checked out, per key.
+        @param block the default checkout mode when the key has max_size connections.
+        @param timeout the default maximum time in seconds a blocking checkout waits, None to wait forever.
+        @param idle_timeout the time in seconds after which an idle connection is closed, None to keep it.
+        @param max_lifetime the time in seconds after its creation a connection is closed, None to keep it.
+        @param connection_timeout the socket timeout given to the factory, None for the
+                                  default timeout of the socket module, see socket.setdefaulttimeout.
+        @param factory the callable creating a connection from (scheme, host, port, connection_timeout),
+                       a ConnectionFactory if None.
+        """
+        if max_size < 1:
+            raise_illegal_argument("max_size must be positive: {0}".format(max_size))
+        self.max_size = max_size
+        self.block = block
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.connection_timeout = connection_timeout
+        self.factory = factory if factory is not None else ConnectionFactory()
+        self.__clock = clock
+        self.__lock = Lock()
+        self.__hosts = {}
+        # entries of the checked out connections
+        self.__checked_out = {}
+        self.__created = 0
+        self.__reused = 0
+        self.__dropped = 0
+        self.__expired = 0
+        self.__waits = 0
+        self.__timeouts = 0
+
+    def __is_expired(self, entry, now):
+        if self.max_lifetime is not None and now - entry.created >= self.max_lifetime:
+            return True
+        return self.idle_timeout is not None and now - entry.released >= self.idle_timeout
+
+    def __evict(self, host_pool, now):
+        """
+        Removes the expired idle connections of a key, returns them to be closed.
+        """
+        kept = []
+        evicted = []
+        for entry in host_pool.idle:
+            (evicted if self.__is_expired(entry, now) else kept).append(entry)
+        if evicted:
+            host_pool.idle = kept
+            self.__expired += len(evicted)
+        return evicted
+
+    def acquire(self, scheme, host, port, block=None, timeout=None):
+        """
+        Checks out a connection to the given server.
+
+        @param block None for the default mode of the pool.
+        @param timeout None for the default timeout of the pool.
+        @exception PoolExhaustedError if no connection can be checked out.
+        """
+        key = scheme, host, port
+        block = self.block if block is None else block
+        timeout = self.timeout if timeout is None else timeout
+        to_close = []
+        try:
+            with self.__lock:
+                host_pool = self.__hosts.get(key)
+                if host_pool is None:
+                    host_pool = self.__hosts[key] = _HostPool(self.__lock)
+                waited = deadline = None
+                while True:
+                    now = self.__clock()
+                    to_close.extend(self.__evict(host_pool, now))
+                    while host_pool.idle:
+                        entry = host_pool.idle.pop()
+                        if _is_dropped(entry.connection):
+                            self.__dropped += 1
+                            to_close.append(entry)
+                            continue
+                        self.__reused += 1
+                        return self.__check_out(host_pool, entry)
+                    if host_pool.in_use < self.max_size:
+                        entry = _Entry(self.factory(scheme, host, port, self.connection_timeout), now)
+                        self.__created += 1
+                        return self.__check_out(host_pool, entry)
+                    if not block:
+                        self.__timeouts += 1
+                        raise PoolExhaustedError(key)
+                    if waited is None:
+                        self.__waits += 1
+                        waited = True
+                        deadline = None if timeout is None else monotonic() + timeout
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if remaining is not None and remaining <= 0 or not host_pool.available.wait(remaining):
+                        self.__timeouts += 1
+                        raise PoolExhaustedError(key)
+        finally:
+            for entry in to_close:
+                entry.connection.close()
+
+    def __check_out(self, host_pool, entry):
+        host_pool.in_use += 1
+        self.__checked_out[entry.connection] = host_pool, entry
+        return entry.connection
+
+    def release(self, connection, reusable=True):
+        """
+        Returns a checked out connection to the pool. A connection which is not
+        reusable (response not read, connection: close, error...) is closed.
+        """
+        with self.__lock:
+            host_pool, entry = self.__checked_out.pop(connection)
+            host_pool.in_use -= 1
+            now = self.__clock()
+            entry.released = now
+            keep = reusable and not self.__is_expired(entry, now)
+            if keep:
+                host_pool.idle.append(entry)
+            elif reusable:
+                self.__expired += 1
+            host_pool.available.notify()
+        if not keep:
+            connection.close()
+
+    def clear(self):
+        """
+        Closes the idle connections. The checked out connections are not
+        affected and the pool stays usable.
+        """
+        with self.__lock:
+            entries = [entry for host_pool in self.__hosts.values() for entry in host_pool.idle]
+            for host_pool in self.__hosts.values():
+                host_pool.idle = []
+        for entry in entries:
+            entry.connection.close()
+
+    def statistics(self):
+        """
+        Returns the PoolStatistics of this pool.
+        """
+        with self.__lock:
+            return PoolStatistics(self.__created, self.__reused, self.__dropped, self.__expired, self.__waits,
+                                  self.__timeouts, len(self.__checked_out),
+                                  sum(len(host_pool.idle) for host_pool in self.__hosts.values()))
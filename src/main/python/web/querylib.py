@@ -0,0 +1,188 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Structured access to the query component of a URI.
+"""
+from .assertion import iterable, raise_illegal_argument
+from .codec import encode_query_param, decode_query_param, KEY_VALUE_SEPARATOR
+
+__author__ = 'Romain Gilles'
+
+DEFAULT_SEPARATOR = "&"
+
+
+class QueryParams(object):
+    """
+    Ordered multi-dict of query parameters.
+
+    The query string is only parsed on the first access to the parameters, and
+    is returned as is by str() while no parameter is modified. Every parameter
+    keeps its encoded form so that adding, replacing or removing parameters
+    never encodes the others again.
+
+    params = QueryParams("q=uri&page=2")
+    params.add("filter", "a b").replace("page", 3)
+    str(params) == "q=uri&page=3&filter=a%20b"
+    """
+    __slots__ = '__query', '__params', '__separator'
+
+    def __init__(self, query=None, separator=DEFAULT_SEPARATOR):
+        """
+        @param query None, an encoded query string, a mapping or an iterable
+                     of (key, value) pairs.
+        """
+        self.__separator = separator
+        self.__query = None
+        self.__params = None
+        if query is None:
+            self.__params = []
+        elif isinstance(query, str):
+            self.__query = query
+        elif isinstance(query, QueryParams):
+            self.__params = list(query.__parsed())
+        elif hasattr(query, "items"):
+            self.__params = [self.__param(key, value) for key, value in query.items()]
+        elif iterable(query):
+            self.__params = [self.__param(key, value) for key, value in query]
+        else:
+            raise_illegal_argument("query must be a string, a mapping or an iterable of pairs: {0}".format(query))
+
+    @staticmethod
+    def __param(key, value):
+        key = str(key)
+        value = str(value)
+        return key, value, encode_query_param(key) + KEY_VALUE_SEPARATOR + encode_query_param(value)
+
+    def __parsed(self):
+        """
+        Returns the (key, value, encoded parameter) list, parsing the query string if needed.
+        """
+        params = self.__params
+        if params is None:
+            params = []
+            if self.__query:
+                for encoded in self.__query.split(self.__separator):
+                    if not encoded:
+                        continue
+                    key, _, value = encoded.partition(KEY_VALUE_SEPARATOR)
+                    params.append((decode_query_param(key), decode_query_param(value), encoded))
+            self.__params = params
+        return params
+
+    def __modified(self):
+        params = self.__parsed()
+        # the query string has to be joined again
+        self.__query = None
+        return params
+
+    def __str__(self):
+        query = self.__query
+        if query is None:
+            query = self.__separator.join([encoded for _, _, encoded in self.__params])
+            self.__query = query
+        return query
+
+    def __repr__(self):
+        return "QueryParams({0!r})".format(self.items())
+
+    def __len__(self):
+        return len(self.__parsed())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, key):
+        return any(param[0] == key for param in self.__parsed())
+
+    def __eq__(self, other):
+        if not isinstance(other, QueryParams):
+            return NotImplemented
+        return self.items() == other.items()
+
+    def __getitem__(self, key):
+        for param in self.__parsed():
+            if param[0] == key:
+                return param[1]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        """
+        Returns the first value of the given key, default if the key is not present.
+        """
+        for param in self.__parsed():
+            if param[0] == key:
+                return param[1]
+        return default
+
+    def get_all(self, key):
+        """
+        Returns the list of the values of the given key.
+        """
+        return [value for param_key, value, _ in self.__parsed() if param_key == key]
+
+    def keys(self):
+        """
+        Returns the list of the keys in order, a key present several times is returned once.
+        """
+        return list(dict.fromkeys(key for key, _, _ in self.__parsed()))
+
+    def items(self):
+        """
+        Returns the list of the (key, value) pairs in order.
+        """
+        return [(key, value) for key, value, _ in self.__parsed()]
+
+    def add(self, key, value):
+        """
+        Appends a parameter, the existing parameters with the same key are kept.
+        """
+        param = self.__param(key, value)
+        # still the string form of the parameters, only the new one has to be joined
+        query = self.__query
+        self.__modified().append(param)
+        if query is not None:
+            self.__query = "{0}{1}{2}".format(query, self.__separator, param[2]) if query else param[2]
+        return self
+
+    def replace(self, key, value):
+        """
+        Replaces the first parameter with the given key and removes the others,
+        appends the parameter if the key is not present.
+        """
+        key = str(key)
+        params = self.__modified()
+        indexes = [index for index, param in enumerate(params) if param[0] == key]
+        if not indexes:
+            return self.add(key, value)
+        params[indexes[0]] = self.__param(key, value)
+        for index in reversed(indexes[1:]):
+            del params[index]
+        return self
+
+    def remove(self, key):
+        """
+        Removes all the parameters with the given key.
+        raise KeyError if the key is not present.
+        """
+        params = self.__modified()
+        kept = [param for param in params if param[0] != key]
+        if len(kept) == len(params):
+            raise KeyError(key)
+        params[:] = kept
+        return self
+
+    def copy(self):
+        return QueryParams(self, self.__separator)
@@ -0,0 +1,205 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Concurrent execution of many requests.
+
+The requests are run by a pool of worker threads sharing the current request
+handler, hence its connection pool. A dispatcher running in the thread of the
+caller only submits the requests of the authorities having less than
+per_host_limit requests in flight, so a slow server does not hold the workers
+needed by the other ones:
+
+    for result in request_many(uris, max_workers=32, per_host_limit=4):
+        if result.error is None:
+            handle(result.uri, result.response)
+"""
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .assertion import iterable, raise_illegal_argument
+from .urilib import URI, _uri, _request, _normalize_authority
+from web import HTTP_GET as GET
+
+__author__ = 'Romain Gilles'
+
+DEFAULT_MAX_WORKERS = 10
+# requests read ahead per worker, to find the ones of the authorities having capacity
+LOOKAHEAD = 4
+
+RequestResult = namedtuple("RequestResult", "index uri response error")
+RequestResult.__doc__ = """
+Result of a request of request_many: its index in the requests, its URI, and
+its Response or the exception it raised, the other field being None.
+"""
+
+
+def _request_arguments(item):
+    """
+    Returns the (uri, method, body, headers) of a request given as a URI, a string
+    or a tuple of the arguments of web.request.
+    """
+    if isinstance(item, (URI, str)):
+        return _uri(item) if isinstance(item, str) else item, GET, None, None
+    if isinstance(item, tuple) and 1 <= len(item) <= 4:
+        uri, method, body, headers = item + (None,) * (4 - len(item))
+        if isinstance(uri, (URI, str)):
+            return _uri(uri) if isinstance(uri, str) else uri, method or GET, body, headers
+    raise_illegal_argument("a request must be a URI, a string or a (uri, method, body, headers) tuple: {0!r}"
+                           .format(item))
+
+
+def _authority(uri):
+    scheme = uri.scheme.lower()
+    authority = uri.authority
+    return scheme, _normalize_authority(scheme, authority) if authority else authority
+
+
+def _run(uri, method, body, headers):
+    return _request(uri, method, headers, body)
+
+
+class _Dispatcher(object):
+    """
+    Queues of the requests per authority and count of their requests in flight.
+    """
+
+    def __init__(self, requests, executor, max_workers, per_host_limit):
+        self.__requests = iter(requests)
+        self.__executor = executor
+        self.__max_workers = max_workers
+        self.__per_host_limit = per_host_limit
+        self.__index = 0
+        self.__exhausted = False
+        self.__queued = 0
+        self.__queues = {}
+        # authorities with queued requests and capacity, round robin
+        self.__ready = deque()
+        self.__in_flight = {}
+        self.futures = {}
+
+    def __has_capacity(self, authority):
+        return self.__per_host_limit is None or self.__in_flight.get(authority, 0) < self.__per_host_limit
+
+    def __read(self):
+        """
+        Reads the next request into the queue of its authority.
+        """
+        try:
+            item = next(self.__requests)
+        except StopIteration:
+            self.__exhausted = True
+            return
+        uri, method, body, headers = _request_arguments(item)
+        authority = _authority(uri)
+        queue = self.__queues.get(authority)
+        if queue is None:
+            queue = self.__queues[authority] = deque()
+        if not queue and self.__has_capacity(authority):
+            self.__ready.append(authority)
+        queue.append((self.__index, uri, method, body, headers))
+        self.__index += 1
+        self.__queued += 1
+
+    def dispatch(self):
+        """
+        Submits the queued requests while there are idle workers and authorities with capacity.
+        """
+        max_queued = self.__max_workers * LOOKAHEAD
+        while len(self.futures) < self.__max_workers:
+            while not self.__exhausted and self.__queued < max_queued and \
+                    (not self.__ready or self.__queued < self.__max_workers):
+                self.__read()
+            if not self.__ready:
+                return
+            authority = self.__ready.popleft()
+            queue = self.__queues[authority]
+            index, uri, method, body, headers = queue.popleft()
+            self.__queued -= 1
+            if not queue:
+                del self.__queues[authority]
+            in_flight = self.__in_flight[authority] = self.__in_flight.get(authority, 0) + 1
+            if queue and (self.__per_host_limit is None or in_flight < self.__per_host_limit):
+                self.__ready.append(authority)
+            self.futures[self.__executor.submit(_run, uri, method, body, headers)] = index, uri, authority
+
+    def done(self):
+        return self.__exhausted and not self.__queued and not self.futures
+
+    def complete(self, future):
+        """
+        Returns the RequestResult of the given completed future and frees its slot.
+        """
+        index, uri, authority = self.futures.pop(future)
+        in_flight = self.__in_flight[authority] - 1
+        if in_flight:
+            self.__in_flight[authority] = in_flight
+        else:
+            del self.__in_flight[authority]
+        if self.__per_host_limit is not None and in_flight == self.__per_host_limit - 1 and \
+                authority in self.__queues:
+            self.__ready.append(authority)
+        error = future.exception()
+        return RequestResult(index, uri, None if error is not None else future.result(), error)
+
+
+def request_many(requests, max_workers=DEFAULT_MAX_WORKERS, per_host_limit=None, ordered=False):
+    """
+    Sends the given requests concurrently with the current request handler and
+    iterates over their RequestResult. The requests are read lazily, at most
+    LOOKAHEAD times max_workers requests wait for a worker. The failure of a
+    request is given by its result, the other requests go on. Closing the
+    iterator cancels the requests not started and waits for the running ones.
+
+    @param requests an iterable of URIs, strings or (uri, method, body, headers)
+                    tuples, the trailing elements of a tuple being optional.
+    @param max_workers the number of requests in flight.
+    @param per_host_limit the maximum number of requests in flight per authority,
+                          the scheme and the normalized URI.authority, None for no limit.
+                          The connection pool of the handler bounds it too.
+    @param ordered if True the results are given in the order of the requests,
+                   otherwise as soon as they complete.
+    """
+    if not iterable(requests):
+        raise_illegal_argument("requests must be an iterable: {0}".format(requests))
+    if max_workers < 1:
+        raise_illegal_argument("max_workers must be positive: {0}".format(max_workers))
+    if per_host_limit is not None and per_host_limit < 1:
+        raise_illegal_argument("per_host_limit must be positive: {0}".format(per_host_limit))
+    return _results(requests, max_workers, per_host_limit, ordered)
+
+
+def _results(requests, max_workers, per_host_limit, ordered):
+    executor = ThreadPoolExecutor(max_workers, thread_name_prefix="request_many")
+    dispatcher = _Dispatcher(requests, executor, max_workers, per_host_limit)
+    # results completed before the ones preceding them
+    completed = {}
+    next_index = 0
+    try:
+        dispatcher.dispatch()
+        while not dispatcher.done():
+            finished, _ = wait(dispatcher.futures, return_when=FIRST_COMPLETED)
+            results = [dispatcher.complete(future) for future in finished]
+            dispatcher.dispatch()
+            if not ordered:
+                results.sort()
+                yield from results
+                continue
+            for result in results:
+                completed[result.index] = result
+            while next_index in completed:
+                yield completed.pop(next_index)
+                next_index += 1
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
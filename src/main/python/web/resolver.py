@@ -0,0 +1,315 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Name resolution and connection racing of the new pooled connections.
+
+A resolver is a callable returning the socket.getaddrinfo entries of a (host, port)
+pair. The CachingResolver keeps the entries of a name for a bounded time, the
+system resolver does not give the TTL of its records, so that the connections
+opened to a server do not resolve its name again.
+
+The Connector opens the connections in place of socket.create_connection, as
+described by RFC 8305 (Happy Eyeballs): the addresses are interleaved by family,
+a connection attempt is started every delay seconds or as soon as the previous
+one fails, and the first attempt which succeeds wins. A broken IPv6 route of a
+dual-stack host costs the delay instead of a connect timeout.
+
+    factory = ConnectionFactory(connector=Connector(CachingResolver(ttl=30), delay=0.25))
+    handler = HttpRequestHandler(ConnectionPool(factory=factory))
+"""
+from collections import namedtuple, OrderedDict
+from errno import EINPROGRESS, EWOULDBLOCK, EAGAIN
+import os
+import selectors
+import socket
+from threading import Lock
+from time import monotonic
+from .assertion import raise_illegal_argument
+
+__author__ = 'Romain Gilles'
+
+# seconds a resolved name is kept
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_ENTRIES = 1024
+# RFC 8305 section 5: the recommended connection attempt delay
+DEFAULT_CONNECTION_ATTEMPT_DELAY = 0.25
+
+_IN_PROGRESS = frozenset((0, EINPROGRESS, EWOULDBLOCK, EAGAIN))
+
+ResolverStatistics = namedtuple("ResolverStatistics", "hits misses expired entries")
+ResolverStatistics.__doc__ = """
+Counters of a CachingResolver: the names served from the cache, the names
+resolved, the entries found expired, and the current number of entries.
+"""
+
+ConnectStatistics = namedtuple("ConnectStatistics",
+                               "connections failures fallbacks resolve_time connect_time")
+ConnectStatistics.__doc__ = """
+Counters of a Connector: the connections opened, the ones which failed, the
+connections opened to another address than the first one, and the total time
+in seconds spent resolving the names and connecting the sockets.
+"""
+
+
+def system_resolver(host, port):
+    """
+    Resolves the given name with socket.getaddrinfo, for the stream sockets.
+    """
+    return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+
+class CachingResolver(object):
+    """
+    Thread-safe resolver keeping the entries of the resolved names for ttl
+    seconds, at most max_entries names in least recently used order. The
+    failures are not cached.
+    """
+
+    def __init__(self, resolver=system_resolver, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, clock=monotonic):
+        """
+        @param resolver the callable returning the getaddrinfo entries of a (host, port) pair.
+        @param ttl the time in seconds the entries of a name are kept.
+        @param max_entries the maximum number of names kept.
+        @param clock the function returning the current time in seconds.
+        """
+        if ttl < 0:
+            raise_illegal_argument("ttl must not be negative: {0}".format(ttl))
+        if max_entries < 1:
+            raise_illegal_argument("max_entries must be positive: {0}".format(max_entries))
+        self.resolver = resolver
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.__clock = clock
+        self.__lock = Lock()
+        # (host, port) -> (expiration time, entries)
+        self.__entries = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__expired = 0
+
+    def __call__(self, host, port):
+        key = host, port
+        with self.__lock:
+            cached = self.__entries.get(key)
+            if cached is not None:
+                if cached[0] > self.__clock():
+                    self.__entries.move_to_end(key)
+                    self.__hits += 1
+                    return cached[1]
+                del self.__entries[key]
+                self.__expired += 1
+            self.__misses += 1
+        # the lock is not held while the name is resolved
+        entries = list(self.resolver(host, port))
+        with self.__lock:
+            self.__entries[key] = self.__clock() + self.ttl, entries
+            self.__entries.move_to_end(key)
+            if len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+        return entries
+
+    def invalidate(self, host, port):
+        """
+        Removes the entries of the given name, for instance after a failed connection.
+        """
+        with self.__lock:
+            self.__entries.pop((host, port), None)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def statistics(self):
+        """
+        Returns the ResolverStatistics of this resolver.
+        """
+        with self.__lock:
+            return ResolverStatistics(self.__hits, self.__misses, self.__expired, len(self.__entries))
+
+
+def interleave(entries, first_family_count=1):
+    """
+    Returns the given getaddrinfo entries reordered as described by RFC 8305
+    section 4: first_family_count addresses of the family of the first entry,
+    then the addresses of the two families in turn, each family in its order.
+    """
+    families = OrderedDict()
+    for entry in entries:
+        families.setdefault(entry[0], []).append(entry)
+    if len(families) < 2:
+        return list(entries)
+    groups = list(families.values())
+    result = groups[0][:first_family_count]
+    # the other family comes next
+    groups = groups[1:] + [groups[0][first_family_count:]]
+    while any(groups):
+        for group in groups:
+            if group:
+                result.append(group.pop(0))
+    return result
+
+
+class Connector(object):
+    """
+    Callable opening the connected sockets of the HTTP connections in place of
+    socket.create_connection, see web.resolver.
+    """
+
+    def __init__(self, resolver=None, delay=DEFAULT_CONNECTION_ATTEMPT_DELAY, first_family_count=1):
+        """
+        @param resolver the callable returning the getaddrinfo entries of a (host, port)
+                        pair, a CachingResolver of the system resolver if None.
+        @param delay the time in seconds before the next address is attempted
+                     while the previous attempts are in progress.
+        @param first_family_count the number of addresses of the first family
+                                  attempted before the other family.
+        """
+        if delay < 0:
+            raise_illegal_argument("delay must not be negative: {0}".format(delay))
+        self.resolver = resolver if resolver is not None else CachingResolver()
+        self.delay = delay
+        self.first_family_count = first_family_count
+        self.__lock = Lock()
+        self.__connections = 0
+        self.__failures = 0
+        self.__fallbacks = 0
+        self.__resolve_time = 0.0
+        self.__connect_time = 0.0
+
+    def __call__(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        """
+        Returns a socket connected to the given (host, port) address.
+
+        @param timeout the maximum time in seconds to connect and the timeout of the
+                       returned socket, None to wait forever, the default timeout
+                       of the socket module if not given.
+        @exception OSError the error of the first attempt if none succeeds,
+                           TimeoutError if none succeeds before the timeout.
+        """
+        if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+            timeout = socket.getdefaulttimeout()
+        host, port = address
+        start = monotonic()
+        try:
+            entries = interleave(self.resolver(host, port), self.first_family_count)
+        except BaseException:
+            self.__count(failures=1, resolve_time=monotonic() - start)
+            raise
+        resolved = monotonic()
+        try:
+            sock, index = self.__race(entries, timeout, source_address, resolved)
+        except BaseException:
+            self.__count(failures=1, resolve_time=resolved - start, connect_time=monotonic() - resolved)
+            # the server may have moved to other addresses
+            invalidate = getattr(self.resolver, "invalidate", None)
+            if invalidate is not None:
+                invalidate(host, port)
+            raise
+        self.__count(connections=1, fallbacks=1 if index else 0, resolve_time=resolved - start,
+                     connect_time=monotonic() - resolved)
+        return sock
+
+    def __race(self, entries, timeout, source_address, start):
+        """
+        Returns the first socket connected to one of the given entries and the
+        index of its entry.
+        """
+        if len(entries) == 1:
+            # nothing to race, a blocking connect avoids the selector
+            family, type_, proto, _, sockaddr = entries[0]
+            sock = socket.socket(family, type_, proto)
+            try:
+                sock.settimeout(timeout)
+                if source_address is not None:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+            except BaseException:
+                sock.close()
+                raise
+            return sock, 0
+        deadline = None if timeout is None else start + timeout
+        selector = selectors.DefaultSelector()
+        attempts = {}
+        errors = []
+        next_attempt = start
+        index = 0
+        try:
+            while True:
+                now = monotonic()
+                if index < len(entries) and (not attempts or now >= next_attempt):
+                    family, type_, proto, _, sockaddr = entries[index]
+                    sock = None
+                    try:
+                        sock = socket.socket(family, type_, proto)
+                        sock.setblocking(False)
+                        if source_address is not None:
+                            sock.bind(source_address)
+                        error = sock.connect_ex(sockaddr)
+                        if error not in _IN_PROGRESS:
+                            raise OSError(error, os.strerror(error))
+                    except OSError as error:
+                        if sock is not None:
+                            sock.close()
+                        errors.append(error)
+                    else:
+                        selector.register(sock, selectors.EVENT_WRITE, index)
+                        attempts[sock] = index
+                        next_attempt = now + self.delay
+                    index += 1
+                    continue
+                if not attempts:
+                    if errors:
+                        raise errors[0]
+                    raise OSError("no address to connect to")
+                remaining = None if deadline is None else deadline - now
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("timed out")
+                wait = next_attempt - now if index < len(entries) else None
+                if wait is None or remaining is not None and remaining < wait:
+                    wait = remaining
+                for key, _ in selector.select(wait):
+                    sock = key.fileobj
+                    selector.unregister(sock)
+                    del attempts[sock]
+                    error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error == 0:
+                        sock.settimeout(timeout)
+                        return sock, key.data
+                    sock.close()
+                    errors.append(OSError(error, os.strerror(error)))
+                    # a failed attempt starts the next one at once
+                    next_attempt = monotonic()
+        finally:
+            selector.close()
+            # the attempts still in progress lost the race
+            for sock in attempts:
+                sock.close()
+
+    def __count(self, connections=0, failures=0, fallbacks=0, resolve_time=0.0, connect_time=0.0):
+        with self.__lock:
+            self.__connections += connections
+            self.__failures += failures
+            self.__fallbacks += fallbacks
+            self.__resolve_time += resolve_time
+            self.__connect_time += connect_time
+
+    def statistics(self):
+        """
+        Returns the ConnectStatistics of this connector.
+        """
+        with self.__lock:
+            return ConnectStatistics(self.__connections, self.__failures, self.__fallbacks, self.__resolve_time,
+                                     self.__connect_time)
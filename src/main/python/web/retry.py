@@ -0,0 +1,158 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Replay of the idempotent requests (RFC 9110 section 9.2.2).
+
+A server may close an idle keep-alive connection at the time a request is
+written on it: the request then fails with RemoteDisconnected, BrokenPipeError
+or ConnectionResetError although the server never processed it. Such a failure
+of a reused connection is replayed at once on a new connection.
+
+The other failures, and the responses whose status is listed by the RetryPolicy,
+are retried up to max_retries times, after an exponential backoff with jitter:
+
+    handler = HttpRequestHandler(retry_policy=RetryPolicy(max_retries=3, backoff_factor=0.2))
+
+Only the idempotent methods are replayed, and only if their body can be sent
+again: None, bytes, str, a buffer or a seekable file, which is rewound.
+"""
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+import random
+from time import time
+from .assertion import raise_illegal_argument
+from .body import _view
+from web import HTTP_GET, HTTP_HEAD, HTTP_PUT, HTTP_DELETE, HTTP_OPTIONS, HTTP_TRACE
+
+__author__ = 'Romain Gilles'
+
+IDEMPOTENT_METHODS = frozenset((HTTP_GET, HTTP_HEAD, HTTP_PUT, HTTP_DELETE, HTTP_OPTIONS, HTTP_TRACE))
+# statuses telling that the server or a gateway is temporarily unavailable
+RETRY_STATUSES = frozenset((502, 503, 504))
+# failures of a request before any response, RemoteDisconnected is a ConnectionResetError
+RETRY_ERRORS = (ConnectionError, TimeoutError)
+# failures of a reused connection closed by the server while idle
+STALE_CONNECTION_ERRORS = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.1
+DEFAULT_MAX_BACKOFF = 10.0
+
+RETRY_AFTER = "Retry-After"
+
+RetryStatistics = namedtuple("RetryStatistics", "replayed retries exhausted")
+RetryStatistics.__doc__ = """
+Counters of a request handler: the requests replayed after the failure of a
+stale connection, the retries done after a backoff, and the requests which
+failed or got a retryable status once their retries were exhausted.
+"""
+
+
+class RetryPolicy(object):
+    """
+    Retries of the failed idempotent requests with an exponential backoff:
+    the nth retry waits min(max_backoff, backoff_factor * 2 ** (n - 1)) seconds,
+    reduced by a random fraction up to jitter so that the clients failing
+    together do not retry together. A Retry-After header of a retried response
+    gives the delay instead, up to max_backoff.
+    """
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 max_backoff=DEFAULT_MAX_BACKOFF, jitter=1.0, statuses=RETRY_STATUSES, errors=RETRY_ERRORS,
+                 methods=IDEMPOTENT_METHODS, random=random.random):
+        """
+        @param max_retries the maximum number of retries of a request, 0 to only replay
+                           the requests failed by a stale connection.
+        @param backoff_factor the delay in seconds before the first retry.
+        @param max_backoff the maximum delay in seconds before a retry.
+        @param jitter the maximum fraction of the delay randomly removed, 1.0 for
+                      a delay uniformly distributed between 0 and the backoff.
+        @param statuses the statuses of the responses retried.
+        @param errors the exception classes of the failures retried.
+        @param methods the methods replayed and retried, the idempotent ones.
+        @param random the function returning a random float in [0, 1).
+        """
+        if max_retries < 0:
+            raise_illegal_argument("max_retries must not be negative: {0}".format(max_retries))
+        if backoff_factor < 0 or max_backoff < 0:
+            raise_illegal_argument("the backoff must not be negative: {0}, {1}".format(backoff_factor, max_backoff))
+        if not 0 <= jitter <= 1:
+            raise_illegal_argument("jitter must be between 0 and 1: {0}".format(jitter))
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.errors = tuple(errors)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.__random = random
+
+    def replays(self, method):
+        """
+        Returns whether the requests of the given method can be replayed.
+        """
+        return method.upper() in self.methods
+
+    def backoff(self, retry, retry_after=None):
+        """
+        Returns the delay in seconds before the given retry, 1 for the first one.
+
+        @param retry_after the value of the Retry-After header of the retried response if any.
+        """
+        delay = _retry_after(retry_after) if retry_after is not None else None
+        if delay is not None:
+            return min(delay, self.max_backoff)
+        delay = min(self.max_backoff, self.backoff_factor * 2 ** (retry - 1))
+        return delay * (1 - self.jitter * self.__random())
+
+
+# no retry, only the replay of the requests failed by a stale connection
+NO_RETRY = RetryPolicy(max_retries=0, statuses=(), errors=())
+
+
+def _retry_after(value, clock=time):
+    """
+    Returns the delay in seconds given by a Retry-After header, delay-seconds or
+    HTTP-date, None if it is not valid.
+    """
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - clock())
+    except (TypeError, ValueError):
+        return None
+
+
+def _no_rewind():
+    pass
+
+
+def rewinder(body):
+    """
+    Returns a function restoring the given body to be sent again, None if the
+    body can not be sent twice (iterator, unseekable file...).
+    """
+    if body is None or isinstance(body, (bytes, str)) or _view(body) is not None:
+        return _no_rewind
+    if hasattr(body, "read"):
+        try:
+            if body.seekable():
+                position = body.tell()
+                return lambda: body.seek(position)
+        except (AttributeError, OSError, ValueError):
+            pass
+    return None
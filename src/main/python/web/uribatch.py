@@ -0,0 +1,221 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Columnar parsing of large URI collections.
+
+The strings are concatenated into one shared buffer and every row is
+described by the offsets of its components into that buffer. Columns
+are computed on demand and URI instances are only created for the
+requested rows.
+"""
+from array import array
+from io import StringIO
+from .assertion import iterable, raise_illegal_argument, assert_that_argument_type_is
+from .urilib import URI, _parse, SCHEME_END, HOST_START, HOST_END, PATH_START, QUERY_START, FRAGMENT_START
+from web import SEGMENT_SEPARATOR
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__author__ = 'Romain Gilles'
+
+# value of the ports column for the rows without port
+MISSING_PORT = -1
+
+NB_OFFSETS = 6
+
+OFFSET_TYPECODE = 'q'
+
+
+def _int_column(values):
+    """
+    Returns the given array of integers as a NumPy array when NumPy is installed.
+    """
+    if numpy is not None:
+        return numpy.array(values, dtype=numpy.int64)
+    return values
+
+
+def _port(port):
+    if not port.isdigit():
+        raise ValueError("Port could not be cast to integer value as {0!r}".format(port))
+    port = int(port)
+    if not (0 <= port <= 65535):
+        raise ValueError("Port out of range 0-65535")
+    return port
+
+
+class URIBatch(object):
+    """
+    Table of parsed URIs. Rows parsed by the fast path parser are stored as
+    offsets into the shared buffer, the others are kept as URI instances.
+    Integer columns are NumPy arrays if NumPy is installed, array.array otherwise.
+    """
+    __slots__ = '__buffer', '__starts', '__offsets', '__fallbacks'
+
+    def __init__(self, uris):
+        if isinstance(uris, str) or not iterable(uris):
+            raise_illegal_argument("uris must be an iterable of strings: {0}".format(str(uris)))
+        buffer = StringIO()
+        starts = array(OFFSET_TYPECODE, (0,))
+        offsets = array(OFFSET_TYPECODE)
+        fallbacks = {}
+        start = 0
+        for row, uri in enumerate(uris):
+            assert_that_argument_type_is(uri, str, "uri")
+            parsed = _parse(uri)
+            if parsed is None:
+                # same semantics as URI, raise on invalid input
+                fallbacks[row] = URI(uri)
+                offsets.extend((start,) * NB_OFFSETS)
+            else:
+                offsets.extend(start + offset for offset in parsed)
+            buffer.write(uri)
+            start += len(uri)
+            starts.append(start)
+        self.__buffer = buffer.getvalue()
+        self.__starts = starts
+        self.__offsets = offsets
+        self.__fallbacks = fallbacks
+
+    def __len__(self):
+        return len(self.__starts) - 1
+
+    def __getitem__(self, row):
+        """
+        Materialises the URI of the given row.
+        """
+        row = self.__check_row(row)
+        fallback = self.__fallbacks.get(row)
+        if fallback is not None:
+            return fallback
+        start = self.__starts[row]
+        base = row * NB_OFFSETS
+        offsets = tuple(offset - start for offset in self.__offsets[base:base + NB_OFFSETS])
+        return URI._from_parsed(self.__buffer[start:self.__starts[row + 1]], offsets)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def __check_row(self, row):
+        length = len(self)
+        if row < 0:
+            row += length
+        if not 0 <= row < length:
+            raise IndexError("row out of range: {0}".format(row))
+        return row
+
+    def string(self, row):
+        """
+        Returns the string of the given row.
+        """
+        row = self.__check_row(row)
+        return self.__buffer[self.__starts[row]:self.__starts[row + 1]]
+
+    @property
+    def buffer(self):
+        """
+        The string shared by all the rows.
+        """
+        return self.__buffer
+
+    @property
+    def starts(self):
+        """
+        Start offsets of the rows into the buffer, the end of a row is the start of the next one.
+        """
+        return _int_column(array(OFFSET_TYPECODE, self.__starts))
+
+    @property
+    def fallback_rows(self):
+        """
+        Sorted rows which have not been parsed by the fast path parser.
+        """
+        return sorted(self.__fallbacks)
+
+    def __field(self, index):
+        """
+        Returns the offsets of the given component index for all the rows.
+        """
+        return self.__offsets[index::NB_OFFSETS]
+
+    def __slices(self, starts, ends):
+        buffer = self.__buffer
+        return [buffer[start:end] for start, end in zip(starts, ends)]
+
+    def __patch(self, column, getter):
+        """
+        Replaces the values of the rows not handled by the fast path parser.
+        """
+        for row, uri in self.__fallbacks.items():
+            column[row] = getter(uri)
+        return column
+
+    @property
+    def schemes(self):
+        return self.__patch(self.__slices(self.__starts, self.__field(SCHEME_END)), lambda uri: uri.scheme)
+
+    @property
+    def authorities(self):
+        authority_starts = (scheme_end + 3 for scheme_end in self.__field(SCHEME_END))
+        return self.__patch(self.__slices(authority_starts, self.__field(PATH_START)), lambda uri: uri.authority)
+
+    @property
+    def hostnames(self):
+        hostnames = [hostname.lower() or None for hostname in
+                     self.__slices(self.__field(HOST_START), self.__field(HOST_END))]
+        return self.__patch(hostnames, lambda uri: uri.hostname)
+
+    @property
+    def ports(self):
+        """
+        Ports column, MISSING_PORT for the rows without port.
+        raise ValueError if a port is invalid as URI.port does.
+        """
+        port_starts = (host_end + 1 for host_end in self.__field(HOST_END))
+        ports = [MISSING_PORT if not port else _port(port) for port in
+                 self.__slices(port_starts, self.__field(PATH_START))]
+        self.__patch(ports, lambda uri: MISSING_PORT if uri.port is None else uri.port)
+        return _int_column(array(OFFSET_TYPECODE, ports))
+
+    @property
+    def paths(self):
+        return self.__patch(self.__slices(self.__field(PATH_START), self.__field(QUERY_START)), lambda uri: uri.path)
+
+    @property
+    def queries(self):
+        query_starts = (query_start + 1 for query_start in self.__field(QUERY_START))
+        return self.__patch(self.__slices(query_starts, self.__field(FRAGMENT_START)), lambda uri: uri.query)
+
+    @property
+    def fragments(self):
+        fragment_starts = (fragment_start + 1 for fragment_start in self.__field(FRAGMENT_START))
+        return self.__patch(self.__slices(fragment_starts, self.__starts[1:]), lambda uri: uri.fragment)
+
+    @property
+    def segment_counts(self):
+        """
+        Number of segments of every row, len(URI.segments) computed without splitting the paths.
+        """
+        count = self.__buffer.count
+        # the empty and the root paths have no segment
+        counts = [count(SEGMENT_SEPARATOR, path_start, path_end) if path_end - path_start > 1 else 0
+                  for path_start, path_end in zip(self.__field(PATH_START), self.__field(QUERY_START))]
+        self.__patch(counts, lambda uri: len(uri.segments))
+        return _int_column(array(OFFSET_TYPECODE, counts))
@@ -0,0 +1,110 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Bulk serialization of URIs into one flat buffer.
+
+The buffer holds a header, the packed offsets and the length of every URI,
+then the UTF-8 text of all the URIs. It is written and read with a few
+bulk copies, without pickling the URIs one by one, so it can be handed to
+other processes through multiprocessing.shared_memory:
+
+    data = dump_uris(uris)
+    memory = SharedMemory(create=True, size=len(data))
+    memory.buf[:len(data)] = data
+    # in the worker process
+    uris = load_uris(SharedMemory(name).buf)
+
+The integers are stored in the native byte order, the buffer is meant for
+the processes of the same host.
+"""
+from array import array
+from itertools import accumulate, repeat
+from operator import or_, lshift
+from struct import Struct
+from .assertion import iterable, raise_illegal_argument
+from .urilib import URI, _parse, _pack_offsets
+
+__author__ = 'Romain Gilles'
+
+MAGIC = b"web.uri1"
+
+# magic, number of URIs, size of the text in bytes
+_HEADER = Struct("=8sQQ")
+
+# the packed offsets of a URI are stored in two unsigned 64 bits integers, 0 if not packed
+PACKED_TYPECODE = 'Q'
+LENGTH_TYPECODE = 'I'
+
+_LOW_MASK = (1 << 64) - 1
+
+
+def _state(uri):
+    if isinstance(uri, URI):
+        return uri._state()
+    if isinstance(uri, str):
+        offsets = _parse(uri)
+        return uri, None if offsets is None else _pack_offsets(offsets)
+    raise_illegal_argument("uri must be a URI or a string: {0!r}".format(uri))
+
+
+def dump_uris(uris):
+    """
+    Returns the bytes of the buffer holding the given URIs or strings.
+    """
+    if not iterable(uris):
+        raise_illegal_argument("uris must be an iterable: {0}".format(uris))
+    strings = []
+    packed = array(PACKED_TYPECODE)
+    append_string = strings.append
+    append_packed = packed.append
+    for uri in uris:
+        string, offsets = _state(uri)
+        append_string(string)
+        if offsets is None:
+            append_packed(0)
+            append_packed(0)
+        else:
+            append_packed(offsets & _LOW_MASK)
+            append_packed(offsets >> 64)
+    lengths = array(LENGTH_TYPECODE, map(len, strings))
+    text = "".join(strings).encode("utf-8")
+    return b"".join((_HEADER.pack(MAGIC, len(strings), len(text)), packed.tobytes(), lengths.tobytes(), text))
+
+
+def load_uris(buffer):
+    """
+    Returns the list of the URIs held by the given buffer returned by dump_uris,
+    bytes or any object supporting the buffer protocol. The URIs whose offsets
+    are packed are not parsed again. No view of the buffer is kept, a shared
+    memory block can be closed right after the call.
+    """
+    with memoryview(buffer) as view:
+        if view.nbytes < _HEADER.size:
+            raise_illegal_argument("buffer is too small to hold URIs")
+        magic, count, size = _HEADER.unpack_from(view)
+        lengths_start = _HEADER.size + 2 * count * array(PACKED_TYPECODE).itemsize
+        text_start = lengths_start + count * array(LENGTH_TYPECODE).itemsize
+        if magic != MAGIC or view.nbytes < text_start + size:
+            raise_illegal_argument("buffer does not hold URIs dumped by dump_uris")
+        packed = array(PACKED_TYPECODE)
+        packed.frombytes(view[_HEADER.size:lengths_start])
+        lengths = array(LENGTH_TYPECODE)
+        lengths.frombytes(view[lengths_start:text_start])
+        text = str(view[text_start:text_start + size], "utf-8")
+    # the URIs are created by C level iterations over the columns
+    strings = map(text.__getitem__, map(slice, accumulate(lengths, initial=0), accumulate(lengths)))
+    offsets = map(or_, packed[0::2], map(lshift, packed[1::2], repeat(64)))
+    return list(map(URI._from_state, strings, offsets))
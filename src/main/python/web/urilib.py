@@ -13,19 +13,48 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-from http.client import HTTPConnection
+from collections import OrderedDict, namedtuple
+from io import BytesIO
+import re
+from string import ascii_letters, digits
+from threading import Lock
+from time import sleep
 from urllib.parse import urlsplit, SplitResult
-from .assertion import iterable, assert_that_argument_type_is
-from web import HTTP_GET as GET, HTTP_METHODS, FRAGMENT_SEPARATOR, SEGMENT_SEPARATOR, QUERY_SEPARATOR
+from .assertion import iterable, assert_that_argument_type_is, raise_illegal_argument
+from .querylib import QueryParams
+from .pool import ConnectionPool, ConnectionFactory
+from .body import send_request
+from .decoding import content_decoder, ACCEPT_ENCODING
+from .retry import RetryStatistics, NO_RETRY, STALE_CONNECTION_ERRORS, RETRY_AFTER, rewinder
+from .codec import encode_segment, encode_segments, encode_query, encode_query_params
+from web import HTTP_GET as GET, HTTP_METHODS, FRAGMENT_SEPARATOR, SEGMENT_SEPARATOR, QUERY_SEPARATOR, \
+    DEFAULT_URI_CACHE_SIZE, SCHEME_SEPARATOR, USER_INFO_SEPARATOR, PORT_SEPARATOR
 
 CHARSET_TOKEN = "charset="
 
+# size of the chunks of a streamed body
+DEFAULT_CHUNK_SIZE = 64 * 1024
+LINE_FEED = b"\n"
+CARRIAGE_RETURN = b"\r"
+
 HTTP_CONTENT_TYPE_HEADER = "Content-Type"
 
 EMPTY_PATH = ""
 ROOT_PATH = "/"
 EMPTY_SEGMENT = EMPTY_PATH
 EMPTY_SEGMENTS = ()
+EMPTY_COMPONENT = ""
+
+CURRENT_SEGMENT = "."
+PARENT_SEGMENT = ".."
+
+# default ports removed by the normalization
+DEFAULT_PORTS = {"http": 80, "https": 443, "ftp": 21, "ws": 80, "wss": 443}
+
+# characters which never need to be percent-encoded
+UNRESERVED_CHARACTERS = frozenset(ascii_letters + digits + "-._~")
+
+_PERCENT_ENCODED = re.compile("%[0-9A-Fa-f]{2}")
 
 def _is_supported_method(method):
     """
@@ -94,6 +123,66 @@ def valid_segments(segments):
     return True
 
 
+def valid_query(query):
+    """
+    Returns True if the specified query would be
+    valid as the query component of a URI; False otherwise.
+
+    A valid query may be null or contain any characters except for #
+    """
+    return FRAGMENT_SEPARATOR not in str(query)
+
+
+def _check_segment(segment):
+    if not valid_segment(segment):
+        raise AssertionError(
+            "{0} is an invalid segment it must be not null string and not contain any of the following characters: '/' '?' '#'".format(
+                str(segment)))
+
+
+def _create_segments(segments, encode):
+    """
+    Returns the tuple of the given segments, a string being split on the separator.
+    If encode is True the segments are percent-encoded.
+    """
+    if isinstance(segments, str):
+        segments = segments.split(SEGMENT_SEPARATOR)
+    segments = tuple(segments)
+    if encode and all(isinstance(segment, str) for segment in segments):
+        segments = encode_segments(segments)
+    return segments
+
+
+def _create_query(query, separator, encode=False):
+    """
+    Returns the string representation of the given query. If encode is True the
+    characters of a string query which are not allowed in a query and the keys
+    and the values of a tuple query are percent-encoded.
+
+    raise AssertionError if query is not a valid query (portion) according
+    to valid_query method.
+    """
+    if query is not None and not isinstance(query, (str, tuple, QueryParams)):
+        raise AssertionError(
+            "{0} must be a string or a QueryParams or a tuple of tuple like ((param1, value1),(param2, value2))".format(
+                str(query)))
+        # create the string representation of the query
+    str_query = ""
+    if isinstance(query, str):
+        str_query = encode_query(query) if encode else query
+    if isinstance(query, QueryParams):
+        str_query = str(query)
+    if isinstance(query, tuple):
+        if encode:
+            str_query = encode_query_params(query, separator)
+        else:
+            str_query = separator.join(["{0}={1}".format(key, value) for key, value in query])
+
+    if not valid_query(str_query):
+        raise AssertionError("{0} is not a valid query".format(str(query)))
+    return str_query
+
+
 def _is_absolute_path(segments):
     return len(segments) > 1 and segments[0] == EMPTY_SEGMENT
 
@@ -113,29 +202,356 @@ def _convert_to_segment(path, trim_root_segment=True):
     return result
 
 
+def _join_segments(segments):
+    if _is_absolute_path(segments):
+        return SEGMENT_SEPARATOR.join(segments)
+    return SEGMENT_SEPARATOR.join((EMPTY_SEGMENT, ) + tuple(segments))
+
+
+def _normalize_segments(segments):
+    """
+    Reduces in place a list of segments to the segments read back from the
+    path built by _join_segments.
+    """
+    if _is_absolute_path(segments):
+        del segments[0]
+    if len(segments) == 1 and segments[0] == EMPTY_SEGMENT:
+        del segments[0]
+    return segments
+
+
+# schemes handled by the fast path parser
+FAST_PATH_SCHEMES = frozenset(("http", "https"))
+
+# indexes of the component offsets returned by _parse
+SCHEME_END = 0
+HOST_START = 1
+HOST_END = 2
+PATH_START = 3
+QUERY_START = 4
+FRAGMENT_START = 5
+
+# the offsets of a URI are packed into one integer, OFFSET_BITS bits per offset
+OFFSET_BITS = 20
+OFFSET_MASK = (1 << OFFSET_BITS) - 1
+MAX_PACKED_URI_LENGTH = OFFSET_MASK
+HOST_START_SHIFT = HOST_START * OFFSET_BITS
+HOST_END_SHIFT = HOST_END * OFFSET_BITS
+PATH_START_SHIFT = PATH_START * OFFSET_BITS
+QUERY_START_SHIFT = QUERY_START * OFFSET_BITS
+FRAGMENT_START_SHIFT = FRAGMENT_START * OFFSET_BITS
+
+
+def _pack_offsets(offsets):
+    """
+    Returns the integer packing the given component offsets, SCHEME_END in the
+    low bits, or None if the URI is too long to be packed.
+    """
+    if offsets[FRAGMENT_START] > MAX_PACKED_URI_LENGTH:
+        return None
+    scheme_end, host_start, host_end, path_start, query_start, fragment_start = offsets
+    return scheme_end | host_start << HOST_START_SHIFT | host_end << HOST_END_SHIFT | \
+        path_start << PATH_START_SHIFT | query_start << QUERY_START_SHIFT | fragment_start << FRAGMENT_START_SHIFT
+
+
+def _unpack_offsets(packed):
+    """
+    Returns the tuple of the component offsets packed by _pack_offsets.
+    """
+    return tuple((packed >> (index * OFFSET_BITS)) & OFFSET_MASK for index in range(FRAGMENT_START + 1))
+
+
+def _parse(uri):
+    """
+    Single pass RFC 3986 parser of the well-formed http and https URIs:
+    scheme://[user-info@]host[:port][/path][?query][#fragment]
+
+    Returns the tuple of the component offsets (see SCHEME_END ... FRAGMENT_START)
+    or None if the URI is not a plain ASCII http or https URI and must be handled
+    by urlsplit (upper case scheme, control characters, IP literal, scoped host...).
+    The scheme ends at the ':' separator, the user info if any ends one character
+    before HOST_START, the port if any starts one character after HOST_END.
+    QUERY_START is the offset of the '?' separator or FRAGMENT_START if there is no
+    query, FRAGMENT_START is the offset of the '#' separator or the URI length.
+    """
+    scheme_end = uri.find(SCHEME_SEPARATOR)
+    if uri[scheme_end:scheme_end + 3] != "://" or uri[:scheme_end] not in FAST_PATH_SCHEMES:
+        return None
+    if not (uri.isascii() and uri.isprintable()):
+        return None
+    authority_start = scheme_end + 3
+    end = len(uri)
+    fragment_start = uri.find(FRAGMENT_SEPARATOR, authority_start)
+    if fragment_start < 0:
+        fragment_start = end
+    query_start = uri.find(QUERY_SEPARATOR, authority_start, fragment_start)
+    if query_start < 0:
+        query_start = fragment_start
+    path_start = uri.find(SEGMENT_SEPARATOR, authority_start, query_start)
+    if path_start < 0:
+        path_start = query_start
+    host_start = uri.rfind(USER_INFO_SEPARATOR, authority_start, path_start) + 1
+    if host_start < authority_start:
+        host_start = authority_start
+    host_end = uri.find(PORT_SEPARATOR, host_start, path_start)
+    if host_end < 0:
+        host_end = path_start
+    if uri.find("[", authority_start, path_start) >= 0 or uri.find("]", authority_start, path_start) >= 0 or \
+            uri.find("%", host_start, host_end) >= 0:
+        return None
+    return scheme_end, host_start, host_end, path_start, query_start, fragment_start
+
+
+def _normalize_percent_encoding(match):
+    character = chr(int(match.group(0)[1:], 16))
+    return character if character in UNRESERVED_CHARACTERS else match.group(0).upper()
+
+
+def _normalize_component(component):
+    if "%" not in component:
+        return component
+    return _PERCENT_ENCODED.sub(_normalize_percent_encoding, component)
+
+
+def _remove_dot_segments(path):
+    """
+    Removes the '.' and '..' segments of a path according to RFC 3986 section 5.2.4.
+    """
+    segments = path.split(SEGMENT_SEPARATOR)
+    if CURRENT_SEGMENT not in segments and PARENT_SEGMENT not in segments:
+        return path
+    rooted = path.startswith(ROOT_PATH)
+    if not rooted:
+        # rule A: the leading dot segments of a relative path are removed with their separator
+        start = 0
+        while start < len(segments) and segments[start] in (CURRENT_SEGMENT, PARENT_SEGMENT):
+            start += 1
+        if start == len(segments):
+            return EMPTY_SEGMENT
+        segments = segments[start:]
+    output = []
+    for segment in segments:
+        if segment == CURRENT_SEGMENT:
+            continue
+        if segment == PARENT_SEGMENT:
+            if output:
+                output.pop()
+                if not rooted and not output:
+                    # rule C: the input still starts with a separator once the first segment is removed
+                    rooted = True
+                    output.append(EMPTY_SEGMENT)
+        else:
+            output.append(segment)
+    if rooted and (not output or output[0]):
+        output.insert(0, EMPTY_SEGMENT)
+    if segments[-1] in (CURRENT_SEGMENT, PARENT_SEGMENT):
+        output.append(EMPTY_SEGMENT)
+    return SEGMENT_SEPARATOR.join(output)
+
+
+def _normalize_authority(scheme, authority):
+    user_info, have_user_info, host_port = authority.rpartition(USER_INFO_SEPARATOR)
+    if host_port.startswith("["):
+        host, _, port = host_port.partition("]")
+        host += "]"
+        port = port[1:]
+    else:
+        host, _, port = host_port.partition(PORT_SEPARATOR)
+    result = _normalize_component(host.lower())
+    if port and not (port.isdigit() and int(port) == DEFAULT_PORTS.get(scheme)):
+        result = "{0}:{1}".format(result, port)
+    if have_user_info:
+        result = "{0}@{1}".format(_normalize_component(user_info), result)
+    return result
+
+
+def _normalize(uri):
+    scheme = uri.scheme.lower()
+    authority = uri.authority
+    path = _remove_dot_segments(_normalize_component(uri.path))
+    if authority:
+        authority = _normalize_authority(scheme, authority)
+        if not path:
+            path = ROOT_PATH
+    return URI._from_elements(scheme, authority, path, _normalize_component(uri.query),
+                              _normalize_component(uri.fragment))
+
+
+# guards the extension of the segment lists shared between URIs
+_SHARED_SEGMENTS_LOCK = Lock()
+
+
 class URI(object):
     """
     URI
+
+    A URI parsed by the fast path only keeps its string and the component
+    offsets packed into one integer, the components are sliced on access.
+    The other URIs keep the SplitResult of their components.
     """
-    __slots__ = '__uri', '__structure', '__http_handler'
+    __slots__ = '__uri', '__structure', '__segments', '__shared_segments', '__offsets', '__normalized'
 
     def __init__(self, uri):
         """
         URI constructor
         """
+        self.__setup(uri, _parse(uri) if isinstance(uri, str) else None)
+
+    @classmethod
+    def _from_parsed(cls, uri, offsets):
+        """
+        Creates a URI from a string and the component offsets returned by _parse.
+        """
+        result = cls.__new__(cls)
+        result.__setup(uri, offsets)
+        return result
+
+    def __setup(self, uri, offsets):
         self.__uri = uri
-        self.__structure = urlsplit(uri)
+        if offsets is not None:
+            offsets = _pack_offsets(offsets)
+        self.__structure = urlsplit(uri) if offsets is None else None
+        self.__offsets = offsets
+        self.__normalized = None
+        self.__segments = None
+        self.__shared_segments = None
+
+    @classmethod
+    def _from_state(cls, uri, packed):
+        """
+        Creates a URI from the state returned by _state, the string is only
+        parsed if the offsets are not packed (None or 0).
+        """
+        if not packed:
+            return cls(uri)
+        result = cls.__new__(cls)
+        result.__uri = uri
+        result.__structure = None
+        result.__offsets = packed
+        result.__normalized = None
+        result.__segments = None
+        result.__shared_segments = None
+        return result
+
+    def _state(self):
+        """
+        Returns the (string, packed offsets or None) pair from which _from_state
+        creates this URI again.
+        """
+        return str(self), self.__offsets
+
+    def __reduce__(self):
+        """
+        Pickles the string and the packed offsets only, the unpickled URI is
+        not parsed again.
+        """
+        return _restore_uri, self._state()
+
+    @classmethod
+    def _from_elements(cls, scheme, authority, path, query, fragment, segments=None, uri=None):
+        """
+        Creates a URI directly from already validated components.
+        Nothing is parsed, the string representation is only built
+        the first time it is requested. If known, the segments tuple
+        of the path and the string representation can be given.
+        """
+        result = cls.__new__(cls)
+        result.__uri = uri
+        result.__structure = SplitResult(scheme, authority, path, query or EMPTY_COMPONENT,
+                                         fragment or EMPTY_COMPONENT)
+        result.__segments = segments
+        result.__shared_segments = None
+        result.__offsets = None
+        result.__normalized = None
+        return result
+
+    def _from_shared_segments(self, shared, count):
+        """
+        Creates a URI with the components of this URI and the path formed
+        by the count first segments of the shared list. The path is only
+        built the first time it is requested.
+        """
+        result = URI.__new__(URI)
+        result.__uri = None
+        result.__structure = self.__split()._replace(path=None)
+        result.__segments = None
+        result.__shared_segments = shared, count
+        result.__offsets = None
+        result.__normalized = None
+        return result
+
+    def __eq__(self, other):
+        """
+        Two URIs are equal if their normalized forms are equal.
+        @see normalize
+        """
+        if self is other:
+            return True
+        if not isinstance(other, URI):
+            return NotImplemented
+        return str(self.normalize()) == str(other.normalize())
+
+    def __hash__(self):
+        return hash(str(self.normalize()))
+
+    def normalize(self):
+        """
+        Returns the RFC 3986 syntax-based normalization of this URI: the scheme and
+        the host are lower cased, the percent-encoded unreserved characters are
+        decoded and the other ones upper cased, the dot segments are removed from
+        the path, the default port of the scheme is removed and an empty path of
+        a URI having an authority becomes the root path.
+        This URI is returned if it is already normalized. The result is computed
+        only once.
+        """
+        normalized = self.__normalized
+        if normalized is None:
+            normalized = _normalize(self)
+            if str(normalized) == str(self):
+                normalized = self
+            normalized.__normalized = normalized
+            self.__normalized = normalized
+        return normalized
 
     def __str__(self):
+        if self.__uri is None:
+            self.__uri = self.__components().geturl()
         return self.__uri
 
+    def __split(self):
+        """
+        Returns the SplitResult of the components, sliced from the string if
+        the offsets are packed.
+        """
+        structure = self.__structure
+        if structure is None:
+            uri = self.__uri
+            packed = self.__offsets
+            scheme_end = packed & OFFSET_MASK
+            path_start = (packed >> PATH_START_SHIFT) & OFFSET_MASK
+            query_start = (packed >> QUERY_START_SHIFT) & OFFSET_MASK
+            fragment_start = packed >> FRAGMENT_START_SHIFT
+            structure = SplitResult(uri[:scheme_end], uri[scheme_end + 3:path_start], uri[path_start:query_start],
+                                    uri[query_start + 1:fragment_start], uri[fragment_start + 1:])
+        return structure
+
+    def __components(self):
+        structure = self.__split()
+        if structure.path is None:
+            structure = structure._replace(path=_join_segments(self.segments))
+            self.__structure = structure
+        return structure
+
     @property
     def scheme(self):
         """
         URI scheme specifier.
         If not present returns an empty string.
         """
-        return self.__structure.scheme
+        structure = self.__structure
+        if structure is None:
+            return self.__uri[:self.__offsets & OFFSET_MASK]
+        return structure.scheme
 
     @property
     def authority(self):
@@ -151,7 +567,11 @@ class URI(object):
         An authority component that does not parse in this way
         is considered to be registry-based.
         """
-        return self.__structure.netloc
+        structure = self.__structure
+        if structure is None:
+            packed = self.__offsets
+            return self.__uri[(packed & OFFSET_MASK) + 3:(packed >> PATH_START_SHIFT) & OFFSET_MASK]
+        return structure.netloc
 
     @property
     def path(self):
@@ -161,7 +581,11 @@ class URI(object):
         consists of a leading segment separator character (a slash), if the
         path is absolute, followed by the slash-separated path segments.
         """
-        return self.__structure.path
+        structure = self.__structure
+        if structure is None:
+            packed = self.__offsets
+            return self.__uri[(packed >> PATH_START_SHIFT) & OFFSET_MASK:(packed >> QUERY_START_SHIFT) & OFFSET_MASK]
+        return self.__components().path
 
     @property
     def query(self):
@@ -169,7 +593,11 @@ class URI(object):
         If this is a hierarchical URI with a query component, returns it;
         an empty string otherwise.
         """
-        return self.__structure.query
+        structure = self.__structure
+        if structure is None:
+            packed = self.__offsets
+            return self.__uri[((packed >> QUERY_START_SHIFT) & OFFSET_MASK) + 1:packed >> FRAGMENT_START_SHIFT]
+        return structure.query
 
     @property
     def fragment(self):
@@ -177,23 +605,57 @@ class URI(object):
         If this URI has a fragment component, returns it; an empty string
         otherwise.
         """
-        return self.__structure.fragment
+        structure = self.__structure
+        if structure is None:
+            return self.__uri[(self.__offsets >> FRAGMENT_START_SHIFT) + 1:]
+        return structure.fragment
 
     @property
     def username(self):
-        return self.__structure.username
+        packed = self.__offsets
+        if packed is None:
+            return self.__structure.username
+        authority_start = (packed & OFFSET_MASK) + 3
+        host_start = (packed >> HOST_START_SHIFT) & OFFSET_MASK
+        if host_start == authority_start:
+            return None
+        user_info = self.__uri[authority_start:host_start - 1]
+        return user_info.partition(PORT_SEPARATOR)[0]
 
     @property
     def password(self):
-        return self.__structure.password
+        packed = self.__offsets
+        if packed is None:
+            return self.__structure.password
+        authority_start = (packed & OFFSET_MASK) + 3
+        host_start = (packed >> HOST_START_SHIFT) & OFFSET_MASK
+        if host_start == authority_start:
+            return None
+        _, have_password, password = self.__uri[authority_start:host_start - 1].partition(PORT_SEPARATOR)
+        return password if have_password else None
 
     @property
     def hostname(self):
-        return self.__structure.hostname
+        packed = self.__offsets
+        if packed is None:
+            return self.__structure.hostname
+        hostname = self.__uri[(packed >> HOST_START_SHIFT) & OFFSET_MASK:(packed >> HOST_END_SHIFT) & OFFSET_MASK]
+        return hostname.lower() if hostname else None
 
     @property
     def port(self):
-        return self.__structure.port
+        packed = self.__offsets
+        if packed is None:
+            return self.__structure.port
+        port = self.__uri[((packed >> HOST_END_SHIFT) & OFFSET_MASK) + 1:(packed >> PATH_START_SHIFT) & OFFSET_MASK]
+        if not port:
+            return None
+        if not port.isdigit():
+            raise ValueError("Port could not be cast to integer value as {0!r}".format(port))
+        port = int(port)
+        if not (0 <= port <= 65535):
+            raise ValueError("Port out of range 0-65535")
+        return port
 
     @property
     def segments(self):
@@ -203,25 +665,44 @@ class URI(object):
         in an absolute path is not represented in this array, but a trailing
         separator is represented by an empty-string segment as the final element.
         """
-        return _convert_to_segment(self.path)
+        segments = self.__segments
+        if segments is None:
+            if self.__shared_segments is not None:
+                shared, count = self.__shared_segments
+                segments = tuple(shared[:count])
+            else:
+                segments = tuple(_convert_to_segment(self.path))
+            self.__segments = segments
+        return segments
+
+    def __segment_list(self):
+        """
+        Returns the (list, count) pair where the count first items of the list are the
+        segments of this URI. The list is shared with the URIs derived by appending
+        segments to this one so that repeated appends do not copy the segments.
+        """
+        if self.__shared_segments is None:
+            segments = self.segments
+            self.__shared_segments = list(segments), len(segments)
+        return self.__shared_segments
 
-    def append_segment(self, segment):
+    def append_segment(self, segment, encode=False):
         """
         Returns the URI formed by appending the specified segment on to the end
         of the path of this URI, if hierarchical; this URI unchanged,
         otherwise.  If this URI has an authority and/or device, but no path,
         the segment becomes the first under the root in an absolute path.
+        If encode is True the segment is percent-encoded first.
 
         @exception AssertionError if segment is not a valid segment according
                                   to valid_segment method.
         """
-        if not valid_segment(segment):
-            raise AssertionError(
-                "{0} is an invalid segment it must be not null string and not contain any of the following characters: '/' '?' '#'".format(
-                    str(segment)))
+        if encode and isinstance(segment, str):
+            segment = encode_segment(segment)
+        _check_segment(segment)
         return self.append_segments((segment,))
 
-    def append_segments(self, segments):
+    def append_segments(self, segments, encode=False):
         """
         Returns the URI formed by appending the specified segments on to the
         end of the path of this URI, if hierarchical; this URI unchanged,
@@ -233,14 +714,26 @@ class URI(object):
                         If desired, a trailing separator should be represented
                         by an empty-string segment as the last element of the
                         array.
+        @param encode if True the segments are percent-encoded, a string is
+                      split on the separator before.
 
         raise AssertionError if segments is not a valid segments list or tuple
                              or string according to valid_segments method.
         """
-        if isinstance(segments, str):
-            segments = segments.split(SEGMENT_SEPARATOR)
+        segments = _create_segments(segments, encode)
 
-        return self.append_path(self.segments + tuple(segments))
+        shared, count = self.__segment_list()
+        if count < 1 or shared[0] == EMPTY_SEGMENT:
+            # the path read back from the joined segments may differ, let append_path build it
+            return self.append_path(tuple(shared[:count]) + segments)
+        if not valid_segments(segments):
+            raise AssertionError("invalid segments: {0}".format(str(segments)))
+        with _SHARED_SEGMENTS_LOCK:
+            if len(shared) == count:
+                shared.extend(segments)
+            else:
+                shared = shared[:count] + list(segments)
+        return self._from_shared_segments(shared, count + len(segments))
 
     def create_root_uri_from(self):
         return self.append_path(ROOT_PATH)
@@ -262,22 +755,24 @@ class URI(object):
         """
         if nb < 1:
             return self
-            #split path
-        segments = self.segments
+        shared, count = self.__segment_list()
         #return self if there is no segments to trim
-        if segments is EMPTY_SEGMENTS:
+        if count < 1:
             return self
-        if len(segments) <= nb:
+        if count <= nb:
             return self.create_root_uri_from()
-        else:
-            return self.append_path(segments[0:len(segments) - nb])
+        if shared[0] == EMPTY_SEGMENT:
+            return self.append_path(tuple(shared[:count - nb]))
+        return self._from_shared_segments(shared, count - nb)
 
     def trim_from_authority(self):
         """
         If this URI has a not empty path and or query and or fragment, returns the URI
         formed by removing them; this URI unchanged, otherwise.
         """
-        return self.trim_from_path().trim_path()
+        if self.path or self.query or self.fragment:
+            return _create_uri_from_elements(self.scheme, self.authority, EMPTY_PATH, None, None)
+        return self
 
 
     def append_path(self, path):
@@ -304,10 +799,8 @@ class URI(object):
         if not valid_segments(segments):
             raise AssertionError("invalid segments: {0}".format(str(segments)))
 
-        path = SEGMENT_SEPARATOR.join(segments) if _is_absolute_path(segments) else SEGMENT_SEPARATOR.join(
-            ("", ) + segments)
-
-        return _create_uri_from_elements(self.scheme, self.authority, path, self.query, self.fragment)
+        return _create_uri_from_elements(self.scheme, self.authority, _join_segments(segments), self.query,
+                                         self.fragment)
 
     def trim_path(self):
         """
@@ -324,7 +817,9 @@ class URI(object):
         If this URI has a not empty query and or fragment, returns the URI
         formed by removing them; this URI unchanged, otherwise.
         """
-        return self.trim_from_query().trim_query()
+        if self.query or self.fragment:
+            return _create_uri_from_elements(self.scheme, self.authority, self.path, None, None)
+        return self
 
 
     def valid_query(self, query):
@@ -332,11 +827,11 @@ class URI(object):
         Returns True if the specified query would be
         valid as the query component of a URI; False otherwise.
 
-        A valid query may be null or contain any characters except for #
+        @see valid_query
         """
-        return FRAGMENT_SEPARATOR not in str(query)
+        return valid_query(query)
 
-    def append_query(self, query, separator="&"):
+    def append_query(self, query, separator="&", encode=False):
         """
         Returns the URI formed from this URI and the given query.
 
@@ -344,27 +839,24 @@ class URI(object):
         to valid_query method.
 
         @param query a not null query portion. It can be of type string or
-                     tuple of tuple as ((param1, value1), (param2, value2)).
+                     QueryParams or tuple of tuple as ((param1, value1), (param2, value2)).
+                     Only the QueryParams values are percent-encoded.
+        @param encode if True the string query or the keys and the values of the
+                      tuple query are percent-encoded too.
 
         @return the URI formed from this URI and the given query.
         """
-        if query is not None and not isinstance(query, (str, tuple)):
-            raise AssertionError(
-                "{0} must be a string or a tuple of tuple like ((param1, value1),(param2, value2))".format(str(query)))
-            # create the string representation of the query
-        str_query = ""
-        if isinstance(query, str):
-            str_query = query
-        if isinstance(query, tuple):
-            nb_params = len(query)
-            for index in range(nb_params):
-                key, value = query[index]
-                str_query = "{0}{1}={2}{3}".format(str_query, key, value, separator if index + 1 < nb_params else "")
-
-        if not self.valid_query(str_query):
-            raise AssertionError("{0} is not a valid query".format(str(query)))
+        str_query = _create_query(query, separator, encode)
         return _create_uri_from_elements(self.scheme, self.authority, self.path, str_query, self.fragment)
 
+    @property
+    def query_params(self):
+        """
+        Returns a new QueryParams of the query of this URI, the query is only
+        parsed when the parameters are accessed.
+        """
+        return QueryParams(self.query)
+
     def trim_query(self):
         """
         If this URI has a not empty query, returns the URI
@@ -415,11 +907,331 @@ class URI(object):
         If this URI is absolute returns the absolute path
         concatened with the query and the fragment if any.
         """
-        return _uri(self.absolute)
+        return URI(self.absolute)
+
+    def builder(self):
+        """
+        Returns a URIBuilder initialized with this URI to batch
+        segment, query and fragment edits.
+        """
+        return URIBuilder(self)
+
+    def resolve(self, reference):
+        """
+        Returns the URI formed by resolving the given reference against this
+        base URI according to RFC 3986 section 5.2.
+
+        @param reference a URI or a string, absolute or relative reference.
+        """
+        return _resolve(self, self.__base_directory(), reference)
+
+    def resolve_all(self, references):
+        """
+        Returns the list of the URIs formed by resolving the given references
+        against this base URI. The base is only prepared once.
+        @see resolve
+        """
+        directory = self.__base_directory()
+        return [_resolve(self, directory, reference) for reference in references]
+
+    def __base_directory(self):
+        """
+        Returns the segments of the base path without its last segment, the
+        prefix of the merged paths (RFC 3986 section 5.2.3).
+        """
+        return self.segments[:-1]
+
+
+def _restore_uri(uri, packed):
+    # module level function: a shorter pickle than the URI._from_state method
+    return URI._from_state(uri, packed)
+
+
+def _split_reference(reference):
+    """
+    Splits a URI reference according to the regular expression of RFC 3986 appendix B.
+    Returns the tuple (scheme, authority, path, query, fragment) where the undefined
+    components are None.
+    """
+    scheme = authority = query = fragment = None
+    end = reference.find(FRAGMENT_SEPARATOR)
+    if end >= 0:
+        fragment = reference[end + 1:]
+    else:
+        end = len(reference)
+    query_start = reference.find(QUERY_SEPARATOR, 0, end)
+    if query_start >= 0:
+        query = reference[query_start + 1:end]
+        end = query_start
+    start = 0
+    colon = reference.find(SCHEME_SEPARATOR, 0, end)
+    if colon > 0 and reference[0] in ascii_letters and SEGMENT_SEPARATOR not in reference[:colon]:
+        scheme = reference[:colon]
+        start = colon + 1
+    if reference.startswith("//", start, end):
+        authority_end = reference.find(SEGMENT_SEPARATOR, start + 2, end)
+        if authority_end < 0:
+            authority_end = end
+        authority = reference[start + 2:authority_end]
+        start = authority_end
+    return scheme, authority, reference[start:end], query, fragment
+
+
+def _remove_dot_segments_from(segments):
+    """
+    Removes the '.' and '..' segments of the segments of an absolute path
+    (RFC 3986 section 5.2.4). Returns the segments of the resulting path as
+    URI.segments would return them.
+    """
+    output = []
+    for segment in segments:
+        if segment == CURRENT_SEGMENT:
+            continue
+        if segment == PARENT_SEGMENT:
+            if output:
+                output.pop()
+        else:
+            output.append(segment)
+    if segments and segments[-1] in (CURRENT_SEGMENT, PARENT_SEGMENT):
+        output.append(EMPTY_SEGMENT)
+    if len(output) == 1 and output[0] == EMPTY_SEGMENT:
+        return EMPTY_SEGMENTS
+    return tuple(output)
+
+
+def _resolve(base, directory, reference):
+    if isinstance(reference, URI):
+        reference = str(reference)
+    assert_that_argument_type_is(reference, str, "reference")
+    scheme, authority, path, query, fragment = _split_reference(reference)
+    if scheme is not None:
+        resolved_path = _remove_dot_segments(path)
+        if resolved_path is path:
+            # the reference is the target URI
+            return URI(reference)
+        # parsed as the references without dot segments: the string keeps the scheme as given
+        return URI(str(_create_uri_from_elements(scheme, authority or EMPTY_COMPONENT, resolved_path, query,
+                                                 fragment)))
+    if authority is not None:
+        return _create_uri_from_elements(base.scheme, authority, _remove_dot_segments(path), query, fragment)
+    if not path:
+        return _create_uri_from_elements(base.scheme, base.authority, base.path,
+                                         base.query if query is None else query, fragment)
+    if path.startswith(ROOT_PATH):
+        segments = _remove_dot_segments_from(path[1:].split(SEGMENT_SEPARATOR))
+    elif base.authority and not base.path:
+        segments = _remove_dot_segments_from(path.split(SEGMENT_SEPARATOR))
+    else:
+        segments = _remove_dot_segments_from(directory + tuple(path.split(SEGMENT_SEPARATOR)))
+    path = SEGMENT_SEPARATOR.join((EMPTY_SEGMENT,) + segments) if segments else ROOT_PATH
+    return URI._from_elements(base.scheme, base.authority, path, query, fragment, segments)
 
 
 def _create_uri_from_elements(scheme, authority, path, query, fragment):
-    return _uri(SplitResult(scheme, authority, path, query, fragment).geturl())
+    return URI._from_elements(scheme, authority, path, query, fragment)
+
+
+class URIBuilder(object):
+    """
+    Mutable collector of URI edits. The edits are applied in place and only
+    one URI is created by build(). The validation rules and the results are
+    the ones of the equivalent chained calls on URI.
+
+    google = uri("http://www.google.com")
+    search = google.builder().append_segments(("a", "b")).append_query("q=1").append_fragment("top").build()
+    """
+    __slots__ = '__uri', '__segments', '__query', '__fragment', '__modified'
+
+    def __init__(self, uri):
+        assert_that_argument_type_is(uri, URI, "uri")
+        self.__uri = uri
+        # None while the path of the original URI is unchanged
+        self.__segments = None
+        self.__query = uri.query
+        self.__fragment = uri.fragment
+        self.__modified = False
+
+    def __read_segments(self):
+        """
+        Returns the segments of the current path as URI.segments would return them.
+        """
+        self.__modified = True
+        if self.__segments is None:
+            self.__segments = list(self.__uri.segments)
+            return self.__segments
+        return _normalize_segments(self.__segments)
+
+    def append_segment(self, segment, encode=False):
+        """
+        Appends the specified segment on to the end of the path.
+        @see URI.append_segment
+        """
+        if encode and isinstance(segment, str):
+            segment = encode_segment(segment)
+        _check_segment(segment)
+        self.__read_segments().append(segment)
+        return self
+
+    def append_segments(self, segments, encode=False):
+        """
+        Appends the specified segments on to the end of the path.
+        @see URI.append_segments
+        """
+        segments = _create_segments(segments, encode)
+        if not valid_segments(segments):
+            raise AssertionError("invalid segments: {0}".format(str(segments)))
+        self.__read_segments().extend(segments)
+        return self
+
+    def append_path(self, path):
+        """
+        Replaces the path.
+        @see URI.append_path
+        """
+        segments = path if path else EMPTY_SEGMENTS
+        if isinstance(path, str):
+            segments = _convert_to_segment(path)
+        if not valid_segments(segments):
+            raise AssertionError("invalid segments: {0}".format(str(segments)))
+        self.__modified = True
+        self.__segments = list(segments)
+        return self
+
+    def trim_segments(self, nb):
+        """
+        Trims the specified number of segments from the end of the path.
+        @see URI.trim_segments
+        """
+        if nb < 1 or self.__has_no_segment():
+            return self
+        segments = self.__read_segments()
+        del segments[max(len(segments) - nb, 0):]
+        return self
+
+    def __has_no_segment(self):
+        if self.__segments is None:
+            return len(self.__uri.segments) < 1
+        # only the empty path and the root path have no segment
+        return len(self.__segments) < 3 and not any(self.__segments)
+
+    def trim_path(self):
+        """
+        Removes the path.
+        @see URI.trim_path
+        """
+        self.__modified = True
+        self.__segments = []
+        return self
+
+    def append_query(self, query, separator="&", encode=False):
+        """
+        Replaces the query.
+        @see URI.append_query
+        """
+        self.__query = _create_query(query, separator, encode)
+        self.__modified = True
+        return self
+
+    def trim_query(self):
+        """
+        Removes the query.
+        """
+        self.__query = EMPTY_COMPONENT
+        self.__modified = True
+        return self
+
+    def append_fragment(self, fragment):
+        """
+        Replaces the fragment.
+        @see URI.append_fragment
+        """
+        self.__fragment = fragment or EMPTY_COMPONENT
+        self.__modified = True
+        return self
+
+    def trim_fragment(self):
+        """
+        Removes the fragment.
+        """
+        self.__fragment = EMPTY_COMPONENT
+        self.__modified = True
+        return self
+
+    def build(self):
+        """
+        Returns the URI formed by the original URI and the collected edits.
+        If no edit has been collected the original URI is returned.
+        """
+        uri = self.__uri
+        if not self.__modified:
+            return uri
+        path = uri.path if self.__segments is None else _join_segments(self.__segments)
+        return _create_uri_from_elements(uri.scheme, uri.authority, path, self.__query, self.__fragment)
+
+
+URICacheInfo = namedtuple("URICacheInfo", "hits misses evictions maxsize currsize")
+
+
+class URICache(object):
+    """
+    Thread-safe, size-bounded LRU cache of URI instances keyed by
+    their string representation. URI instances are immutable so the
+    same instance is returned to every caller asking for the same string.
+    """
+
+    def __init__(self, maxsize=DEFAULT_URI_CACHE_SIZE):
+        assert_that_argument_type_is(maxsize, int, "maxsize")
+        if maxsize < 1:
+            raise AssertionError("maxsize must be greater than 0: {0}".format(maxsize))
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, uri):
+        """
+        Returns the cached URI instance for the given string, parsing
+        and storing it on a miss. The least recently used entry is evicted
+        when the cache is full.
+        """
+        with self.__lock:
+            result = self.__entries.get(uri)
+            if result is not None:
+                self.__entries.move_to_end(uri)
+                self.hits += 1
+                return result
+            self.misses += 1
+        # parse outside of the lock, a concurrent miss on the same string only costs a parse
+        result = URI(uri)
+        with self.__lock:
+            cached = self.__entries.get(uri)
+            if cached is not None:
+                return cached
+            self.__entries[uri] = result
+            if len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        """
+        Removes all the entries and resets the counters.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        """
+        Returns a URICacheInfo snapshot of the cache statistics.
+        """
+        with self.__lock:
+            return URICacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.__entries))
+
+    def __len__(self):
+        return len(self.__entries)
 
 
 class Message(object):
@@ -427,14 +1239,229 @@ class Message(object):
         self.headers = headers
         self.body = body
 
+def _split_lines(data, keepends):
+    """
+    Returns the list of the complete lines of the given bytes and the bytes following the last line feed.
+    """
+    lines = data.split(LINE_FEED)
+    pending = lines.pop()
+    if keepends:
+        return [line + LINE_FEED for line in lines], pending
+    return [line[:-1] if line.endswith(CARRIAGE_RETURN) else line for line in lines], pending
+
+
+def _feed_lines(pending, chunk, keepends):
+    """
+    Returns the list of the lines completed by the given chunk. The parts of the
+    incomplete last line are kept in the pending list, joined once a line feed
+    is received so that a long line is not copied by every chunk.
+    """
+    pending.append(chunk)
+    if LINE_FEED not in chunk:
+        return []
+    lines, rest = _split_lines(b"".join(pending), keepends)
+    pending.clear()
+    if rest:
+        pending.append(rest)
+    return lines
+
+
 #class Response (_Response):
 class Response(Message):
+    """
+    HTTP response. The body of a buffered response is read before the response is
+    returned. The body of a streamed response is read on demand through read,
+    readinto, iter_bytes or iter_lines, and its connection goes back to the pool
+    once the body is consumed or the response closed:
+
+    with request(export_uri, stream=True) as response:
+        for chunk in response.iter_bytes():
+            output.write(chunk)
+
+    The same methods prefixed by a are the coroutines reading the body of the
+    streamed responses of web.asynclib.AsyncHttpRequestHandler.
+    """
 #    __slots__ = ()
-    def __init__(self, headers, body, status_code, reason_phrase, http_version):
+    def __init__(self, headers, body, status_code, reason_phrase, http_version, stream=None, release=None,
+                 compressed_size=None):
+        """
+        @param stream the file-like object of a streamed body, body being None.
+        @param release the callable called once with the reusable flag of the connection
+                       when the streamed body is consumed or the response closed.
+        @param compressed_size the size of the received body if it was decompressed.
+        """
         super().__init__(headers, body)
         self.status_code = status_code
         self.reason_phrase = reason_phrase
         self.http_version = http_version
+        self.__stream = stream
+        self.__release = release
+        self.__streamed = stream is not None
+        self.__compressed_size = compressed_size
+        # bytes of a streamed body read so far
+        self.__size_read = 0
+
+    @property
+    def body(self):
+        """
+        The body of the response. For a streamed response the remaining part of
+        the body is read on the first access.
+        """
+        if self.__body is None and self.__stream is not None:
+            self.__body = self.read()
+        return self.__body
+
+    @body.setter
+    def body(self, body):
+        self.__body = body
+
+    @property
+    def streamed(self):
+        """
+        True if the body of this response is read on demand.
+        """
+        return self.__streamed
+
+    def __reader(self):
+        stream = self.__stream
+        if stream is None:
+            stream = self.__stream = BytesIO(self.__body or b"")
+        return stream
+
+    @property
+    def decompressed_size(self):
+        """
+        The number of bytes of the body, read so far for a streamed response.
+        """
+        if not self.__streamed:
+            return len(self.__body or b"")
+        size = getattr(self.__stream, "decompressed_size", None)
+        return self.__size_read if size is None else size
+
+    @property
+    def compressed_size(self):
+        """
+        The number of bytes of the body received with its content coding, read
+        so far for a streamed response. It is the decompressed size if the body
+        was not decompressed.
+        """
+        if self.__streamed:
+            size = getattr(self.__stream, "compressed_size", None)
+        else:
+            size = self.__compressed_size
+        return self.decompressed_size if size is None else size
+
+    def __check_consumed(self):
+        release = self.__release
+        if release is not None and self.__stream.isclosed():
+            self.__release = None
+            release(not self.__stream.will_close)
+
+    def read(self, size=-1):
+        """
+        Reads and returns up to size bytes of the body, all the remaining bytes
+        if size is negative.
+        """
+        stream = self.__reader()
+        data = stream.read() if size is None or size < 0 else stream.read(size)
+        self.__size_read += len(data)
+        self.__check_consumed()
+        return data
+
+    def readinto(self, buffer):
+        """
+        Reads bytes of the body into the given writable buffer, returns the number
+        of bytes read, 0 at the end of the body.
+        """
+        count = self.__reader().readinto(buffer)
+        self.__size_read += count
+        self.__check_consumed()
+        return count
+
+    def iter_bytes(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Iterates over the remaining body by chunks of at most chunk_size bytes.
+        """
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def iter_lines(self, chunk_size=DEFAULT_CHUNK_SIZE, keepends=False):
+        """
+        Iterates over the lines of the remaining body, separated by LF or CRLF.
+        """
+        pending = []
+        for chunk in self.iter_bytes(chunk_size):
+            yield from _feed_lines(pending, chunk, keepends)
+        if pending:
+            yield b"".join(pending)
+
+    async def aread(self, size=-1):
+        """
+        Reads and returns up to size bytes of the body, all the remaining bytes
+        if size is negative. The body of a response of an asynchronous handler is
+        only read with aread, aiter_bytes and aiter_lines.
+        """
+        stream = self.__reader()
+        aread = getattr(stream, "aread", None)
+        if aread is None:
+            return self.read(size)
+        data = await aread(-1 if size is None else size)
+        self.__size_read += len(data)
+        self.__check_consumed()
+        return data
+
+    async def aiter_bytes(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Asynchronously iterates over the remaining body by chunks of at most chunk_size bytes.
+        """
+        while True:
+            chunk = await self.aread(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    async def aiter_lines(self, chunk_size=DEFAULT_CHUNK_SIZE, keepends=False):
+        """
+        Asynchronously iterates over the lines of the remaining body, separated by LF or CRLF.
+        """
+        pending = []
+        async for chunk in self.aiter_bytes(chunk_size):
+            for line in _feed_lines(pending, chunk, keepends):
+                yield line
+        if pending:
+            yield b"".join(pending)
+
+    def close(self):
+        """
+        Closes the body. The connection of a streamed response which is not
+        consumed is closed, it could not be reused.
+        """
+        release = self.__release
+        if release is not None:
+            self.__release = None
+            consumed = self.__stream.isclosed()
+            self.__stream.close()
+            release(consumed and not self.__stream.will_close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # a streamed response dropped before the end of its body must not hold its connection
+        if getattr(self, "_Response__release", None) is not None:
+            self.close()
 
     @property
     def charset(self):
@@ -458,25 +1485,169 @@ class Request(Message):
 
 
 class AbstractRequestHandler(object):
-    def request(self, uri, method=GET, headers=None, body=None):
+    def request(self, uri, method=GET, headers=None, body=None, stream=False):
         pass
 
 
+def _request_target(uri):
+    """
+    Returns the origin-form request target of the given URI: its path and query,
+    without the fragment.
+    """
+    path = uri.path or ROOT_PATH
+    query = uri.query
+    return "{0}?{1}".format(path, query) if query else path
+
+
+def _accept_encoding(headers):
+    """
+    Returns the given request headers with the Accept-Encoding of the supported
+    content codings, unless they have one.
+    """
+    if any(name.lower() == "accept-encoding" for name in headers):
+        return headers
+    headers = dict(headers)
+    headers["Accept-Encoding"] = ACCEPT_ENCODING
+    return headers
+
+
 class HttpRequestHandler(AbstractRequestHandler):
-    connections = {}
+    """
+    Request handler sending the requests through a ConnectionPool of its own.
+    The https URIs are requested over TLS.
+    """
 
-    def request(self, uri, method=GET, headers=None, body=None):
+    def __init__(self, pool=None, ssl_context=None, decompress=False, max_decompressed_size=None,
+                 retry_policy=None):
+        """
+        @param pool the web.pool.ConnectionPool of this handler, a default one if None.
+        @param ssl_context the ssl.SSLContext of the https connections of the default
+                           pool, ssl.create_default_context() if None.
+        @param decompress if True the requests accept the gzip and deflate content codings,
+                          unless they have an Accept-Encoding header, and the encoded
+                          bodies are decompressed as they are read. The headers of
+                          the response are the received ones.
+        @param max_decompressed_size the maximum size in bytes of a decompressed body, None
+                                     for no limit, see web.decoding.DecompressionLimitError.
+        @param retry_policy the web.retry.RetryPolicy of the failed idempotent requests,
+                            web.retry.NO_RETRY if None: the requests failed by a stale
+                            keep-alive connection are only replayed on a new connection.
+        """
+        if pool is not None and ssl_context is not None:
+            raise_illegal_argument("the ssl_context is given to the factory of the pool")
+        self.pool = pool if pool is not None else ConnectionPool(factory=ConnectionFactory(ssl_context))
+        self.decompress = decompress
+        self.max_decompressed_size = max_decompressed_size
+        self.retry_policy = retry_policy if retry_policy is not None else NO_RETRY
+        self.__lock = Lock()
+        self.__replayed = 0
+        self.__retries = 0
+        self.__exhausted = 0
+
+    def request(self, uri, method=GET, headers=None, body=None, stream=False):
+        """
+        Sends the request and returns its Response. An idempotent request failed
+        by a stale connection is replayed on a new connection, and retried after
+        a backoff according to the retry policy, see web.retry.
+
+        @param body None, bytes, str, a buffer (bytearray, memoryview, mmap...), a binary
+                    file or an iterable of byte chunks, see web.body.send_request.
+        @param stream if True the response is returned once its headers are read,
+                      its connection is only released when its body is consumed
+                      or the response closed.
+        """
+        uri = _uri(uri) if isinstance(uri, str) else uri
         headers = headers if headers is not None else {}
-        authority = uri.authority
-        connection = self.connections.get(authority)
-        if not connection:
-            connection = HTTPConnection(authority)
-            self.connections[authority] = connection
-        connection.request(method, uri.absolute, body, headers)
-        response = connection.getresponse()
-        result = Response(response.headers, response.read(), response.status, response.reason, response.version)
+        if self.decompress:
+            headers = _accept_encoding(headers)
+        scheme = uri.scheme.lower()
+        port = uri.port or DEFAULT_PORTS.get(scheme)
+        policy = self.retry_policy
+        rewind = rewinder(body) if policy.replays(method) else None
+        retries = replays = 0
+        while True:
+            connection = self.pool.acquire(scheme, uri.hostname, port)
+            # the connections are opened by their first request
+            reused = connection.sock is not None
+            try:
+                response = self.__send(connection, uri, method, headers, body, stream)
+            except Exception as error:
+                if rewind is None:
+                    raise
+                # every idle connection of the pool may have been closed, not more
+                if reused and isinstance(error, STALE_CONNECTION_ERRORS) and replays <= self.pool.max_size:
+                    replays += 1
+                    self.__count(replayed=1)
+                elif not isinstance(error, policy.errors):
+                    raise
+                elif retries == policy.max_retries:
+                    if retries:
+                        self.__count(exhausted=1)
+                    raise
+                else:
+                    retries += 1
+                    self.__count(retries=1)
+                    sleep(policy.backoff(retries))
+                rewind()
+                continue
+            if rewind is None or response.status_code not in policy.statuses:
+                return response
+            if retries == policy.max_retries:
+                if retries:
+                    self.__count(exhausted=1)
+                return response
+            retries += 1
+            self.__count(retries=1)
+            # the body is read for the connection to be reused
+            with response:
+                response.read()
+            sleep(policy.backoff(retries, response.headers.get(RETRY_AFTER)))
+            rewind()
+
+    def __send(self, connection, uri, method, headers, body, stream):
+        """
+        Sends one attempt of a request on the given checked out connection.
+        """
+        try:
+            send_request(connection, method, _request_target(uri), headers, body)
+            response = connection.getresponse()
+            decoder = content_decoder(response, response.headers, self.max_decompressed_size) \
+                if self.decompress else None
+            if stream:
+                pool = self.pool
+                return Response(response.headers, None, response.status, response.reason, response.version,
+                                decoder or response, lambda reusable: pool.release(connection, reusable))
+            if decoder is None:
+                result = Response(response.headers, response.read(), response.status, response.reason,
+                                  response.version)
+            else:
+                result = Response(response.headers, decoder.read(), response.status, response.reason,
+                                  response.version, compressed_size=decoder.compressed_size)
+        except BaseException:
+            self.pool.release(connection, reusable=False)
+            raise
+        self.pool.release(connection, reusable=not response.will_close)
         return result
 
+    def __count(self, replayed=0, retries=0, exhausted=0):
+        with self.__lock:
+            self.__replayed += replayed
+            self.__retries += retries
+            self.__exhausted += exhausted
+
+    def statistics(self):
+        """
+        Returns the web.retry.RetryStatistics of this handler.
+        """
+        with self.__lock:
+            return RetryStatistics(self.__replayed, self.__retries, self.__exhausted)
+
+    def close(self):
+        """
+        Closes the idle connections of the pool.
+        """
+        self.pool.clear()
+
 DEFAULT_REQUEST_HANDLER = HttpRequestHandler()
 REQUEST_HANDLER = DEFAULT_REQUEST_HANDLER
 
@@ -486,12 +1657,41 @@ def _set_request_handler(request_handler):
     REQUEST_HANDLER = request_handler
 
 
-def _request(uri, method, headers, body):
-    return REQUEST_HANDLER.request(uri, method, headers, body)
+def _handler_request(handler, uri, method, headers, body, stream=False):
+    """
+    Sends the request with the given AbstractRequestHandler.
+    """
+    if stream:
+        return handler.request(uri, method, headers, body, stream=True)
+    # the handlers written before the streaming mode do not take the stream argument
+    return handler.request(uri, method, headers, body)
+
+
+def _request(uri, method, headers, body, stream=False):
+    return _handler_request(REQUEST_HANDLER, uri, method, headers, body, stream)
+
+
+URI_CACHE = None
+
+def _set_uri_cache(maxsize):
+    global URI_CACHE
+    if maxsize is None or maxsize < 1:
+        URI_CACHE = None
+    else:
+        URI_CACHE = URICache(maxsize)
+
+
+def _uri_cache_info():
+    cache = URI_CACHE
+    return cache.info() if cache is not None else None
 
 
 def _uri(uri):
     """
-    Factory method to create URI instance
+    Factory method to create URI instance.
+    If the parse cache is enabled string URIs are served from it.
     """
-    return URI(uri)
\ No newline at end of file
+    cache = URI_CACHE
+    if cache is not None and isinstance(uri, str):
+        return cache.get(uri)
+    return URI(uri)
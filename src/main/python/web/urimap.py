@@ -0,0 +1,343 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Prefix matching of URIs against large rule sets.
+
+The rules are indexed by their normalized (scheme, authority) pair and
+then by a trie over their path segments, so a lookup costs a dictionary
+access per segment of the looked up URI whatever the number of rules.
+"""
+from .assertion import iterable, raise_illegal_argument
+from .urilib import URI, _normalize_authority, CURRENT_SEGMENT, PARENT_SEGMENT, EMPTY_SEGMENT, ROOT_PATH
+from web import SEGMENT_SEPARATOR
+
+__author__ = 'Romain Gilles'
+
+# segment of a rule matching any single segment
+WILDCARD_SEGMENT = "*"
+
+# key of the value of a trie node, never equal to a segment
+_VALUE = None
+
+
+def _as_uri(uri):
+    if isinstance(uri, URI):
+        return uri
+    if isinstance(uri, str):
+        # no parse cache: the rule sets are far bigger than the cache
+        return URI(uri)
+    raise_illegal_argument("uri must be a URI or a string: {0!r}".format(uri))
+
+
+def _index_key(uri):
+    """
+    Returns the (scheme, authority, segments) index key of the given URI or None
+    if it has no hierarchical path. Only the URIs whose path can change are fully
+    normalized, the scheme and the authority are normalized directly.
+    """
+    path = uri.path
+    if path and not path.startswith(ROOT_PATH):
+        return None
+    segments = uri.segments
+    if "%" in path or CURRENT_SEGMENT in segments or PARENT_SEGMENT in segments:
+        uri = uri.normalize()
+        segments = uri.segments
+    scheme = uri.scheme.lower()
+    authority = uri.authority
+    if authority:
+        authority = _normalize_authority(scheme, authority)
+    return scheme, authority, segments
+
+
+def _rule_key(rule):
+    """
+    Returns the index key of the given rule. A trailing separator is ignored,
+    http://host/a/ and http://host/a are the same rule.
+    """
+    rule = _as_uri(rule)
+    key = _index_key(rule) if rule.scheme else None
+    if key is None or rule.query or rule.fragment:
+        raise_illegal_argument("rule must be an absolute hierarchical URI without query and fragment: {0}"
+                               .format(rule))
+    scheme, authority, segments = key
+    if segments and segments[-1] == EMPTY_SEGMENT:
+        segments = segments[:-1]
+    return scheme, authority, segments
+
+
+def _create_uri(scheme, authority, segments):
+    return URI._from_elements(scheme, authority, ROOT_PATH + SEGMENT_SEPARATOR.join(segments), None, None,
+                              tuple(segments))
+
+
+class URIMap(object):
+    """
+    Mapping from URI prefix rules to values with longest-prefix lookup.
+
+    A rule is an absolute URI without query and fragment. It matches the URIs
+    having the same normalized scheme and authority and whose path segments
+    start with the segments of the rule; the * segment of a rule matches any
+    single segment. The query and the fragment of the looked up URIs are ignored.
+
+    routes = URIMap({"https://api.example.com/v1": "v1",
+                     "https://api.example.com/v1/accounts/*/items": "items"})
+    routes.match("https://api.example.com/v1/accounts/42/items/7") == "items"
+    routes.match("https://api.example.com/v1/users") == "v1"
+    """
+    __slots__ = '__roots', '__len'
+
+    def __init__(self, rules=None):
+        """
+        @param rules None, a mapping or an iterable of (rule, value) pairs
+                     where the rule is a URI or a string.
+        """
+        self.__roots = {}
+        self.__len = 0
+        if rules is not None:
+            self.update(rules)
+
+    def update(self, rules):
+        """
+        Adds all the given rules, a mapping or an iterable of (rule, value) pairs.
+        """
+        if hasattr(rules, "items"):
+            rules = rules.items()
+        elif not iterable(rules):
+            raise_illegal_argument("rules must be a mapping or an iterable of pairs: {0}".format(rules))
+        roots = self.__roots
+        added = 0
+        for rule, value in rules:
+            scheme, authority, segments = _rule_key(rule)
+            node = roots.get((scheme, authority))
+            if node is None:
+                node = roots[scheme, authority] = {}
+            for segment in segments:
+                child = node.get(segment)
+                if child is None:
+                    child = node[segment] = {}
+                node = child
+            if _VALUE not in node:
+                added += 1
+            node[_VALUE] = value
+        self.__len += added
+
+    def __setitem__(self, rule, value):
+        self.update(((rule, value),))
+
+    def __node(self, rule):
+        scheme, authority, segments = _rule_key(rule)
+        node = self.__roots.get((scheme, authority))
+        for segment in segments:
+            if node is None:
+                break
+            node = node.get(segment)
+        if node is None or _VALUE not in node:
+            raise KeyError(rule)
+        return node
+
+    def __getitem__(self, rule):
+        """
+        Returns the value of the given rule, exact match.
+        @exception KeyError if the rule is not in this map.
+        """
+        return self.__node(rule)[_VALUE]
+
+    def get(self, rule, default=None):
+        try:
+            return self[rule]
+        except KeyError:
+            return default
+
+    def __contains__(self, rule):
+        try:
+            self.__node(rule)
+        except KeyError:
+            return False
+        return True
+
+    def __delitem__(self, rule):
+        """
+        Removes the given rule, exact match. The trie nodes left empty are removed.
+        @exception KeyError if the rule is not in this map.
+        """
+        scheme, authority, segments = _rule_key(rule)
+        root = self.__roots.get((scheme, authority))
+        path = []
+        node = root
+        for segment in segments:
+            if node is None:
+                break
+            path.append(node)
+            node = node.get(segment)
+        if node is None or _VALUE not in node:
+            raise KeyError(rule)
+        del node[_VALUE]
+        self.__len -= 1
+        for parent, segment in zip(reversed(path), reversed(segments)):
+            if node:
+                break
+            del parent[segment]
+            node = parent
+        if not root:
+            del self.__roots[scheme, authority]
+
+    def __len__(self):
+        return self.__len
+
+    def __iter__(self):
+        """
+        Iterates over the rules as normalized URIs.
+        """
+        for rule, _ in self.items():
+            yield rule
+
+    def items(self):
+        """
+        Iterates over the (rule, value) pairs, the rules as normalized URIs.
+        """
+        for (scheme, authority), root in self.__roots.items():
+            stack = [(root, ())]
+            while stack:
+                node, segments = stack.pop()
+                if _VALUE in node:
+                    yield _create_uri(scheme, authority, segments), node[_VALUE]
+                for segment, child in node.items():
+                    if segment is not _VALUE:
+                        stack.append((child, segments + (segment,)))
+
+    def __longest(self, uri):
+        """
+        Returns the (index key, depth, node) triple of the longest rule matching
+        the given URI, the depth being -1 and the node None if none. At the same depth a segment wins over a wildcard.
+        """
+        uri = _as_uri(uri)
+        key = _index_key(uri)
+        best_depth, best = -1, None
+        if key is None:
+            return key, best_depth, best
+        scheme, authority, segments = key
+        root = self.__roots.get((scheme, authority))
+        if root is None:
+            return key, best_depth, best
+        length = len(segments)
+        # the wildcard branches not explored yet
+        pending = [(root, 0)]
+        while pending:
+            node, depth = pending.pop()
+            while True:
+                if depth > best_depth and _VALUE in node:
+                    best_depth, best = depth, node
+                if depth == length:
+                    break
+                child = node.get(segments[depth])
+                wildcard = node.get(WILDCARD_SEGMENT)
+                if wildcard is not None and wildcard is not child:
+                    if child is None:
+                        child = wildcard
+                    else:
+                        pending.append((wildcard, depth + 1))
+                elif child is None:
+                    break
+                node = child
+                depth += 1
+        return (scheme, authority, segments), best_depth, best
+
+    def longest_prefix(self, uri):
+        """
+        Returns the (prefix, value) pair of the longest rule matching the given URI,
+        the prefix being the normalized URI formed by the matched segments.
+        @exception KeyError if no rule matches.
+        """
+        key, depth, node = self.__longest(uri)
+        if node is None:
+            raise KeyError(str(uri))
+        scheme, authority, segments = key
+        return _create_uri(scheme, authority, segments[:depth]), node[_VALUE]
+
+    def match(self, uri, default=None):
+        """
+        Returns the value of the longest rule matching the given URI, the default if none.
+        """
+        _, _, node = self.__longest(uri)
+        if node is None:
+            return default
+        return node[_VALUE]
+
+    def __repr__(self):
+        return "URIMap({0!r})".format({str(rule): value for rule, value in self.items()})
+
+
+class URISet(object):
+    """
+    Set of URI prefix rules.
+    @see URIMap
+    """
+    __slots__ = '__rules',
+
+    def __init__(self, rules=None):
+        """
+        @param rules None or an iterable of rules, URIs or strings.
+        """
+        self.__rules = URIMap()
+        if rules is not None:
+            self.update(rules)
+
+    def update(self, rules):
+        if not iterable(rules):
+            raise_illegal_argument("rules must be an iterable: {0}".format(rules))
+        self.__rules.update((rule, True) for rule in rules)
+
+    def add(self, rule):
+        self.__rules[rule] = True
+
+    def discard(self, rule):
+        if rule in self.__rules:
+            del self.__rules[rule]
+
+    def remove(self, rule):
+        """
+        @exception KeyError if the rule is not in this set.
+        """
+        del self.__rules[rule]
+
+    def __contains__(self, rule):
+        """
+        Returns whether the given rule is in this set, exact match.
+        @see matches
+        """
+        return rule in self.__rules
+
+    def __len__(self):
+        return len(self.__rules)
+
+    def __iter__(self):
+        return iter(self.__rules)
+
+    def matches(self, uri):
+        """
+        Returns whether a rule of this set matches the given URI.
+        """
+        return self.__rules.match(uri, False)
+
+    def longest_prefix(self, uri):
+        """
+        Returns the normalized URI formed by the segments matched by the longest rule.
+        @exception KeyError if no rule matches.
+        """
+        return self.__rules.longest_prefix(uri)[0]
+
+    def __repr__(self):
+        return "URISet({0!r})".format([str(rule) for rule in self])
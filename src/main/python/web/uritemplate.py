@@ -0,0 +1,335 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+RFC 6570 URI templates (levels 1 to 4).
+
+A template is compiled once into a list of literal and expression steps.
+The expansion feeds every step into the URI component it belongs to, so
+the resulting URI is created from its components without being parsed.
+"""
+from collections import namedtuple
+import re
+from .assertion import raise_illegal_argument, assert_that_argument_type_is
+from .codec import _create_encoding_table
+from .urilib import URI, UNRESERVED_CHARACTERS
+from web import SCHEME_SEPARATOR, AUTHORITY_SEPARATOR, SEGMENT_SEPARATOR, QUERY_SEPARATOR, FRAGMENT_SEPARATOR
+
+__author__ = 'Romain Gilles'
+
+EXPRESSION_START = "{"
+EXPRESSION_END = "}"
+VARIABLE_SEPARATOR = ","
+PREFIX_SEPARATOR = ":"
+EXPLODE_MODIFIER = "*"
+MAX_PREFIX_LENGTH = 9999
+
+RESERVED_CHARACTERS = ":/?#[]@!$&'()*+,;="
+
+_Operator = namedtuple("_Operator", "first separator named if_empty allow_reserved")
+
+# expression operators of RFC 6570 appendix A
+OPERATORS = {
+    "": _Operator("", ",", False, "", False),
+    "+": _Operator("", ",", False, "", True),
+    ".": _Operator(".", ".", False, "", False),
+    "/": _Operator("/", "/", False, "", False),
+    ";": _Operator(";", ";", True, "", False),
+    "?": _Operator("?", "&", True, "=", False),
+    "&": _Operator("&", "&", True, "=", False),
+    "#": _Operator("#", ",", False, "", True),
+}
+
+_VARIABLE_NAME = re.compile(r"(?:[A-Za-z0-9_]|%[0-9A-Fa-f]{2})(?:\.?(?:[A-Za-z0-9_]|%[0-9A-Fa-f]{2}))*")
+_SCHEME = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*")
+_LONE_PERCENT = re.compile("%(?![0-9A-Fa-f]{2})")
+
+_UNRESERVED_TABLE = _create_encoding_table("".join(sorted(UNRESERVED_CHARACTERS)))
+_RESERVED_TABLE = _create_encoding_table("".join(sorted(UNRESERVED_CHARACTERS)) + RESERVED_CHARACTERS + "%")
+
+# URI components filled by the expansion
+AUTHORITY = 0
+PATH = 1
+QUERY = 2
+FRAGMENT = 3
+
+# component starting at the given delimiter
+_DELIMITED_COMPONENTS = {SEGMENT_SEPARATOR: PATH, QUERY_SEPARATOR: QUERY, FRAGMENT_SEPARATOR: FRAGMENT}
+# delimiters ending a component
+_COMPONENT_DELIMITERS = ("/?#", "?#", "#", "")
+
+
+def _encode(value, allow_reserved):
+    if allow_reserved:
+        table = _RESERVED_TABLE
+        if "%" in value:
+            value = _LONE_PERCENT.sub("%25", value)
+    else:
+        table = _UNRESERVED_TABLE
+    if value.isascii():
+        return value.translate(table)
+    return "".join([table[byte] for byte in value.encode("utf-8")])
+
+
+def _split(text, state):
+    """
+    Splits a text which may contain component delimiters.
+    Returns the list of the (component, text) pieces and the component at the end of the text.
+    """
+    pieces = []
+    start = 0
+    while True:
+        end = len(text)
+        for delimiter in _COMPONENT_DELIMITERS[state]:
+            index = text.find(delimiter, start, end)
+            if index >= 0:
+                end = index
+        if end == len(text):
+            break
+        pieces.append((state, text[start:end]))
+        state = _DELIMITED_COMPONENTS[text[end]]
+        # the '/' delimiter is part of the path, the other ones are not part of their component
+        start = end if state == PATH else end + 1
+    pieces.append((state, text[start:]))
+    return pieces, state
+
+
+class _Literal(object):
+    """
+    Literal part of a template with its pieces precomputed for every component it can start in.
+    """
+    __slots__ = 'text', 'splits'
+
+    def __init__(self, text):
+        self.text = text
+        self.splits = tuple(_split(text, state) for state in (AUTHORITY, PATH, QUERY, FRAGMENT))
+
+
+class _Expression(object):
+    """
+    Compiled template expression.
+    """
+    __slots__ = 'operator', 'varspecs', 'delimited_component'
+
+    def __init__(self, expression):
+        operator = expression[:1] if expression[:1] in OPERATORS and expression[:1] else ""
+        if expression[:1] in "=,!@|":
+            raise_illegal_argument("unsupported reserved operator in expression: {{{0}}}".format(expression))
+        self.operator = OPERATORS[operator]
+        self.varspecs = tuple(self.__varspec(varspec, expression)
+                              for varspec in expression[len(operator):].split(VARIABLE_SEPARATOR))
+        self.delimited_component = _DELIMITED_COMPONENTS.get(self.operator.first)
+
+    @staticmethod
+    def __varspec(varspec, expression):
+        explode = varspec.endswith(EXPLODE_MODIFIER)
+        if explode:
+            varspec = varspec[:-1]
+        name, have_prefix, prefix = varspec.partition(PREFIX_SEPARATOR)
+        if not _VARIABLE_NAME.fullmatch(name):
+            raise_illegal_argument("invalid variable name in expression: {{{0}}}".format(expression))
+        if have_prefix:
+            if explode or not prefix.isdigit() or not 0 < int(prefix) <= MAX_PREFIX_LENGTH or prefix[0] == "0":
+                raise_illegal_argument("invalid prefix modifier in expression: {{{0}}}".format(expression))
+            return name, int(prefix), False
+        return name, None, explode
+
+    def expand(self, variables):
+        """
+        Returns the expansion of this expression or None if all its variables are undefined.
+        """
+        operator = self.operator
+        allow_reserved = operator.allow_reserved
+        named = operator.named
+        parts = []
+        for name, prefix, explode in self.varspecs:
+            value = variables.get(name)
+            if value is None:
+                continue
+            if hasattr(value, "items"):
+                pairs = [(str(key), str(item)) for key, item in value.items()]
+                if not pairs:
+                    continue
+                if explode:
+                    parts.append(operator.separator.join(
+                        _encode(key, allow_reserved) + (
+                            "=" + _encode(item, allow_reserved) if item or not named else operator.if_empty)
+                        for key, item in pairs))
+                    continue
+                items = [item for pair in pairs for item in pair]
+            elif isinstance(value, (list, tuple)):
+                if not value:
+                    continue
+                items = [str(item) for item in value]
+                if explode:
+                    if named:
+                        parts.append(operator.separator.join(
+                            name + ("=" + _encode(item, allow_reserved) if item else operator.if_empty)
+                            for item in items))
+                    else:
+                        parts.append(operator.separator.join(_encode(item, allow_reserved) for item in items))
+                    continue
+            else:
+                value = str(value)
+                if prefix is not None:
+                    value = value[:prefix]
+                items = (value,)
+            joined = VARIABLE_SEPARATOR.join(_encode(item, allow_reserved) for item in items)
+            if named:
+                parts.append(name + ("=" + joined if joined else operator.if_empty))
+            else:
+                parts.append(joined)
+        if not parts:
+            return None
+        return operator.first + operator.separator.join(parts)
+
+
+class URITemplate(object):
+    """
+    Compiled RFC 6570 URI template.
+
+    items = URITemplate("https://api.example.com/v1/accounts/{id}/items{?cursor,limit}")
+    items.expand(id=42, limit=10) -> https://api.example.com/v1/accounts/42/items?limit=10
+    """
+    __slots__ = '__pattern', '__steps', '__scheme', '__initial_state'
+
+    def __init__(self, pattern):
+        assert_that_argument_type_is(pattern, str, "pattern")
+        self.__pattern = pattern
+        steps = []
+        start = 0
+        while start < len(pattern):
+            expression_start = pattern.find(EXPRESSION_START, start)
+            if expression_start < 0:
+                expression_start = len(pattern)
+            literal = pattern[start:expression_start]
+            if EXPRESSION_END in literal:
+                raise_illegal_argument("unexpected '}}' in template: {0}".format(pattern))
+            if literal:
+                steps.append(_Literal(literal))
+            if expression_start == len(pattern):
+                break
+            expression_end = pattern.find(EXPRESSION_END, expression_start)
+            if expression_end < 0:
+                raise_illegal_argument("unclosed expression in template: {0}".format(pattern))
+            expression = pattern[expression_start + 1:expression_end]
+            if not expression or EXPRESSION_START in expression:
+                raise_illegal_argument("invalid expression in template: {0}".format(pattern))
+            steps.append(_Expression(expression))
+            start = expression_end + 1
+        # None if the template has to be expanded to a string and parsed
+        self.__scheme, self.__initial_state = None, None
+        first = steps[0].text if steps and isinstance(steps[0], _Literal) else ""
+        scheme, have_separator, rest = first.partition(SCHEME_SEPARATOR + AUTHORITY_SEPARATOR)
+        if have_separator and _SCHEME.fullmatch(scheme):
+            # URI with an authority, the components are known without parsing
+            self.__scheme, self.__initial_state = scheme.lower(), AUTHORITY
+            steps[0] = _Literal(rest)
+        elif first.startswith(AUTHORITY_SEPARATOR):
+            self.__scheme, self.__initial_state = "", AUTHORITY
+            steps[0] = _Literal(first[len(AUTHORITY_SEPARATOR):])
+        elif first.startswith(SEGMENT_SEPARATOR):
+            self.__scheme, self.__initial_state = "", PATH
+        self.__steps = tuple(steps)
+
+    @property
+    def pattern(self):
+        return self.__pattern
+
+    @property
+    def variables(self):
+        """
+        The names of the variables of the template in order.
+        """
+        return list(dict.fromkeys(varspec[0] for step in self.__steps if isinstance(step, _Expression)
+                                  for varspec in step.varspecs))
+
+    def __str__(self):
+        return self.__pattern
+
+    def expand_to_string(self, variables=None, **kwargs):
+        """
+        Returns the expanded template as a string.
+        """
+        variables = self.__variables(variables, kwargs)
+        result = []
+        for step in self.__steps:
+            if isinstance(step, _Literal):
+                result.append(step.text)
+            else:
+                expansion = step.expand(variables)
+                if expansion is not None:
+                    result.append(expansion)
+        return self.__prefix + "".join(result)
+
+    @property
+    def __prefix(self):
+        """
+        The scheme and authority separators removed from the first literal.
+        """
+        if self.__initial_state != AUTHORITY:
+            return ""
+        return (self.__scheme + SCHEME_SEPARATOR if self.__scheme else "") + AUTHORITY_SEPARATOR
+
+    def expand(self, variables=None, **kwargs):
+        """
+        Returns the URI formed by the expansion of the template with the given
+        variables, a mapping and or keyword arguments. A variable is undefined if
+        it is missing or None or an empty list or dict.
+        """
+        state = self.__initial_state
+        if state is None:
+            # the template does not start with a literal scheme, authority or absolute path
+            return URI(self.expand_to_string(variables, **kwargs))
+        variables = self.__variables(variables, kwargs)
+        components = ([], [], [], [])
+        # the string representation, it keeps the empty query and fragment
+        result = [self.__prefix]
+        for step in self.__steps:
+            if isinstance(step, _Literal):
+                result.append(step.text)
+                pieces, state = step.splits[state]
+            else:
+                text = step.expand(variables)
+                if text is None:
+                    continue
+                result.append(text)
+                if not step.operator.allow_reserved:
+                    # only the first character of an unreserved expansion can be a delimiter
+                    component = step.delimited_component
+                    if component is not None and component > state:
+                        state = component
+                        if state != PATH:
+                            text = text[1:]
+                    components[state].append(text)
+                    continue
+                pieces, state = _split(text, state)
+            for component, text in pieces:
+                components[component].append(text)
+        authority, path, query, fragment = ("".join(component) for component in components)
+        result = "".join(result)
+        if self.__initial_state == PATH and path.startswith(AUTHORITY_SEPARATOR):
+            # the string starts with an authority
+            return URI(result)
+        return URI._from_elements(self.__scheme, authority, path, query, fragment, uri=result)
+
+    @staticmethod
+    def __variables(variables, kwargs):
+        if variables is None:
+            return kwargs
+        if kwargs:
+            variables = dict(variables)
+            variables.update(kwargs)
+        return variables
@@ -0,0 +1,43 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Micro benchmarks of the web package.
+Each module can be launched on its own: python -m webbench.<module>
+"""
+from timeit import Timer
+
+__author__ = 'Romain Gilles'
+
+DEFAULT_REPEAT = 5
+
+
+def measure(statement, number, repeat=DEFAULT_REPEAT):
+    """
+    Returns the best time per call in microseconds of the given callable.
+    """
+    timer = Timer(statement)
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def report(title, results):
+    """
+    Prints the (label, microseconds) results of a benchmark.
+    The first result is the reference used to compute the speed-up of the others.
+    """
+    print(title)
+    reference = results[0][1]
+    for label, elapsed in results:
+        print("  {0:<40} {1:10.3f} us  x{2:.2f}".format(label, elapsed, reference / elapsed))
@@ -0,0 +1,121 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process, Pipe
+from time import perf_counter
+from web.asynclib import AsyncHttpRequestHandler, AsyncConnectionPool
+from web.pool import ConnectionPool
+from web.urilib import HttpRequestHandler, URI
+from webbench import report
+from webtest.httpserver import LocalServer, HOST
+
+__author__ = 'Romain Gilles'
+
+NB_REQUESTS = 1000
+# connections per server of the pools
+MAX_SIZE = 32
+DEFAULT_REPEAT = 3
+
+
+def _best(run, repeat=DEFAULT_REPEAT):
+    """
+    Returns the best time per request in microseconds of the given coroutine function.
+    """
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        asyncio.run(run())
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / NB_REQUESTS * 1e6
+
+
+def _executor_run(uri):
+    handler = HttpRequestHandler(ConnectionPool(max_size=MAX_SIZE))
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(MAX_SIZE) as executor:
+            responses = await asyncio.gather(*(loop.run_in_executor(executor, handler.request, uri)
+                                               for _ in range(NB_REQUESTS)))
+        assert all(response.status_code == 200 for response in responses)
+    return run
+
+
+def _async_run(uri):
+    # a new handler per run: a pool belongs to one event loop
+    async def run():
+        handler = AsyncHttpRequestHandler(AsyncConnectionPool(max_size=MAX_SIZE))
+        responses = await asyncio.gather(*(handler.request(uri) for _ in range(NB_REQUESTS)))
+        assert all(response.status_code == 200 for response in responses)
+        handler.close()
+    return run
+
+
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 12\r\n\r\nHello bench!"
+
+
+async def _respond(reader, writer):
+    # keep-alive GET requests without body
+    try:
+        while await reader.readuntil(b"\r\n\r\n"):
+            writer.write(RESPONSE)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+
+async def _serve_fast(connection):
+    server = await asyncio.start_server(_respond, HOST, 0, backlog=1024)
+    connection.send("http://{0}:{1}/hello/bench".format(HOST, server.sockets[0].getsockname()[1]))
+    await asyncio.get_running_loop().run_in_executor(None, connection.recv)
+    server.close()
+
+
+def _serve(connection, fast):
+    if fast:
+        asyncio.run(_serve_fast(connection))
+        return
+    with LocalServer() as server:
+        connection.send(server.uri("/hello/bench"))
+        # until the benchmark ends
+        connection.recv()
+
+
+def _benchmark(title, fast):
+    # the server runs in another process, not to share the GIL with the measured client
+    connection, server_connection = Pipe()
+    server = Process(target=_serve, args=(server_connection, fast))
+    server.start()
+    try:
+        uri = URI(connection.recv())
+        report(title, [("HttpRequestHandler in run_in_executor", _best(_executor_run(uri))),
+                       ("AsyncHttpRequestHandler", _best(_async_run(uri)))])
+    finally:
+        connection.send(None)
+        server.join()
+
+
+def main():
+    _benchmark("{0} concurrent GET, {1} connections, http.server LocalServer, per request"
+               .format(NB_REQUESTS, MAX_SIZE), False)
+    # the client is the bottleneck
+    _benchmark("{0} concurrent GET, {1} connections, fixed response asyncio server, per request"
+               .format(NB_REQUESTS, MAX_SIZE), True)
+
+
+if __name__ == "__main__":
+    main()
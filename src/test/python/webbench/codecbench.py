@@ -0,0 +1,61 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from urllib.parse import quote, unquote
+from web.codec import encode_segment, encode_segments, decode, decode_segments, encode_query_params
+from webbench import measure, report
+
+__author__ = 'Romain Gilles'
+
+NUMBER = 20000
+
+SEGMENTS = ("v1", "accounts", "john doe", "documents", "résumé 2024.pdf")
+
+PARAMS = (("q", "uri library"), ("page", "2"), ("sort", "+name"), ("lang", "fr"))
+
+
+def bench_segments():
+    encoded = encode_segments(SEGMENTS)
+    report("encode {0} segments".format(len(SEGMENTS)), [
+        ("urllib.parse.quote per segment", measure(lambda: tuple([quote(segment, safe="") for segment in SEGMENTS]),
+                                                   NUMBER)),
+        ("codec.encode_segment per segment", measure(lambda: tuple([encode_segment(segment)
+                                                                    for segment in SEGMENTS]), NUMBER)),
+        ("codec.encode_segments", measure(lambda: encode_segments(SEGMENTS), NUMBER)),
+        ("codec.encode_segments, ASCII", measure(lambda: encode_segments(SEGMENTS[:4]), NUMBER)),
+    ])
+    report("decode {0} segments".format(len(SEGMENTS)), [
+        ("urllib.parse.unquote per segment", measure(lambda: tuple([unquote(segment) for segment in encoded]),
+                                                     NUMBER)),
+        ("codec.decode per segment", measure(lambda: tuple([decode(segment) for segment in encoded]), NUMBER)),
+        ("codec.decode_segments", measure(lambda: decode_segments(encoded), NUMBER)),
+    ])
+
+
+def bench_query():
+    report("encode {0} query parameters".format(len(PARAMS)), [
+        ("urllib.parse.quote per key and value", measure(lambda: "&".join(
+            [quote(key, safe="") + "=" + quote(value, safe="") for key, value in PARAMS]), NUMBER)),
+        ("codec.encode_query_params", measure(lambda: encode_query_params(PARAMS), NUMBER)),
+    ])
+
+
+def main():
+    bench_segments()
+    bench_query()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from web.pool import ConnectionPool
+from web.urilib import HttpRequestHandler, URI
+from webbench import measure, report
+from webtest.httpserver import LocalServer
+
+__author__ = 'Romain Gilles'
+
+SIZE = 4 * 1024 * 1024
+NUMBER = 20
+
+
+def _stream(handler, uri):
+    with handler.request(uri, stream=True) as response:
+        for _ in response.iter_bytes():
+            pass
+    return response
+
+
+def main():
+    with LocalServer() as server:
+        pool = ConnectionPool()
+        raw = HttpRequestHandler(pool)
+        decompressing = HttpRequestHandler(pool, decompress=True)
+        plain_uri = URI(server.uri("/bytes?size={0}".format(SIZE)))
+        gzip_uri = URI(server.uri("/compressed?size={0}".format(SIZE)))
+        response = decompressing.request(gzip_uri)
+        print("{0} bytes JSON body: {1} bytes received gzip encoded, x{2:.1f}".format(
+            response.decompressed_size, response.compressed_size,
+            response.decompressed_size / response.compressed_size))
+        report("GET of a {0} MB body on a local server".format(SIZE // (1024 * 1024)),
+               [("identity, buffered", measure(lambda: raw.request(plain_uri), NUMBER)),
+                ("gzip decompressed, buffered", measure(lambda: decompressing.request(gzip_uri), NUMBER)),
+                ("identity, streamed", measure(lambda: _stream(raw, plain_uri), NUMBER)),
+                ("gzip decompressed, streamed", measure(lambda: _stream(decompressing, gzip_uri), NUMBER))])
+        pool.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from itertools import count
+from threading import Lock
+from time import perf_counter, sleep
+from web.hedging import HedgingRequestHandler
+from web.pool import ConnectionPool
+from web.urilib import HttpRequestHandler
+from webtest.httpserver import LocalServer, LocalRequestHandler
+
+__author__ = 'Romain Gilles'
+
+NB_REQUESTS = 1000
+# one request out of SLOW_EVERY is answered after SLOW_DELAY seconds
+SLOW_EVERY = 50
+SLOW_DELAY = 0.05
+
+
+class TailLatencyHandler(LocalRequestHandler):
+    counter = count(1)
+    lock = Lock()
+
+    def _tail(self):
+        with TailLatencyHandler.lock:
+            slow = next(TailLatencyHandler.counter) % SLOW_EVERY == 0
+        if slow:
+            sleep(SLOW_DELAY)
+        self._handle()
+
+    do_GET = _tail
+
+
+def _latencies(label, handler, uri):
+    latencies = []
+    for _ in range(NB_REQUESTS):
+        start = perf_counter()
+        handler.request(uri)
+        latencies.append((perf_counter() - start) * 1e6)
+    latencies.sort()
+    print("  {0:<44} p50 {1:8.0f} us  p99 {2:8.0f} us  max {3:8.0f} us".format(
+        label, latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100], latencies[-1]))
+
+
+def main():
+    with LocalServer(TailLatencyHandler) as server:
+        uri = server.uri("/hello/world")
+        print("{0} GET on a local server answering one request out of {1} after {2} ms".format(
+            NB_REQUESTS, SLOW_EVERY, SLOW_DELAY * 1000))
+        handler = HttpRequestHandler(ConnectionPool(max_size=4))
+        _latencies("HttpRequestHandler", handler, uri)
+        hedging = HedgingRequestHandler(handler, percentile=95, budget=0.05)
+        _latencies("HedgingRequestHandler p95, 5% budget", hedging, uri)
+        print("  {0}".format(hedging.statistics()))
+        hedging.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from web.httpcache import CachingRequestHandler
+from web.urilib import HttpRequestHandler, URI
+from webbench import measure, report
+from webtest.httpserver import LocalServer
+
+__author__ = 'Romain Gilles'
+
+NUMBER = 2000
+
+
+def main():
+    with LocalServer() as server:
+        handler = HttpRequestHandler()
+        fresh = CachingRequestHandler(handler)
+        revalidated = CachingRequestHandler(handler)
+        fresh_uri = URI(server.uri("/cached?cache_control=max-age%3D3600&etag=v1"))
+        stale_uri = URI(server.uri("/cached?cache_control=max-age%3D0&etag=v1"))
+        report("GET of a reference document on a local server",
+               [("HttpRequestHandler", measure(lambda: handler.request(fresh_uri), NUMBER)),
+                ("CachingRequestHandler, revalidated (304)", measure(lambda: revalidated.request(stale_uri), NUMBER)),
+                ("CachingRequestHandler, fresh", measure(lambda: fresh.request(fresh_uri), NUMBER))])
+        handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from time import perf_counter
+from web import request, request_many, set_request_handler
+from web.pool import ConnectionPool
+from web.urilib import HttpRequestHandler, DEFAULT_REQUEST_HANDLER
+from webtest.httpserver import LocalServer
+
+__author__ = 'Romain Gilles'
+
+NB_SERVERS = 4
+NB_REQUESTS = 400
+# latency injected by the server in seconds
+DELAY = 0.01
+MAX_WORKERS = 32
+
+
+def _throughput(label, run, uris):
+    start = perf_counter()
+    count = run(uris)
+    elapsed = perf_counter() - start
+    assert count == len(uris)
+    print("  {0:<44} {1:8.0f} requests/s  {2:6.2f} s".format(label, len(uris) / elapsed, elapsed))
+
+
+def _serial(uris):
+    return sum(request(uri).status_code == 200 for uri in uris)
+
+
+def _many(**options):
+    def run(uris):
+        return sum(result.response.status_code == 200 for result in request_many(uris, **options))
+    return run
+
+
+def main():
+    servers = [LocalServer().start() for _ in range(NB_SERVERS)]
+    set_request_handler(HttpRequestHandler(ConnectionPool(max_size=MAX_WORKERS)))
+    try:
+        uris = [servers[index % NB_SERVERS].uri("/slow?delay={0}".format(DELAY)) for index in range(NB_REQUESTS)]
+        # the slow server answers after ten times the delay
+        skewed = [servers[0].uri("/slow?delay={0}".format(DELAY * 10)) for _ in range(NB_REQUESTS // 10)] + \
+            [servers[1 + index % (NB_SERVERS - 1)].uri("/slow?delay={0}".format(DELAY))
+             for index in range(NB_REQUESTS)]
+        print("{0} GET on {1} local servers answering after {2} ms".format(NB_REQUESTS, NB_SERVERS, DELAY * 1000))
+        _throughput("web.request loop", _serial, uris[:NB_REQUESTS // 4])
+        _throughput("request_many 8 workers", _many(max_workers=8), uris)
+        _throughput("request_many 32 workers", _many(max_workers=MAX_WORKERS), uris)
+        _throughput("request_many 32 workers, ordered", _many(max_workers=MAX_WORKERS, ordered=True), uris)
+        _throughput("request_many 32 workers, 4 per host", _many(max_workers=MAX_WORKERS, per_host_limit=4), uris)
+        print("{0} GET on a server answering after {1} ms then {2} on {3} servers answering after {4} ms".format(
+            NB_REQUESTS // 10, DELAY * 10000, NB_REQUESTS, NB_SERVERS - 1, DELAY * 1000))
+        _throughput("request_many 32 workers", _many(max_workers=MAX_WORKERS), skewed)
+        # the slow server can not hold all the workers
+        _throughput("request_many 32 workers, 24 per host", _many(max_workers=MAX_WORKERS, per_host_limit=24),
+                    skewed)
+    finally:
+        set_request_handler(DEFAULT_REQUEST_HANDLER)
+        for server in servers:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
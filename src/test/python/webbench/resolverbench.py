@@ -0,0 +1,62 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import socket
+from threading import Thread
+from web.resolver import Connector, system_resolver
+from webbench import measure, report
+
+__author__ = 'Romain Gilles'
+
+NUMBER = 2000
+HOST = "localhost"
+
+
+def _accept(server):
+    try:
+        while True:
+            server.accept()[0].close()
+    except OSError:
+        pass
+
+
+def _connect(connect, address):
+    def run():
+        connect(address).close()
+    return run
+
+
+def main():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1024)
+    Thread(target=_accept, args=(server,), daemon=True).start()
+    address = HOST, server.getsockname()[1]
+    cached = Connector()
+    try:
+        report("new connection to {0}".format(HOST),
+               [("socket.create_connection", measure(_connect(socket.create_connection, address), NUMBER)),
+                ("Connector, no cache", measure(_connect(Connector(system_resolver), address), NUMBER)),
+                ("Connector, CachingResolver", measure(_connect(cached, address), NUMBER))])
+        statistics = cached.statistics()
+        print("  resolve {0:.1f} us  connect {1:.1f} us per connection".format(
+            statistics.resolve_time / statistics.connections * 1e6,
+            statistics.connect_time / statistics.connections * 1e6))
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tracemalloc
+from web import uri_batch
+from web.urilib import URI
+from webbench import measure, report
+
+__author__ = 'Romain Gilles'
+
+NB_URIS = 100000
+
+CORPUS = ["https://www.host{0}.com:8080/v1/accounts/{0}/items?cursor={0}&limit=10".format(index)
+          for index in range(NB_URIS)]
+
+
+def _allocated(factory):
+    tracemalloc.start()
+    try:
+        result = factory()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_parse():
+    report("parse {0} URIs, per URI".format(NB_URIS), [
+        ("list of URI", measure(lambda: [URI(string) for string in CORPUS], 1, repeat=3) / NB_URIS),
+        ("uri_batch", measure(lambda: uri_batch(CORPUS), 1, repeat=3) / NB_URIS),
+    ])
+
+
+def bench_columns():
+    uris = [URI(string) for string in CORPUS]
+    batch = uri_batch(CORPUS)
+    report("hostnames column, per URI", [
+        ("list of URI", measure(lambda: [parsed.hostname for parsed in uris], 1, repeat=3) / NB_URIS),
+        ("uri_batch", measure(lambda: batch.hostnames, 1, repeat=3) / NB_URIS),
+    ])
+    report("segment counts column, per URI", [
+        ("list of URI", measure(lambda: [len(parsed.segments) for parsed in uris], 1, repeat=3) / NB_URIS),
+        ("uri_batch", measure(lambda: batch.segment_counts, 1, repeat=3) / NB_URIS),
+    ])
+
+
+def bench_memory():
+    print("memory per URI (tracemalloc)")
+    for label, factory in (("list of URI", lambda: [URI(string) for string in CORPUS]),
+                           ("uri_batch", lambda: uri_batch(CORPUS))):
+        print("  {0:<40} {1:10.1f} bytes".format(label, _allocated(factory) / NB_URIS))
+
+
+def main():
+    bench_parse()
+    bench_columns()
+    bench_memory()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pickle
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+from urllib.parse import urlsplit
+from web import dump_uris, load_uris
+from web.urilib import URI
+
+__author__ = 'Romain Gilles'
+
+NB_URIS = 1000000
+
+CORPUS = ["https://www.host{0}.com/v1/accounts/{0}/items?cursor={0}&limit=10".format(index)
+          for index in range(NB_URIS)]
+
+
+
+class _SplitResultURI(object):
+    """
+    Default pickling of the previous layout: the slots including the SplitResult.
+    """
+    __slots__ = 'uri', 'structure'
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.structure = urlsplit(uri)
+
+
+def _timed(function):
+    start = perf_counter()
+    result = function()
+    return result, perf_counter() - start
+
+
+def _handoff(label, dump, load):
+    data, dump_time = _timed(dump)
+    memory = SharedMemory(create=True, size=len(data))
+    try:
+        _, copy_time = _timed(lambda: memory.buf.__setitem__(slice(0, len(data)), data))
+        # a second handle on the block, as the worker process would attach it
+        attached = SharedMemory(memory.name)
+        loaded, load_time = _timed(lambda: load(attached.buf))
+        attached.close()
+    finally:
+        memory.close()
+        memory.unlink()
+    assert len(loaded) == NB_URIS
+    print("  {0:<36} dump {1:6.2f} s  copy {2:5.2f} s  load {3:6.2f} s  {4:7.1f} MB".format(
+        label, dump_time, copy_time, load_time, len(data) / 1e6))
+
+
+def main():
+    uris = [URI(string) for string in CORPUS]
+    previous = [_SplitResultURI(string) for string in CORPUS]
+    print("hand off {0} URIs through shared memory".format(NB_URIS))
+    _handoff("pickle, SplitResult slots", lambda: pickle.dumps(previous, pickle.HIGHEST_PROTOCOL),
+             lambda buffer: pickle.loads(buffer))
+    _handoff("pickle, strings + web.uri parse", lambda: pickle.dumps(CORPUS, pickle.HIGHEST_PROTOCOL),
+             lambda buffer: [URI(string) for string in pickle.loads(buffer)])
+    _handoff("pickle, URI.__reduce__", lambda: pickle.dumps(uris, pickle.HIGHEST_PROTOCOL),
+             lambda buffer: pickle.loads(buffer))
+    _handoff("dump_uris / load_uris", lambda: dump_uris(uris), load_uris)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import gc
+import tracemalloc
+from time import perf_counter
+from web.urilib import URI
+from web.urimap import URIMap
+from webbench import measure, report
+
+__author__ = 'Romain Gilles'
+
+SIZES = 10000, 100000, 1000000
+
+NB_HOSTS = 1000
+
+NB_LOOKUPS = 10000
+
+
+def _rule(index):
+    host = index % NB_HOSTS
+    rest = index // NB_HOSTS
+    # one rule out of 16 has a wildcard segment
+    section = "*" if index % 16 == 0 else "s{0}".format(rest % 50)
+    return "https://www.host{0}.com/{1}/{2}/r{3}".format(host, ["api", "static", "v1"][index % 3], section, rest)
+
+
+def _targets(size):
+    return [URI("https://www.host{0}.com/{1}/s{2}/r{3}/items/{4}?page=2".format(
+        index % NB_HOSTS, ["api", "static", "v1"][index % 3], (index // NB_HOSTS) % 50,
+        (index * 7919 // NB_HOSTS) % (size // NB_HOSTS), index)) for index in range(NB_LOOKUPS)]
+
+
+def _build(rules):
+    return URIMap((rule, index) for index, rule in enumerate(rules))
+
+
+def _allocated(factory):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = factory()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def _linear_match(rules, target):
+    best = None
+    for rule in rules:
+        if target.startswith(rule) and (best is None or len(rule) > len(best)):
+            best = rule
+    return best
+
+
+def bench_size(size):
+    rules = [_rule(index) for index in range(size)]
+    start = perf_counter()
+    routes = _build(rules)
+    build = perf_counter() - start
+    targets = _targets(size)
+    for target in targets:
+        # the lookup cost does not include the parsing of the targets
+        target.segments
+    strings = [str(target) for target in targets]
+    lookups = [("URIMap.match", measure(lambda: [routes.match(target) for target in targets], 1) / NB_LOOKUPS),
+               ("URIMap.match of strings (parse included)",
+                measure(lambda: [routes.match(target) for target in strings], 1) / NB_LOOKUPS)]
+    if size <= SIZES[0]:
+        lookups.append(("linear str.startswith scan",
+                        measure(lambda: [_linear_match(rules, target) for target in strings[:100]], 1, repeat=3) / 100))
+    report("{0} rules: build {1:.2f} s, {2:.1f} us per rule".format(size, build, build * 1e6 / size), lookups)
+    del routes
+    print("  {0:<40} {1:10.1f} bytes".format("memory per rule (tracemalloc)", _allocated(lambda: _build(rules)) / size))
+
+
+def main():
+    for size in SIZES:
+        bench_size(size)
+
+
+if __name__ == "__main__":
+    main()
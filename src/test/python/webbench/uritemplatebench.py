@@ -0,0 +1,58 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from itertools import count
+from urllib.parse import quote
+from web import uri, uri_template
+from webbench import measure, report
+
+__author__ = 'Romain Gilles'
+
+NUMBER = 20000
+
+PATTERN = "https://api.example.com/v1/accounts/{id}/items{?cursor,limit}"
+FORMAT = "https://api.example.com/v1/accounts/{id}/items?cursor={cursor}&limit={limit}"
+
+
+def bench_expand():
+    # every call uses a new account id so the parse cache of web.uri never hits
+    template = uri_template(PATTERN)
+    ids = count()
+
+    def variables():
+        return {"id": str(next(ids)), "cursor": "c0ffee/=", "limit": "10"}
+
+    def format_and_parse():
+        return uri(FORMAT.format(**{name: quote(value, safe="") for name, value in variables().items()}))
+
+    report("expand {0}".format(PATTERN), [
+        ("quote + format + web.uri", measure(format_and_parse, NUMBER)),
+        ("template.expand", measure(lambda: template.expand(variables()), NUMBER)),
+        ("quote + format + web.uri + path", measure(lambda: format_and_parse().path, NUMBER)),
+        ("template.expand + path", measure(lambda: template.expand(variables()).path, NUMBER)),
+    ])
+
+
+def bench_compile():
+    report("compile", [("uri_template", measure(lambda: uri_template(PATTERN), NUMBER // 10))])
+
+
+def main():
+    bench_expand()
+    bench_compile()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import io
+from hashlib import sha256
+from http.client import InvalidURL
+import os
+import tempfile
+import unittest
+from web import uri, arequest, set_async_request_handler
+from web.asynclib import AsyncHttpRequestHandler, AsyncConnectionPool, DEFAULT_ASYNC_REQUEST_HANDLER
+from web.assertion import IllegalArgumentError
+from web.body import BodyLengthError
+from web.pool import PoolExhaustedError
+from web.urilib import Response
+from webtest.httpserver import LocalServer, server_ssl_context, client_ssl_context
+
+__author__ = 'Romain Gilles'
+
+SIZE = 300000
+
+
+def _expected(size):
+    return bytes(index % 256 for index in range(size))
+
+
+class ShrinkingFile(io.BytesIO):
+    """
+    File truncated once its length was read for the Content-Length header.
+    """
+
+    def read(self, size=-1):
+        self.truncate(5)
+        return super().read(size)
+
+
+class AsyncHttpRequestHandlerTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.handler = AsyncHttpRequestHandler(AsyncConnectionPool(max_size=2, timeout=1))
+        self.pool = self.handler.pool
+
+    async def asyncTearDown(self):
+        self.handler.close()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _request(self, path, method="GET", headers=None, body=None, stream=False):
+        return self.handler.request(uri(self.server.uri(path)), method, headers, body, stream)
+
+    async def test_keep_alive(self):
+        for name in ("a", "b", "c"):
+            response = await self._request("/hello/" + name)
+            self.assertIsInstance(response, Response)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(11, response.http_version)
+            self.assertEqual("text/plain; charset=UTF-8", response.headers["Content-Type"])
+            self.assertEqual("Hello {0}!".format(name).encode("utf-8"), response.body)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual((1, 2), self.pool.statistics()[:2])
+
+    async def test_concurrent_requests(self):
+        responses = await asyncio.gather(*(self._request("/slow?delay=0.01") for _ in range(20)))
+        self.assertEqual([b"slow"] * 20, [response.body for response in responses])
+        self.assertLessEqual(self.server.connections, 2)
+        statistics = self.pool.statistics()
+        self.assertEqual((0, self.server.connections), (statistics.in_use, statistics.idle))
+
+    async def test_request_target_and_methods(self):
+        response = await self._request("/echo?a=1#fragment", "DELETE")
+        self.assertEqual("/echo?a=1", response.headers["X-Path"])
+        self.assertEqual("DELETE", response.headers["X-Method"])
+        response = await self._request("/hello/head", "HEAD")
+        self.assertEqual(b"", response.body)
+        self.assertEqual((b"Hello a!", 1), ((await self._request("/hello/a")).body, self.server.connections))
+
+    async def test_invalid_request_is_not_sent(self):
+        with self.assertRaises(InvalidURL):
+            await self._request("/a b")
+        with self.assertRaises(ValueError):
+            await self._request("/hello/a", headers={"X": "v\r\nInjected: yes"})
+        with self.assertRaises(ValueError):
+            await self._request("/hello/a", headers={"X: Y": "v"})
+        with self.assertRaises(ValueError):
+            await self._request("/hello/a", "GET\r\nX:")
+        self.assertEqual(0, self.server.requests)
+        self.assertEqual(b"Hello a!", (await self._request("/hello/a", headers={"X": "v\r\n\tfolded"})).body)
+
+    async def test_connection_close(self):
+        self.assertEqual(b"closed", (await self._request("/close")).body)
+        self.assertEqual(0, self.pool.statistics().idle)
+        await self._request("/hello/a")
+        self.assertEqual(2, self.server.connections)
+
+    async def test_stream(self):
+        async with await self._request("/bytes?size={0}".format(SIZE), stream=True) as response:
+            self.assertTrue(response.streamed)
+            self.assertEqual(1, self.pool.statistics().in_use)
+            chunks = [chunk async for chunk in response.aiter_bytes(4096)]
+            self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks))
+            self.assertEqual(_expected(SIZE), b"".join(chunks))
+            self.assertEqual((0, 1), self.pool.statistics()[6:])
+        response = await self._request("/bytes?size=10", stream=True)
+        self.assertRaises(RuntimeError, response.read)
+        self.assertEqual(_expected(10), await response.aread())
+        self.assertEqual(1, self.server.connections)
+
+    async def test_stream_lines(self):
+        async with await self._request("/lines?count=1000", stream=True) as response:
+            lines = [line async for line in response.aiter_lines(chunk_size=7)]
+        self.assertEqual(["line {0}".format(index).encode("ascii") for index in range(1000)], lines)
+        self.assertEqual((0, 1), self.pool.statistics()[6:])
+        response = await self._request("/lines?count=2")
+        self.assertEqual(b"line 0\r\nline 1\r\n", response.body)
+        self.assertEqual(1, self.server.connections)
+
+    async def test_close_before_the_end(self):
+        async with await self._request("/bytes?size={0}".format(SIZE), stream=True) as response:
+            await response.aread(10)
+        self.assertEqual((0, 0), self.pool.statistics()[6:])
+        await self._request("/hello/a")
+        self.assertEqual(2, self.server.connections)
+
+    async def test_pool_timeout(self):
+        pool = AsyncConnectionPool(max_size=1, timeout=0.05)
+        handler = AsyncHttpRequestHandler(pool)
+        response = await handler.request(self.server.uri("/bytes?size=10"), stream=True)
+        with self.assertRaises(PoolExhaustedError):
+            await handler.request(self.server.uri("/hello/a"))
+        waiting = asyncio.ensure_future(handler.request(self.server.uri("/hello/a"), "GET", None, None))
+        await asyncio.sleep(0.01)
+        response.close()
+        self.assertEqual(b"Hello a!", (await waiting).body)
+        self.assertEqual((2, 1), (pool.statistics().waits, pool.statistics().timeouts))
+        handler.close()
+
+    async def test_bodies(self):
+        response = await self._request("/echo", "POST", {"Content-Type": "text/plain"}, b"bytes")
+        self.assertEqual((b"bytes", "5"), (response.body, response.headers["X-Content-Length"]))
+        response = await self._request("/echo", "POST", None, memoryview(b"a buffer")[2:])
+        self.assertEqual(b"buffer", response.body)
+        response = await self._request("/echo", "POST", None, (chunk for chunk in (b"a", b"", "b")))
+        self.assertEqual((b"ab", "chunked"), (response.body, response.headers["X-Transfer-Encoding"]))
+
+        async def chunks():
+            for chunk in (b"async ", b"chunks"):
+                yield chunk
+        response = await self._request("/echo", "PUT", None, chunks())
+        self.assertEqual(b"async chunks", response.body)
+        response = await self._request("/echo", "POST")
+        self.assertEqual("0", response.headers["X-Content-Length"])
+        with self.assertRaises(IllegalArgumentError):
+            await self._request("/echo", "POST", None, 12)
+
+    async def test_file_body(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        with tempfile.TemporaryFile() as file:
+            file.write(data)
+            file.seek(0)
+            response = await self._request("/digest", "PUT", None, file)
+            self.assertEqual(len(data), file.tell())
+        self.assertEqual("{0} {1}".format(len(data), sha256(data).hexdigest()).encode("ascii"), response.body)
+
+    async def test_file_shorter_than_its_length(self):
+        body = ShrinkingFile(b"0123456789")
+        with self.assertRaises(BodyLengthError):
+            await self._request("/echo", "PUT", None, body)
+        self.assertEqual((0, 0), self.handler.pool.statistics()[-2:])
+
+    async def test_arequest(self):
+        set_async_request_handler(self.handler)
+        try:
+            response = await arequest(self.server.uri("/echo"), "POST", b"body", {"X-Test": "1"})
+            self.assertEqual(b"body", response.body)
+        finally:
+            set_async_request_handler(DEFAULT_ASYNC_REQUEST_HANDLER)
+        self.assertRaises(IllegalArgumentError, set_async_request_handler, object())
+
+
+class AsyncHttpsRequestHandlerTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = LocalServer(ssl_context=server_ssl_context()).start()
+        self.handler = AsyncHttpRequestHandler(ssl_context=client_ssl_context())
+
+    async def asyncTearDown(self):
+        self.handler.close()
+
+    def tearDown(self):
+        self.server.stop()
+
+    async def test_keep_alive(self):
+        for name in ("a", "b", "c"):
+            response = await self.handler.request(self.server.uri("/hello/" + name))
+            self.assertEqual("Hello {0}!".format(name).encode("utf-8"), response.body)
+        self.assertEqual(1, self.server.connections)
+
+    async def test_file_body(self):
+        data = os.urandom(1024 * 1024)
+        with tempfile.TemporaryFile() as file:
+            file.write(data)
+            file.seek(0)
+            response = await self.handler.request(self.server.uri("/echo"), "PUT", None, file)
+        self.assertEqual(data, response.body)
+
+    def test_shared_context(self):
+        self.assertRaises(IllegalArgumentError, AsyncHttpRequestHandler, AsyncConnectionPool(), client_ssl_context())
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(AsyncHttpRequestHandlerTest),
+                               loader.loadTestsFromTestCase(AsyncHttpsRequestHandlerTest)))
+
+if __name__ == '__main__':
+    unittest.main()
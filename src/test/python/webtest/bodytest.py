@@ -0,0 +1,207 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from array import array
+from hashlib import sha256
+import io
+import mmap
+import os
+import tempfile
+import unittest
+from web import uri
+from web.assertion import IllegalArgumentError
+from web.body import body_length, BodyLengthError
+from web.urilib import HttpRequestHandler
+from webtest.httpserver import LocalServer, server_ssl_context, client_ssl_context
+
+__author__ = 'Romain Gilles'
+
+SIZE = 3 * 1024 * 1024 + 17
+
+
+def _digest(data):
+    return "{0} {1}".format(len(data), sha256(data).hexdigest()).encode("ascii")
+
+
+class BodyLengthTest(unittest.TestCase):
+
+    def test_buffers(self):
+        self.assertEqual(0, body_length(None))
+        self.assertEqual(3, body_length(b"abc"))
+        self.assertEqual(2, body_length("éè"))
+        self.assertEqual(3, body_length(bytearray(b"abc")))
+        self.assertEqual(2, body_length(memoryview(b"abc")[1:]))
+        self.assertEqual(12, body_length(array("i", [1, 2, 3])))
+
+    def test_files(self):
+        with tempfile.TemporaryFile() as file:
+            file.write(b"0123456789")
+            file.seek(4)
+            self.assertEqual(6, body_length(file))
+            self.assertEqual(4, file.tell())
+        body = io.BytesIO(b"0123456789")
+        body.seek(8)
+        self.assertEqual(2, body_length(body))
+        self.assertEqual(8, body.tell())
+        read, write = os.pipe()
+        os.close(write)
+        with open(read, "rb") as pipe:
+            self.assertIsNone(body_length(pipe))
+
+    def test_iterables(self):
+        self.assertIsNone(body_length(chunk for chunk in (b"a", b"b")))
+        self.assertIsNone(body_length([b"a", b"b"]))
+
+    def test_illegal_bodies(self):
+        self.assertRaises(IllegalArgumentError, body_length, 12)
+        self.assertRaises(IllegalArgumentError, body_length, io.StringIO("text"))
+
+
+class ShrinkingFile(io.BytesIO):
+    """
+    File truncated once its length was read for the Content-Length header.
+    """
+
+    def readinto(self, buffer):
+        self.truncate(5)
+        return super().readinto(buffer)
+
+
+class BodyUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.handler = HttpRequestHandler()
+
+    def tearDown(self):
+        self.handler.close()
+        self.server.stop()
+
+    def _post(self, path, body, headers=None):
+        return self.handler.request(uri(self.server.uri(path)), "POST", headers, body)
+
+    def test_buffers(self):
+        for body in (bytearray(b"buffer"), memoryview(b"a buffer")[2:], array("B", b"buffer")):
+            response = self._post("/echo", body)
+            self.assertEqual(bytes(body), response.body)
+            self.assertEqual(str(len(bytes(body))), response.headers["X-Content-Length"])
+            self.assertEqual("", response.headers["X-Transfer-Encoding"])
+        self.assertEqual(1, self.server.connections)
+
+    def test_mmap(self):
+        data = os.urandom(SIZE)
+        with tempfile.TemporaryFile() as file:
+            file.write(data)
+            file.flush()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as body:
+                self.assertEqual(_digest(data), self._post("/digest", body).body)
+
+    def test_regular_file(self):
+        data = os.urandom(SIZE)
+        with tempfile.TemporaryFile() as file:
+            file.write(data)
+            file.seek(0)
+            self.assertEqual(_digest(data), self._post("/digest", file).body)
+            self.assertEqual(SIZE, file.tell())
+            # from the current position
+            file.seek(10)
+            response = self._post("/echo", file)
+            self.assertEqual(str(SIZE - 10), response.headers["X-Content-Length"])
+            self.assertEqual(data[10:], response.body)
+        self.assertEqual(1, self.server.connections)
+
+    def test_unbuffered_file(self):
+        data = os.urandom(1000)
+        with tempfile.NamedTemporaryFile(delete=False) as file:
+            file.write(data)
+        try:
+            with open(file.name, "rb", buffering=0) as body:
+                self.assertEqual(data, self._post("/echo", body).body)
+        finally:
+            os.unlink(file.name)
+
+    def test_seekable_stream(self):
+        body = io.BytesIO(b"0123456789")
+        body.seek(3)
+        response = self._post("/echo", body)
+        self.assertEqual(b"3456789", response.body)
+        self.assertEqual("7", response.headers["X-Content-Length"])
+
+    def test_file_shorter_than_its_length(self):
+        body = ShrinkingFile(b"0123456789")
+        with self.assertRaises(BodyLengthError) as context:
+            self._post("/echo", body)
+        self.assertEqual((10, 5), (context.exception.length, context.exception.sent))
+        # the connection waiting for the missing bytes is closed
+        statistics = self.handler.pool.statistics()
+        self.assertEqual((0, 0), (statistics.in_use, statistics.idle))
+        self.assertEqual(b"body", self._post("/echo", b"body").body)
+        self.assertEqual(2, self.server.connections)
+
+    def test_unknown_length_is_chunked(self):
+        read, write = os.pipe()
+        os.write(write, b"piped body")
+        os.close(write)
+        with open(read, "rb") as body:
+            response = self._post("/echo", body)
+        self.assertEqual(b"piped body", response.body)
+        self.assertEqual("chunked", response.headers["X-Transfer-Encoding"])
+        self.assertEqual("", response.headers["X-Content-Length"])
+
+    def test_generator(self):
+        chunks = [os.urandom(size) for size in (1, 0, 100, 70000, 3)]
+        response = self._post("/digest", (chunk for chunk in chunks))
+        self.assertEqual(_digest(b"".join(chunks)), response.body)
+        response = self._post("/echo", iter([b"a", bytearray(b"b"), "c"]))
+        self.assertEqual(b"abc", response.body)
+        self.assertEqual("chunked", response.headers["X-Transfer-Encoding"])
+        self.assertEqual(1, self.server.connections)
+
+    def test_given_content_length(self):
+        response = self._post("/echo", iter([b"ab", b"cd"]), {"Content-Length": "4"})
+        self.assertEqual(b"abcd", response.body)
+        self.assertEqual("", response.headers["X-Transfer-Encoding"])
+
+    def test_illegal_chunk(self):
+        self.assertRaises(IllegalArgumentError, self._post, "/echo", iter([b"a", 1]))
+
+
+class HttpsBodyUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(ssl_context=server_ssl_context()).start()
+        self.handler = HttpRequestHandler(ssl_context=client_ssl_context())
+
+    def tearDown(self):
+        self.handler.close()
+        self.server.stop()
+
+    def test_regular_file(self):
+        data = os.urandom(SIZE)
+        with tempfile.TemporaryFile() as file:
+            file.write(data)
+            file.seek(0)
+            response = self.handler.request(uri(self.server.uri("/digest")), "PUT", None, file)
+        self.assertEqual(_digest(data), response.body)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(BodyLengthTest),
+                               loader.loadTestsFromTestCase(BodyUploadTest),
+                               loader.loadTestsFromTestCase(HttpsBodyUploadTest)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from urllib.parse import quote, unquote
+from web import uri
+from web.codec import encode_segment, encode_segments, decode, decode_segments, encode_query, encode_fragment, \
+    encode_user_info, encode_query_params, decode_query_params, encode_query_param, decode_query_param
+
+__author__ = 'Romain Gilles'
+
+SAMPLES = ["", "plain", "a b", "a/b?c#d", "100%", "café", "€/☃", "x=1&y=2", "user:pass@host", "~._-", "\x00\x7f"]
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_encode_segment(self):
+        self.assertEqual("a%20b%2Fc%3Fd%23e", encode_segment("a b/c?d#e"))
+        self.assertEqual("a:b@c!$&'()*+,;=", encode_segment("a:b@c!$&'()*+,;="))
+        self.assertEqual("caf%C3%A9", encode_segment("café"))
+        self.assertEqual("100%25", encode_segment("100%"))
+
+    def test_encode_other_components(self):
+        self.assertEqual("q=a%20b&path=/x?y", encode_query("q=a b&path=/x?y"))
+        self.assertEqual("top/x?y%23z", encode_fragment("top/x?y#z"))
+        self.assertEqual("user:p%40ss", encode_user_info("user:p@ss"))
+        self.assertEqual("a%26b%3Dc%2Bd", encode_query_param("a&b=c+d"))
+
+    def test_same_as_quote(self):
+        for sample in SAMPLES:
+            self.assertEqual(quote(sample, safe="!$&'()*+,;=:@"), encode_segment(sample))
+            self.assertEqual(quote(sample, safe="!$&'()*+,;=:@/?"), encode_query(sample))
+
+    def test_decode(self):
+        for sample in SAMPLES:
+            self.assertEqual(sample, decode(encode_segment(sample)))
+        for encoded in ("%", "%4", "%zz", "a%2", "%41%42", "%C3%A9%", "%e2%82%ac", "%FF"):
+            self.assertEqual(unquote(encoded), decode(encoded))
+
+    def test_bulk_segments(self):
+        self.assertEqual(("a%20b", "", "c"), encode_segments(["a b", "", "c"]))
+        self.assertEqual(("a%2Fb", "c%3F"), encode_segments(("a/b", "c?")))
+        self.assertEqual(("caf%C3%A9", "x"), encode_segments(("café", "x")))
+        self.assertEqual((), encode_segments(()))
+        self.assertEqual(("a b", "a/b", "x"), decode_segments(("a%20b", "a%2Fb", "x")))
+        self.assertEqual(tuple(SAMPLES), decode_segments(encode_segments(SAMPLES)))
+
+    def test_bulk_query(self):
+        query = encode_query_params([("q", "a b"), ("sort", "+name&x=1"), ("é", 2)])
+        self.assertEqual("q=a%20b&sort=%2Bname%26x%3D1&%C3%A9=2", query)
+        self.assertEqual([("q", "a b"), ("sort", "+name&x=1"), ("é", "2")], decode_query_params(query))
+        self.assertEqual("a=1;b=2", encode_query_params({"a": 1, "b": 2}, ";"))
+        self.assertEqual([("a", "b c"), ("flag", "")], decode_query_params("a=b+c&&flag"))
+        self.assertEqual("a b", decode_query_param("a+b"))
+
+
+class EncodeOptionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = uri("http://www.example.com/files")
+
+    def test_append_segments(self):
+        self.assertEqual("http://www.example.com/files/a%20b/c%2Fd",
+                         str(self.base.append_segments(("a b", "c/d"), encode=True)))
+        self.assertEqual("http://www.example.com/files/a%20b/c", str(self.base.append_segments("a b/c", encode=True)))
+        self.assertEqual("http://www.example.com/files/r%C3%A9sum%C3%A9%3F",
+                         str(self.base.append_segment("résumé?", encode=True)))
+        self.assertRaises(AssertionError, self.base.append_segments, ("a/b",))
+        self.assertRaises(AssertionError, self.base.append_segments, (None,), encode=True)
+
+    def test_append_query(self):
+        self.assertEqual("http://www.example.com/files?q=a%20b&sort=%2Bname",
+                         str(self.base.append_query((("q", "a b"), ("sort", "+name")), encode=True)))
+        self.assertEqual("http://www.example.com/files?q=a%20b%23c",
+                         str(self.base.append_query("q=a b#c", encode=True)))
+        self.assertRaises(AssertionError, self.base.append_query, "q=a b#c")
+
+    def test_builder(self):
+        built = self.base.builder().append_segments(("a b",), encode=True).append_segment("c d", encode=True)\
+            .append_query((("q", "é"),), encode=True).build()
+        self.assertEqual("http://www.example.com/files/a%20b/c%20d?q=%C3%A9", str(built))
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(CodecTest), loader.loadTestsFromTestCase(EncodeOptionTest)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import gzip
+from io import BytesIO
+import unittest
+import zlib
+from web import uri
+from web.asynclib import AsyncHttpRequestHandler
+from web.decoding import ContentDecoder, DecompressionLimitError, content_decoder
+from web.pool import ConnectionPool
+from web.urilib import HttpRequestHandler
+from webtest.httpserver import LocalServer, json_lines
+
+__author__ = 'Romain Gilles'
+
+SIZE = 500000
+
+
+class EncodedStream(object):
+    """
+    Body stream returning the encoded bytes by small chunks.
+    """
+
+    def __init__(self, data, chunk_size=100):
+        self.data = BytesIO(data)
+        self.chunk_size = chunk_size
+        self.will_close = False
+        self.closed = False
+
+    def read1(self, size):
+        return self.data.read(min(size, self.chunk_size))
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+    def isclosed(self):
+        return self.data.tell() == len(self.data.getvalue())
+
+    def close(self):
+        self.closed = True
+
+
+def _deflate(data, wbits):
+    compressor = zlib.compressobj(wbits=wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ContentDecoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = json_lines(SIZE)
+
+    def test_codings(self):
+        for coding, encoded in (("gzip", gzip.compress(self.data)), ("x-gzip", gzip.compress(self.data)),
+                                ("deflate", _deflate(self.data, zlib.MAX_WBITS)),
+                                ("deflate", _deflate(self.data, -zlib.MAX_WBITS))):
+            decoder = ContentDecoder(EncodedStream(encoded), coding)
+            self.assertFalse(decoder.isclosed())
+            self.assertEqual(self.data, decoder.read())
+            self.assertTrue(decoder.isclosed())
+            self.assertEqual((len(encoded), SIZE), (decoder.compressed_size, decoder.decompressed_size))
+
+    def test_incremental(self):
+        decoder = ContentDecoder(EncodedStream(gzip.compress(self.data)), "gzip")
+        chunks = list(iter(lambda: decoder.read(1000), b""))
+        self.assertTrue(all(0 < len(chunk) <= 1000 for chunk in chunks))
+        self.assertEqual(self.data, b"".join(chunks))
+        decoder = ContentDecoder(EncodedStream(gzip.compress(self.data)), "gzip")
+        buffer = bytearray(4096)
+        count = decoder.readinto(buffer)
+        self.assertGreater(count, 0)
+        self.assertEqual(self.data[:count], buffer[:count])
+        # one encoded chunk of 100 bytes read at most
+        self.assertLessEqual(decoder.compressed_size, 200)
+
+    def test_gzip_members(self):
+        decoder = ContentDecoder(EncodedStream(gzip.compress(b"first ") + gzip.compress(b"second")), "gzip")
+        self.assertEqual(b"first second", decoder.read())
+
+    def test_limit(self):
+        decoder = ContentDecoder(EncodedStream(gzip.compress(self.data)), "gzip", max_size=SIZE)
+        self.assertEqual(self.data, decoder.read())
+        decoder = ContentDecoder(EncodedStream(gzip.compress(bytes(10 * SIZE))), "gzip", max_size=SIZE)
+        with self.assertRaises(DecompressionLimitError) as context:
+            decoder.read()
+        self.assertLessEqual(decoder.decompressed_size, SIZE + 1)
+        self.assertEqual("the decompressed body exceeds {0} bytes".format(SIZE), context.exception.message)
+
+    def test_content_decoder(self):
+        stream = EncodedStream(b"")
+        self.assertIsInstance(content_decoder(stream, {"Content-Encoding": "GZIP"}), ContentDecoder)
+        self.assertIsInstance(content_decoder(stream, {"Content-Encoding": "identity, deflate"}), ContentDecoder)
+        for headers in ({}, {"Content-Encoding": "br"}, {"Content-Encoding": "gzip, gzip"}):
+            self.assertIsNone(content_decoder(stream, headers))
+
+    def test_corrupted(self):
+        decoder = ContentDecoder(EncodedStream(b"not gzip data"), "gzip")
+        self.assertRaises(zlib.error, decoder.read)
+
+
+class DecompressingRequestHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.handler = HttpRequestHandler(ConnectionPool(max_size=1), decompress=True)
+        self.data = json_lines(SIZE)
+
+    def tearDown(self):
+        self.handler.close()
+        self.server.stop()
+
+    def _request(self, path, headers=None, stream=False, handler=None):
+        return (handler or self.handler).request(uri(self.server.uri(path)), "GET", headers, None, stream)
+
+    def test_buffered(self):
+        for coding in ("gzip", "deflate", "raw-deflate"):
+            for chunked in ("", "&chunked=1"):
+                response = self._request("/compressed?coding={0}&size={1}{2}".format(coding, SIZE, chunked))
+                self.assertEqual(self.data, response.body)
+                self.assertEqual("gzip, deflate", response.headers["X-Accept-Encoding"])
+                self.assertEqual(SIZE, response.decompressed_size)
+                self.assertLess(response.compressed_size * 8, SIZE)
+        self.assertEqual(1, self.server.connections)
+
+    def test_streamed(self):
+        with self._request("/compressed?size={0}&chunked=1".format(SIZE), stream=True) as response:
+            chunks = list(response.iter_bytes(8192))
+            self.assertEqual(self.data, b"".join(chunks))
+            self.assertTrue(all(len(chunk) <= 8192 for chunk in chunks))
+            self.assertEqual(SIZE, response.decompressed_size)
+            self.assertLess(response.compressed_size * 8, SIZE)
+        self.assertEqual(1, self.handler.pool.statistics().idle)
+        with self._request("/compressed?size={0}".format(SIZE), stream=True) as response:
+            self.assertEqual(self.data.splitlines(), list(response.iter_lines()))
+        self._request("/hello/a")
+        self.assertEqual(1, self.server.connections)
+
+    def test_limit(self):
+        handler = HttpRequestHandler(self.handler.pool, decompress=True, max_decompressed_size=SIZE // 2)
+        self.assertRaises(DecompressionLimitError, self._request, "/compressed?size={0}".format(SIZE), None, False,
+                          handler)
+        # the connection is dropped
+        self.assertEqual(0, self.handler.pool.statistics().idle)
+        self.assertEqual(self.data[:SIZE // 2], self._request("/compressed?size={0}".format(SIZE // 2),
+                                                              None, False, handler).body)
+
+    def test_opt_in(self):
+        handler = HttpRequestHandler(self.handler.pool)
+        response = self._request("/compressed?size=1000", handler=handler)
+        self.assertEqual(json_lines(1000), gzip.decompress(response.body))
+        self.assertEqual("identity", response.headers["X-Accept-Encoding"])
+        self.assertEqual((len(response.body), len(response.body)),
+                         (response.compressed_size, response.decompressed_size))
+        response = self._request("/compressed?size=1000", {"accept-encoding": "gzip"})
+        self.assertEqual(("gzip", json_lines(1000)), (response.headers["X-Accept-Encoding"], response.body))
+
+    def test_not_encoded(self):
+        response = self._request("/hello/a")
+        self.assertEqual((b"Hello a!", 8, 8), (response.body, response.compressed_size, response.decompressed_size))
+        with self._request("/bytes?size=1000", stream=True) as response:
+            response.read(10)
+            self.assertEqual((10, 10), (response.compressed_size, response.decompressed_size))
+
+
+class AsyncDecompressingRequestHandlerTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.handler = AsyncHttpRequestHandler(decompress=True)
+        self.data = json_lines(SIZE)
+
+    async def asyncTearDown(self):
+        self.handler.close()
+
+    def tearDown(self):
+        self.server.stop()
+
+    async def test_buffered_and_streamed(self):
+        response = await self.handler.request(self.server.uri("/compressed?coding=deflate&size={0}".format(SIZE)))
+        self.assertEqual(self.data, response.body)
+        self.assertLess(response.compressed_size * 8, response.decompressed_size)
+        async with await self.handler.request(self.server.uri("/compressed?size={0}&chunked=1".format(SIZE)),
+                                              stream=True) as response:
+            self.assertEqual(self.data, b"".join([chunk async for chunk in response.aiter_bytes(8192)]))
+            self.assertEqual(SIZE, response.decompressed_size)
+        self.assertEqual((1, 1), (self.server.connections, self.handler.pool.statistics().idle))
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(ContentDecoderTest),
+                               loader.loadTestsFromTestCase(DecompressingRequestHandlerTest),
+                               loader.loadTestsFromTestCase(AsyncDecompressingRequestHandlerTest)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+from threading import Lock, Thread
+from time import monotonic, sleep
+import unittest
+from web.asynclib import AsyncHttpRequestHandler
+from web.assertion import IllegalArgumentError
+from web.hedging import HedgingRequestHandler, AsyncHedgingRequestHandler, HedgeStatistics, LatencyWindow
+from web.pool import ConnectionPool
+from web.urilib import HttpRequestHandler
+from webtest.httpserver import LocalServer, LocalRequestHandler
+
+__author__ = 'Romain Gilles'
+
+SLOW = 0.5
+
+
+class SlowFirstHandler(LocalRequestHandler):
+    """
+    Answers the first requests, as many as slow, after SLOW seconds and the other ones at once.
+    """
+    slow = 0
+    lock = Lock()
+
+    def _slow_first(self):
+        with SlowFirstHandler.lock:
+            slow = SlowFirstHandler.slow > 0
+            SlowFirstHandler.slow -= 1
+        if slow:
+            sleep(SLOW)
+        self._handle()
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_OPTIONS = _slow_first
+
+
+class LatencyWindowTest(unittest.TestCase):
+
+    def test_percentile(self):
+        window = LatencyWindow()
+        self.assertIsNone(window.percentile(50))
+        for latency in range(100, 0, -1):
+            window.record(latency)
+        self.assertEqual(50, window.percentile(50))
+        self.assertEqual(95, window.percentile(95))
+        self.assertEqual(100, window.percentile(100))
+        self.assertEqual(1, window.percentile(0.1))
+
+    def test_oldest_latencies_are_dropped(self):
+        window = LatencyWindow(3)
+        for latency in (9, 8, 1, 2, 3):
+            window.record(latency)
+        self.assertEqual(3, len(window))
+        self.assertEqual(3, window.percentile(100))
+
+    def test_invalid_arguments(self):
+        self.assertRaises(IllegalArgumentError, LatencyWindow, 0)
+        self.assertRaises(IllegalArgumentError, HedgingRequestHandler, delay=-1)
+        self.assertRaises(IllegalArgumentError, HedgingRequestHandler, percentile=101)
+        self.assertRaises(IllegalArgumentError, HedgingRequestHandler, budget=2)
+        self.assertRaises(IllegalArgumentError, HedgingRequestHandler, object())
+
+
+class HedgingRequestHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(SlowFirstHandler).start()
+        self.inner = HttpRequestHandler(ConnectionPool(max_size=4))
+        self.handler = HedgingRequestHandler(self.inner, delay=0.05, budget=1)
+
+    def tearDown(self):
+        SlowFirstHandler.slow = 0
+        self.handler.close()
+        self.server.stop()
+
+    def test_hedge_wins(self):
+        SlowFirstHandler.slow = 1
+        start = monotonic()
+        response = self.handler.request(self.server.uri("/hello/a"))
+        self.assertLess(monotonic() - start, SLOW / 2)
+        self.assertEqual(b"Hello a!", response.body)
+        self.assertEqual(HedgeStatistics(1, 1, 1, 0), self.handler.statistics())
+        self.assertEqual(2, self.server.connections)
+
+    def test_fast_request_is_not_hedged(self):
+        self.assertEqual(b"Hello a!", self.handler.request(self.server.uri("/hello/a")).body)
+        self.assertEqual(HedgeStatistics(1, 0, 0, 0), self.handler.statistics())
+        self.assertEqual(1, self.server.requests)
+
+    def test_unsafe_request_is_not_hedged(self):
+        SlowFirstHandler.slow = 1
+        response = self.handler.request(self.server.uri("/echo"), "POST", None, b"body")
+        self.assertEqual(b"body", response.body)
+        self.assertEqual(HedgeStatistics(0, 0, 0, 0), self.handler.statistics())
+        self.assertEqual(1, self.server.requests)
+
+    def test_budget(self):
+        handler = HedgingRequestHandler(self.inner, delay=0.01, budget=0.5)
+        for _ in range(4):
+            self.assertEqual(200, handler.request(self.server.uri("/slow?delay=0.1")).status_code)
+        self.assertEqual(HedgeStatistics(4, 2, 0, 2), handler.statistics())
+
+    def test_percentile_delay(self):
+        handler = HedgingRequestHandler(self.inner, delay=10, percentile=50, budget=1, min_samples=3)
+        for _ in range(3):
+            handler.request(self.server.uri("/hello/a"))
+        SlowFirstHandler.slow = 1
+        start = monotonic()
+        handler.request(self.server.uri("/hello/b"))
+        self.assertLess(monotonic() - start, SLOW / 2)
+        self.assertEqual(HedgeStatistics(4, 1, 1, 0), handler.statistics())
+
+    def test_latency_of_the_request_is_recorded(self):
+        handler = HedgingRequestHandler(self.inner, delay=0.05, percentile=100, budget=1, min_samples=1)
+        SlowFirstHandler.slow = 1
+        handler.request(self.server.uri("/hello/a"))
+        # the losing attempt completes without recording its latency
+        sleep(SLOW * 1.5)
+        SlowFirstHandler.slow = 1
+        start = monotonic()
+        handler.request(self.server.uri("/hello/b"))
+        self.assertLess(monotonic() - start, SLOW / 2)
+        self.assertEqual(HedgeStatistics(2, 2, 2, 0), handler.statistics())
+
+    def test_unsafe_requests_do_not_change_the_delay(self):
+        handler = HedgingRequestHandler(self.inner, delay=0.05, percentile=100, budget=1, min_samples=1)
+        handler.request(self.server.uri("/hello/a"))
+        for _ in range(2):
+            handler.request(self.server.uri("/slow?delay={0}".format(SLOW)), "POST", None, b"body")
+        SlowFirstHandler.slow = 1
+        start = monotonic()
+        handler.request(self.server.uri("/hello/b"))
+        self.assertLess(monotonic() - start, SLOW / 2)
+        self.assertEqual(HedgeStatistics(2, 1, 1, 0), handler.statistics())
+
+    def test_delay_starts_when_the_request_is_sent(self):
+        handler = HedgingRequestHandler(self.inner, delay=SLOW / 2, budget=1, max_workers=1)
+        slow = Thread(target=handler.request, args=(self.server.uri("/slow?delay={0}".format(SLOW)),))
+        slow.start()
+        sleep(0.05)
+        # queued until the slow request is answered, then answered at once
+        self.assertEqual(b"Hello a!", handler.request(self.server.uri("/hello/a")).body)
+        slow.join()
+        self.assertEqual(HedgeStatistics(2, 1, 0, 0), handler.statistics())
+
+    def test_losing_stream_is_closed(self):
+        SlowFirstHandler.slow = 1
+        with self.handler.request(self.server.uri("/bytes?size=10"), stream=True) as response:
+            sleep(SLOW * 1.5)
+            # the losing response was closed once received
+            self.assertEqual(1, self.inner.pool.statistics().in_use)
+            self.assertEqual(10, len(response.read()))
+        self.assertEqual(0, self.inner.pool.statistics().in_use)
+
+
+class AsyncHedgingRequestHandlerTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = LocalServer(SlowFirstHandler).start()
+        self.inner = AsyncHttpRequestHandler()
+        self.handler = AsyncHedgingRequestHandler(self.inner, delay=0.05, budget=1)
+
+    async def asyncTearDown(self):
+        self.handler.close()
+
+    def tearDown(self):
+        SlowFirstHandler.slow = 0
+        self.server.stop()
+
+    async def test_hedge_wins(self):
+        SlowFirstHandler.slow = 1
+        start = monotonic()
+        response = await self.handler.request(self.server.uri("/hello/a"))
+        self.assertLess(monotonic() - start, SLOW / 2)
+        self.assertEqual(b"Hello a!", response.body)
+        self.assertEqual(HedgeStatistics(1, 1, 1, 0), self.handler.statistics())
+        # the losing attempt is cancelled and its connection closed
+        await asyncio.sleep(0)
+        self.assertEqual(0, self.inner.pool.statistics().in_use)
+
+    async def test_latency_of_the_request_is_recorded(self):
+        handler = AsyncHedgingRequestHandler(self.inner, delay=0.05, percentile=100, budget=1, min_samples=1)
+        SlowFirstHandler.slow = 1
+        await handler.request(self.server.uri("/hello/a"))
+        await asyncio.sleep(SLOW * 1.5)
+        SlowFirstHandler.slow = 1
+        start = monotonic()
+        await handler.request(self.server.uri("/hello/b"))
+        self.assertLess(monotonic() - start, SLOW / 2)
+        self.assertEqual(HedgeStatistics(2, 2, 2, 0), handler.statistics())
+
+    async def test_fast_request_is_not_hedged(self):
+        self.assertEqual(b"Hello a!", (await self.handler.request(self.server.uri("/hello/a"))).body)
+        self.assertEqual(HedgeStatistics(1, 0, 0, 0), self.handler.statistics())
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(LatencyWindowTest),
+                               loader.loadTestsFromTestCase(HedgingRequestHandlerTest),
+                               loader.loadTestsFromTestCase(AsyncHedgingRequestHandlerTest)))
+
+if __name__ == '__main__':
+    unittest.main()
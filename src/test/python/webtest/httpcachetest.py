@@ -0,0 +1,289 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from email.utils import formatdate
+from http.client import HTTPMessage
+import os
+import pickle
+import tempfile
+import unittest
+from web import uri, request, set_request_handler
+from web.assertion import IllegalArgumentError
+from web.httpcache import CachingRequestHandler, DiskStore
+from web.urilib import AbstractRequestHandler, HttpRequestHandler, Response, DEFAULT_REQUEST_HANDLER
+from webtest.httpserver import LocalServer
+
+__author__ = 'Romain Gilles'
+
+NOW = 1700000000.0
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self):
+        return self.now
+
+
+def _headers(**headers):
+    message = HTTPMessage()
+    for name, value in headers.items():
+        message[name.replace("_", "-")] = value
+    return message
+
+
+class ScriptedRequestHandler(AbstractRequestHandler):
+    """
+    Answers the requests with the (status, headers) pairs of a script, the body
+    being the number of the request, and records the requests.
+    """
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.requests = []
+
+    def request(self, uri, method="GET", headers=None, body=None, stream=False):
+        self.requests.append((str(uri), method, dict(headers or {})))
+        status, headers = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        return Response(headers, "response {0}".format(len(self.requests)).encode("ascii"), status,
+                        "OK" if status == 200 else "", 11)
+
+
+class CachingRequestHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def _handler(self, *script, **options):
+        self.inner = ScriptedRequestHandler(*script)
+        return CachingRequestHandler(self.inner, clock=self.clock, **options)
+
+    def test_max_age(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60")))
+        self.assertEqual(b"response 1", handler.request("http://host/a").body)
+        self.clock.now += 30
+        response = handler.request("http://host/a")
+        self.assertEqual((b"response 1", "30"), (response.body, response.headers["Age"]))
+        self.clock.now += 31
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+        self.assertEqual((1, 2, 0, 0, 2, 0, 1), handler.statistics())
+
+    def test_age_of_the_received_response(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60", Age="50")))
+        handler.request("http://host/a")
+        self.clock.now += 11
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+
+    def test_expires(self):
+        handler = self._handler((200, _headers(Date=formatdate(NOW, usegmt=True),
+                                               Expires=formatdate(NOW + 100, usegmt=True))))
+        handler.request("http://host/a")
+        self.clock.now += 99
+        self.assertEqual(b"response 1", handler.request("http://host/a").body)
+        self.clock.now += 2
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+        handler = self._handler((200, _headers(Expires="0")))
+        handler.request("http://host/a")
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+
+    def test_heuristic_freshness(self):
+        handler = self._handler((200, _headers(Date=formatdate(NOW, usegmt=True),
+                                               Last_Modified=formatdate(NOW - 1000, usegmt=True))))
+        handler.request("http://host/a")
+        self.clock.now += 99
+        self.assertEqual(b"response 1", handler.request("http://host/a").body)
+        self.clock.now += 2
+        # revalidated with the Last-Modified date
+        handler.request("http://host/a")
+        self.assertEqual(formatdate(NOW - 1000, usegmt=True), self.inner.requests[1][2]["If-Modified-Since"])
+
+    def test_etag_revalidation(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=10", ETag='"v1"')),
+                                (304, _headers(Cache_Control="max-age=20", ETag='"v1"')))
+        handler.request("http://host/a")
+        self.clock.now += 11
+        response = handler.request("http://host/a", "GET", {"Accept": "text/plain"})
+        self.assertEqual((200, b"response 1"), (response.status_code, response.body))
+        self.assertEqual("max-age=20", response.headers["Cache-Control"])
+        self.assertEqual({"Accept": "text/plain", "If-None-Match": '"v1"'}, self.inner.requests[1][2])
+        # fresh again for the max-age of the 304 response
+        self.clock.now += 19
+        self.assertEqual(b"response 1", handler.request("http://host/a").body)
+        statistics = handler.statistics()
+        self.assertEqual((1, 1, 1, 1), (statistics.hits, statistics.misses, statistics.revalidations,
+                                        statistics.not_modified))
+
+    def test_changed_on_revalidation(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=10", ETag='"v1"')),
+                                (200, _headers(Cache_Control="max-age=10", ETag='"v2"')))
+        handler.request("http://host/a")
+        self.clock.now += 11
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+        self.assertEqual(2, len(self.inner.requests))
+
+    def test_no_store_and_no_cache(self):
+        handler = self._handler((200, _headers(Cache_Control="no-store, max-age=60")))
+        handler.request("http://host/a")
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+        handler = self._handler((200, _headers(Cache_Control="no-cache", ETag='"v1"')), (304, _headers()))
+        handler.request("http://host/a")
+        self.assertEqual(b"response 1", handler.request("http://host/a").body)
+        self.assertEqual('"v1"', self.inner.requests[1][2]["If-None-Match"])
+
+    def test_request_directives(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60", ETag='"v1"')), (304, _headers()))
+        handler.request("http://host/a")
+        handler.request("http://host/a", "GET", {"Cache-Control": "no-cache"})
+        handler.request("http://host/a", "GET", {"Pragma": "no-cache"})
+        self.assertEqual(3, len(self.inner.requests))
+        self.clock.now += 30
+        handler.request("http://host/a", "GET", {"Cache-Control": "max-age=10"})
+        self.assertEqual(4, len(self.inner.requests))
+        # revalidated 30 seconds ago
+        self.clock.now += 30
+        handler.request("http://host/a", "GET", {"Cache-Control": "min-fresh=20"})
+        self.assertEqual(4, len(self.inner.requests))
+        handler.request("http://host/a", "GET", {"Cache-Control": "min-fresh=50"})
+        self.assertEqual(5, len(self.inner.requests))
+        handler.request("http://host/a", "GET", {"Cache-Control": "no-store"})
+        self.assertNotIn("If-None-Match", self.inner.requests[5][2])
+
+    def test_max_stale_and_only_if_cached(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=10")))
+        self.assertEqual(504, handler.request("http://host/a", "GET", {"Cache-Control": "only-if-cached"})
+                         .status_code)
+        handler.request("http://host/a")
+        self.clock.now += 15
+        self.assertEqual(b"response 1", handler.request("http://host/a", "GET",
+                                                        {"Cache-Control": "max-stale=10"}).body)
+        self.assertEqual(b"response 1", handler.request("http://host/a", "GET", {"Cache-Control": "max-stale"}).body)
+        self.assertEqual(504, handler.request("http://host/a", "GET", {"Cache-Control": "only-if-cached"})
+                         .status_code)
+        self.assertEqual(1, len(self.inner.requests))
+
+    def test_vary(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60", Vary="Accept-Language")))
+        english = handler.request("http://host/a", "GET", {"Accept-Language": "en"})
+        french = handler.request("http://host/a", "GET", {"accept-language": "fr"})
+        self.assertEqual((b"response 1", b"response 2"), (english.body, french.body))
+        self.assertEqual(b"response 1", handler.request("http://host/a", "GET", {"Accept-Language": "en"}).body)
+        self.assertEqual(b"response 2", handler.request("http://host/a", "GET", {"Accept-Language": "fr"}).body)
+        self.assertEqual(b"response 3", handler.request("http://host/a").body)
+        handler = self._handler((200, _headers(Cache_Control="max-age=60", Vary="*")))
+        handler.request("http://host/a")
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+
+    def test_normalized_key(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60")))
+        handler.request("http://host/b")
+        for equivalent in ("HTTP://HOST:80/a/../b", "http://host/%62#fragment", uri("http://host/./b")):
+            self.assertEqual(b"response 1", handler.request(equivalent).body)
+        self.assertEqual(b"response 2", handler.request("http://host/b?q").body)
+
+    def test_unsafe_methods_invalidate(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60")))
+        handler.request("http://host/a")
+        handler.request("http://host/a", "HEAD")
+        self.assertEqual(b"response 1", handler.request("http://host/a").body)
+        handler.request("http://host/a", "POST", None, b"body")
+        self.assertEqual(b"response 4", handler.request("http://host/a").body)
+
+    def test_conditional_requests_are_not_cached(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60")))
+        handler.request("http://host/a", "GET", {"If-None-Match": '"v1"'})
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+
+    def test_lru(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60")), max_entries=2)
+        for path in ("a", "b", "a", "c", "a", "b"):
+            handler.request("http://host/" + path)
+        self.assertEqual(["a", "b", "c", "b"], [path.rsplit("/", 1)[1] for path, _, _ in self.inner.requests])
+        self.assertEqual((2, 2), handler.statistics()[5:])
+
+    def test_max_entry_size(self):
+        handler = self._handler((200, _headers(Cache_Control="max-age=60")), max_entry_size=5)
+        handler.request("http://host/a")
+        self.assertEqual(b"response 2", handler.request("http://host/a").body)
+
+    def test_disk_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = self._handler((200, _headers(Cache_Control="max-age=60", ETag='"v1"')),
+                                    store=DiskStore(directory))
+            handler.request("http://host/a")
+            # another process sharing the directory
+            other = self._handler((200, _headers()), store=DiskStore(directory))
+            self.clock.now += 30
+            response = other.request("http://host/a")
+            self.assertEqual((b"response 1", "30"), (response.body, response.headers["Age"]))
+            self.assertEqual(0, len(self.inner.requests))
+            other.invalidate("http://host/a")
+            self.assertIsNone(DiskStore(directory).get("http://host/a"))
+
+    def test_disk_store_holds_no_code(self):
+        with tempfile.TemporaryDirectory() as parent:
+            directory = os.path.join(parent, "cache")
+            store = DiskStore(directory)
+            self.assertEqual(0o700, os.stat(directory).st_mode & 0o777)
+            handler = self._handler((200, _headers(Cache_Control="max-age=60", Vary="Accept-Language")),
+                                    store=store)
+            handler.request("http://host/a", headers={"Accept-Language": "fr"})
+            other = self._handler((200, _headers()), store=store)
+            self.assertEqual(b"response 1", other.request("http://host/a", headers={"Accept-Language": "fr"}).body)
+            self.assertEqual(0, len(self.inner.requests))
+            name, = os.listdir(directory)
+            with open(os.path.join(directory, name), "wb") as file:
+                pickle.dump(("http://host/a", []), file)
+            self.assertIsNone(store.get("http://host/a"))
+            self.assertEqual([], os.listdir(directory))
+
+    def test_illegal_arguments(self):
+        self.assertRaises(IllegalArgumentError, CachingRequestHandler, object())
+        self.assertRaises(IllegalArgumentError, CachingRequestHandler, None, 0)
+
+
+class CachingHttpRequestHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.handler = CachingRequestHandler(HttpRequestHandler())
+        set_request_handler(self.handler)
+
+    def tearDown(self):
+        set_request_handler(DEFAULT_REQUEST_HANDLER)
+        self.handler.close()
+        self.server.stop()
+
+    def test_revalidation(self):
+        fresh = self.server.uri("/cached?cache_control=max-age%3D60&etag=v1")
+        self.assertEqual(b"cached", request(fresh).body)
+        self.assertEqual(b"cached", request(fresh).body)
+        self.assertEqual(1, self.server.requests)
+        stale = self.server.uri("/cached?cache_control=max-age%3D0&etag=v1")
+        request(stale)
+        response = request(stale)
+        self.assertEqual((200, b"cached"), (response.status_code, response.body))
+        self.assertEqual(["/cached", "/cached", "/cached"], [path.partition("?")[0] for path in self.server.paths])
+        self.assertEqual(1, self.handler.statistics().not_modified)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(CachingRequestHandlerTest),
+                               loader.loadTestsFromTestCase(CachingHttpRequestHandlerTest)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Local HTTP server running in a thread for the request handler tests.
+"""
+from functools import lru_cache
+import gzip
+from hashlib import sha256
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import os
+import ssl
+import sys
+from threading import Thread, Lock
+from time import sleep
+from urllib.parse import urlsplit, parse_qs
+import zlib
+
+__author__ = 'Romain Gilles'
+
+HOST = "127.0.0.1"
+
+# self-signed certificate and key of localhost and 127.0.0.1
+CERTIFICATE_FILE = os.path.join(os.path.dirname(__file__), "localhost.pem")
+
+
+def json_lines(size):
+    """
+    Returns size bytes of JSON lines, highly compressible.
+    """
+    lines = b"".join(b'{"id": %d, "name": "item %d", "tags": ["reference", "data"]}\n' % (index, index % 7)
+                     for index in range(size // 40 + 1))
+    return lines[:size]
+
+
+@lru_cache(maxsize=16)
+def _bytes(size):
+    return bytes(range(256)) * (size // 256) + bytes(range(size % 256))
+
+
+@lru_cache(maxsize=16)
+def _encoded(coding, size):
+    body = json_lines(size)
+    if coding == "gzip":
+        return gzip.compress(body)
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS if coding == "deflate" else -zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+def server_ssl_context():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(CERTIFICATE_FILE)
+    return context
+
+
+def client_ssl_context():
+    """
+    Returns a client context trusting the self-signed certificate of the local server.
+    """
+    return ssl.create_default_context(cafile=CERTIFICATE_FILE)
+
+
+class LocalRequestHandler(BaseHTTPRequestHandler):
+    """
+    /hello/<name>  returns Hello <name>!
+    /slow?delay=s  answers after the given delay
+    /close         answers with Connection: close
+    /echo          returns the request body, the method, the target and the length headers
+    /digest        returns the size and the SHA-256 of the request body, read by chunks
+    /compressed?coding=c&size=n&chunked=1
+                   returns n bytes of JSON lines encoded by the gzip, deflate or raw-deflate coding
+                   with the received Accept-Encoding in X-Accept-Encoding, chunked if asked
+    /cached?cache_control=c&etag=e
+                   returns the given Cache-Control and ETag, 304 if the If-None-Match matches
+    /bytes?size=n  returns n bytes, the byte i being i % 256
+    /lines?count=n returns n CRLF terminated lines with the chunked transfer coding
+    """
+    protocol_version = "HTTP/1.1"
+    # the headers and the body are written separately
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connected()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=(), content_type="text/plain; charset=UTF-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_chunked(self, chunks, headers=()):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=UTF-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _read_chunks(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if not size:
+                    # no trailer
+                    self.rfile.readline()
+                    return
+                yield self.rfile.read(size)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        while length:
+            chunk = self.rfile.read(min(length, 1 << 16))
+            length -= len(chunk)
+            yield chunk
+
+    def _read_body(self):
+        return b"".join(self._read_chunks())
+
+    def _handle(self):
+        self.server.requested(self)
+        target = urlsplit(self.path)
+        query = parse_qs(target.query)
+        if target.path == "/digest":
+            digest = sha256()
+            size = 0
+            for chunk in self._read_chunks():
+                digest.update(chunk)
+                size += len(chunk)
+            self._send(200, "{0} {1}".format(size, digest.hexdigest()).encode("ascii"))
+            return
+        body = self._read_body()
+        if target.path.startswith("/hello/"):
+            self._send(200, "Hello {0}!".format(target.path[len("/hello/"):]).encode("utf-8"))
+        elif target.path == "/slow":
+            sleep(float(query.get("delay", ["0.1"])[0]))
+            self._send(200, b"slow")
+        elif target.path == "/close":
+            self.close_connection = True
+            self._send(200, b"closed", (("Connection", "close"),))
+        elif target.path == "/bytes":
+            size = int(query.get("size", ["0"])[0])
+            self._send(200, _bytes(size), (), "application/octet-stream")
+        elif target.path == "/lines":
+            self._send_chunked(["line {0}\r\n".format(index).encode("ascii")
+                                for index in range(int(query.get("count", ["0"])[0]))])
+        elif target.path == "/compressed":
+            coding = query.get("coding", ["gzip"])[0]
+            body = _encoded(coding, int(query.get("size", ["1000"])[0]))
+            headers = (("Content-Encoding", "deflate" if coding == "raw-deflate" else coding),
+                       ("X-Accept-Encoding", self.headers.get("Accept-Encoding", "")))
+            if "chunked" in query:
+                self._send_chunked([body[start:start + 1000] for start in range(0, len(body), 1000)], headers)
+            else:
+                self._send(200, body, headers, "application/json")
+        elif target.path == "/cached":
+            etag = '"{0}"'.format(query.get("etag", [""])[0])
+            headers = (("Cache-Control", query.get("cache_control", ["no-cache"])[0]), ("ETag", etag))
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+            else:
+                self._send(200, b"cached", headers)
+        elif target.path == "/echo":
+            self._send(200, body, (("X-Method", self.command), ("X-Path", self.path),
+                                   ("X-Content-Length", self.headers.get("Content-Length", "")),
+                                   ("X-Transfer-Encoding", self.headers.get("Transfer-Encoding", ""))))
+        else:
+            self._send(404, b"not found")
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_OPTIONS = _handle
+
+
+class LocalServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server listening on a free port of the loopback interface, counting the
+    accepted connections and the requests. It serves HTTPS if an SSL context is given.
+
+    with LocalServer() as server:
+        request(server.uri("/hello/world"))
+    """
+    daemon_threads = True
+    # the concurrent clients open their connections at once
+    request_queue_size = 128
+
+    def __init__(self, handler_class=LocalRequestHandler, ssl_context=None):
+        super().__init__((HOST, 0), handler_class)
+        self.scheme = "http"
+        if ssl_context is not None:
+            self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+            self.scheme = "https"
+        self.__lock = Lock()
+        self.connections = 0
+        self.requests = 0
+        self.paths = []
+        self.__thread = None
+
+    def connected(self):
+        with self.__lock:
+            self.connections += 1
+
+    def handle_error(self, request, client_address):
+        # a client closing a connection before the end of a response is expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def requested(self, handler):
+        with self.__lock:
+            self.requests += 1
+            self.paths.append(handler.path)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def uri(self, path="/"):
+        return "{0}://{1}:{2}{3}".format(self.scheme, HOST, self.port, path)
+
+    def start(self):
+        self.__thread = Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.__thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
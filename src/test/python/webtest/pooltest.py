@@ -0,0 +1,274 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import ssl
+import unittest
+from socket import socketpair, _GLOBAL_DEFAULT_TIMEOUT
+from threading import Thread
+from time import sleep
+from web import uri
+from web.pool import ConnectionPool, ConnectionFactory, PoolExhaustedError
+from web.urilib import HttpRequestHandler
+from web.assertion import IllegalArgumentError
+from webtest.httpserver import LocalServer, LocalRequestHandler, server_ssl_context, client_ssl_context
+
+__author__ = 'Romain Gilles'
+
+
+class FakeConnection(object):
+    """
+    Connection to a peer socket of the same process.
+    """
+
+    def __init__(self, scheme, host, port, timeout):
+        self.key = scheme, host, port
+        self.sock, self.peer = socketpair()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+        self.sock = None
+        self.peer.close()
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pool = ConnectionPool(max_size=2, idle_timeout=10, factory=FakeConnection, clock=self.clock)
+
+    def tearDown(self):
+        self.pool.clear()
+
+    def test_lifo_reuse(self):
+        first = self.pool.acquire("http", "host", 80)
+        second = self.pool.acquire("http", "host", 80)
+        self.assertIsNot(first, second)
+        self.pool.release(first)
+        self.pool.release(second)
+        self.assertIs(second, self.pool.acquire("http", "host", 80))
+        self.assertIs(first, self.pool.acquire("http", "host", 80))
+        statistics = self.pool.statistics()
+        self.assertEqual((2, 2, 2, 0), (statistics.created, statistics.reused, statistics.in_use, statistics.idle))
+
+    def test_keys(self):
+        http = self.pool.acquire("http", "host", 80)
+        self.pool.release(http)
+        self.assertIsNot(http, self.pool.acquire("https", "host", 443))
+        self.assertIsNot(http, self.pool.acquire("http", "host", 8080))
+        self.assertIsNot(http, self.pool.acquire("http", "other", 80))
+        self.assertEqual(("http", "other", 80), self.pool.acquire("http", "other", 80).key)
+
+    def test_non_blocking_checkout(self):
+        self.pool.acquire("http", "host", 80)
+        self.pool.acquire("http", "host", 80)
+        self.assertRaises(PoolExhaustedError, self.pool.acquire, "http", "host", 80, block=False)
+        self.assertEqual(1, self.pool.statistics().timeouts)
+        # other keys have their own connections
+        self.pool.acquire("http", "other", 80, block=False)
+
+    def test_blocking_checkout_timeout(self):
+        self.pool.acquire("http", "host", 80)
+        self.pool.acquire("http", "host", 80)
+        self.assertRaises(PoolExhaustedError, self.pool.acquire, "http", "host", 80, timeout=0.05)
+        statistics = self.pool.statistics()
+        self.assertEqual((1, 1), (statistics.waits, statistics.timeouts))
+
+    def test_blocking_checkout_waits_for_release(self):
+        first = self.pool.acquire("http", "host", 80)
+        self.pool.acquire("http", "host", 80)
+        releaser = Thread(target=lambda: (sleep(0.05), self.pool.release(first)))
+        releaser.start()
+        self.assertIs(first, self.pool.acquire("http", "host", 80, timeout=5))
+        releaser.join()
+        self.assertEqual(1, self.pool.statistics().waits)
+
+    def test_not_reusable_connection_is_closed(self):
+        connection = self.pool.acquire("http", "host", 80)
+        self.pool.release(connection, reusable=False)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(connection, self.pool.acquire("http", "host", 80))
+
+    def test_idle_timeout(self):
+        first = self.pool.acquire("http", "host", 80)
+        second = self.pool.acquire("http", "host", 80)
+        self.pool.release(first)
+        self.clock.now = 6
+        self.pool.release(second)
+        self.clock.now = 12
+        self.assertIs(second, self.pool.acquire("http", "host", 80))
+        self.assertTrue(first.closed)
+        self.assertEqual(1, self.pool.statistics().expired)
+
+    def test_max_lifetime(self):
+        pool = ConnectionPool(max_lifetime=30, idle_timeout=None, factory=FakeConnection, clock=self.clock)
+        first = pool.acquire("http", "host", 80)
+        pool.release(first)
+        self.clock.now = 20
+        self.assertIs(first, pool.acquire("http", "host", 80))
+        self.clock.now = 31
+        pool.release(first)
+        self.assertTrue(first.closed)
+        self.assertEqual(1, pool.statistics().expired)
+
+    def test_dropped_connection(self):
+        closed = self.pool.acquire("http", "host", 80)
+        unexpected_data = self.pool.acquire("http", "host", 80)
+        self.pool.release(closed)
+        self.pool.release(unexpected_data)
+        closed.peer.close()
+        unexpected_data.peer.sendall(b"HTTP/1.1 408 Request Timeout\r\n\r\n")
+        connection = self.pool.acquire("http", "host", 80)
+        self.assertNotIn(connection, (closed, unexpected_data))
+        self.assertTrue(closed.closed)
+        self.assertTrue(unexpected_data.closed)
+        self.assertEqual(2, self.pool.statistics().dropped)
+
+    def test_clear(self):
+        connection = self.pool.acquire("http", "host", 80)
+        self.pool.release(connection)
+        self.pool.clear()
+        self.assertTrue(connection.closed)
+        self.assertEqual(0, self.pool.statistics().idle)
+
+    def test_default_connection_timeout(self):
+        factory = ConnectionFactory()
+        self.assertIs(_GLOBAL_DEFAULT_TIMEOUT, factory("http", "host", 80, None).timeout)
+        self.assertIs(_GLOBAL_DEFAULT_TIMEOUT, factory("https", "host", 443, None).timeout)
+        self.assertEqual(5, factory("http", "host", 80, 5).timeout)
+
+    def test_invalid_size(self):
+        self.assertRaises(IllegalArgumentError, ConnectionPool, 0)
+
+
+class ShortKeepAliveHandler(LocalRequestHandler):
+    timeout = 0.1
+
+
+class HttpRequestHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.handler = HttpRequestHandler(ConnectionPool(max_size=4))
+
+    def tearDown(self):
+        self.handler.close()
+        self.server.stop()
+
+    def test_keep_alive(self):
+        for name in ("a", "b", "c"):
+            response = self.handler.request(uri(self.server.uri("/hello/" + name)))
+            self.assertEqual(200, response.status_code)
+            self.assertEqual("Hello {0}!".format(name).encode("utf-8"), response.body)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(2, self.handler.pool.statistics().reused)
+
+    def test_request_target(self):
+        self.handler.request(self.server.uri("/echo?q=1#fragment"))
+        self.assertEqual(["/echo?q=1"], self.server.paths)
+
+    def test_connection_close(self):
+        self.handler.request(uri(self.server.uri("/close")))
+        self.handler.request(uri(self.server.uri("/hello/a")))
+        self.assertEqual(2, self.server.connections)
+        self.assertEqual(0, self.handler.pool.statistics().reused)
+
+    def test_server_closed_connection_is_dropped(self):
+        self.server.stop()
+        self.server = LocalServer(ShortKeepAliveHandler).start()
+        self.handler.request(uri(self.server.uri("/hello/a")))
+        # the server closes the idle keep-alive connection
+        sleep(0.3)
+        self.assertEqual(200, self.handler.request(uri(self.server.uri("/hello/b"))).status_code)
+        self.assertEqual(2, self.server.connections)
+        self.assertEqual(1, self.handler.pool.statistics().dropped)
+
+    def test_concurrent_requests(self):
+        target = uri(self.server.uri("/slow?delay=0.05"))
+        results = []
+        threads = [Thread(target=lambda: results.append(self.handler.request(target).status_code)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([200] * 8, results)
+        self.assertLessEqual(self.server.connections, 4)
+        self.assertGreater(self.server.connections, 1)
+        statistics = self.handler.pool.statistics()
+        self.assertEqual(0, statistics.in_use)
+        self.assertEqual(self.server.connections, statistics.created)
+
+    def test_pools_are_per_handler(self):
+        other = HttpRequestHandler()
+        self.assertIsNot(self.handler.pool, other.pool)
+        other.request(uri(self.server.uri("/hello/a")))
+        self.handler.request(uri(self.server.uri("/hello/a")))
+        self.assertEqual(2, self.server.connections)
+        other.close()
+
+
+class HttpsRequestHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(ssl_context=server_ssl_context()).start()
+        self.context = client_ssl_context()
+        self.handler = HttpRequestHandler(ssl_context=self.context)
+
+    def tearDown(self):
+        self.handler.close()
+        self.server.stop()
+
+    def test_keep_alive(self):
+        for name in ("a", "b", "c"):
+            response = self.handler.request(uri(self.server.uri("/hello/" + name)))
+            self.assertEqual("Hello {0}!".format(name).encode("utf-8"), response.body)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual((1, 0), self.handler.pool.factory.statistics())
+
+    def test_shared_context(self):
+        self.assertIs(self.context, self.handler.pool.factory.ssl_context)
+        self.assertRaises(IllegalArgumentError, HttpRequestHandler, ConnectionPool(), self.context)
+
+    def test_session_resumption(self):
+        self.handler.request(uri(self.server.uri("/hello/a")))
+        # the next request needs a new socket
+        self.handler.close()
+        self.handler.request(uri(self.server.uri("/hello/b")))
+        self.assertEqual(2, self.server.connections)
+        self.assertEqual((2, 1), self.handler.pool.factory.statistics())
+
+    def test_untrusted_certificate(self):
+        handler = HttpRequestHandler()
+        self.assertRaises(ssl.SSLCertVerificationError, handler.request, uri(self.server.uri("/hello/a")))
+        self.assertEqual(0, handler.pool.statistics().in_use)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(ConnectionPoolTest),
+                               loader.loadTestsFromTestCase(HttpRequestHandlerTest),
+                               loader.loadTestsFromTestCase(HttpsRequestHandlerTest)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from web import uri, query_params
+from web.querylib import QueryParams, encode_query_param, decode_query_param
+from web.assertion import IllegalArgumentError
+
+__author__ = 'Romain Gilles'
+
+
+class QueryParamsTest(unittest.TestCase):
+
+    def test_lazy_query_string_is_kept(self):
+        params = QueryParams("b=2&a=1&&a=3")
+        self.assertEqual("b=2&a=1&&a=3", str(params))
+        self.assertEqual([("b", "2"), ("a", "1"), ("a", "3")], params.items())
+        self.assertEqual("b=2&a=1&&a=3", str(params))
+
+    def test_get(self):
+        params = QueryParams("q=uri&page=2&q=url&flag")
+        self.assertEqual("uri", params["q"])
+        self.assertEqual("uri", params.get("q"))
+        self.assertEqual(["uri", "url"], params.get_all("q"))
+        self.assertEqual("", params["flag"])
+        self.assertIsNone(params.get("missing"))
+        self.assertRaises(KeyError, params.__getitem__, "missing")
+        self.assertEqual(["q", "page", "flag"], params.keys())
+        self.assertEqual(["q", "page", "flag"], list(params))
+        self.assertEqual(4, len(params))
+        self.assertIn("page", params)
+        self.assertNotIn("missing", params)
+
+    def test_decoding(self):
+        params = QueryParams("name=a+b%20c&caf%C3%A9=%3D%26")
+        self.assertEqual([("name", "a b c"), ("café", "=&")], params.items())
+
+    def test_add(self):
+        params = QueryParams("q=uri")
+        params.add("filter", "a b").add("q", "url")
+        self.assertEqual("q=uri&filter=a%20b&q=url", str(params))
+        self.assertEqual("k=v", str(QueryParams().add("k", "v")))
+
+    def test_replace(self):
+        params = QueryParams("q=uri&page=2&q=url")
+        params.replace("q", "urn")
+        self.assertEqual("q=urn&page=2", str(params))
+        params.replace("new", 1)
+        self.assertEqual("q=urn&page=2&new=1", str(params))
+
+    def test_remove(self):
+        params = QueryParams("q=uri&page=2&q=url")
+        params.remove("q")
+        self.assertEqual("page=2", str(params))
+        self.assertRaises(KeyError, params.remove, "q")
+
+    def test_untouched_parameters_keep_their_encoding(self):
+        params = QueryParams("q=%7euri&page=2")
+        params.replace("page", 3)
+        self.assertEqual("q=%7euri&page=3", str(params))
+
+    def test_construction_from_pairs_and_mapping(self):
+        self.assertEqual("a=1&b=x%26y", str(QueryParams((("a", 1), ("b", "x&y")))))
+        self.assertEqual("a=1&b=2", str(QueryParams({"a": 1, "b": 2})))
+        self.assertEqual("a=1;b=2", str(QueryParams([("a", 1), ("b", 2)], separator=";")))
+        self.assertRaises(IllegalArgumentError, QueryParams, 1)
+
+    def test_copy_and_equality(self):
+        params = QueryParams("a=1&b=2")
+        copy = params.copy()
+        self.assertEqual(params, copy)
+        copy.add("c", 3)
+        self.assertNotEqual(params, copy)
+        self.assertEqual("a=1&b=2", str(params))
+
+    def test_encoding(self):
+        self.assertEqual("a-z_~.", encode_query_param("a-z_~."))
+        self.assertEqual("a%20b%26c%3Dd%2Be%23f", encode_query_param("a b&c=d+e#f"))
+        self.assertEqual("caf%C3%A9", encode_query_param("café"))
+        self.assertEqual("/path?:@", encode_query_param("/path?:@"))
+        self.assertEqual("café a", decode_query_param("caf%C3%A9+a"))
+
+    def test_round_trip(self):
+        values = ("plain", "a b", "x&y=z", "100%", "café", "#fragment", "+plus")
+        params = QueryParams([(value, value) for value in values])
+        self.assertEqual([(value, value) for value in values], QueryParams(str(params)).items())
+
+    def test_append_query(self):
+        google = uri("http://www.google.com/search")
+        params = query_params([("q", "a b"), ("lang", "fr")])
+        self.assertEqual("http://www.google.com/search?q=a%20b&lang=fr", str(google.append_query(params)))
+        self.assertEqual("http://www.google.com/search?q=a%20b&lang=fr",
+                         str(google.builder().append_query(params).build()))
+
+    def test_query_params_of_uri(self):
+        google = uri("http://www.google.com/search?q=uri&page=2#top")
+        self.assertEqual([("q", "uri"), ("page", "2")], google.query_params.items())
+        params = google.query_params.replace("page", 3)
+        self.assertEqual("http://www.google.com/search?q=uri&page=3#top", str(google.append_query(params)))
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(QueryParamsTest)
+
+if __name__ == '__main__':
+    unittest.main()
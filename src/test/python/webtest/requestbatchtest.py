@@ -0,0 +1,164 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from threading import Lock
+from time import sleep
+import unittest
+from web import uri, request_many, set_request_handler
+from web.assertion import IllegalArgumentError
+from web.urilib import AbstractRequestHandler, HttpRequestHandler, Response, DEFAULT_REQUEST_HANDLER
+from webtest.httpserver import LocalServer
+
+__author__ = 'Romain Gilles'
+
+
+class RecordingRequestHandler(AbstractRequestHandler):
+    """
+    Answers every request after the delay given by its delay query parameter,
+    records the maximum number of requests in flight, in total and per host.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.total = 0
+        self.max_total = 0
+        self.requested = []
+
+    def request(self, uri, method="GET", headers=None, body=None, stream=False):
+        host = uri.authority
+        with self.lock:
+            self.requested.append(str(uri))
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+            self.max_in_flight[host] = max(self.max_in_flight.get(host, 0), self.in_flight[host])
+            self.total += 1
+            self.max_total = max(self.max_total, self.total)
+        try:
+            sleep(float(uri.query_params.get("delay", "0.01")))
+            if uri.path == "/error":
+                raise ValueError(str(uri))
+            return Response({}, str(uri).encode("utf-8"), 200, "OK", 11)
+        finally:
+            with self.lock:
+                self.in_flight[host] -= 1
+                self.total -= 1
+
+
+class RequestManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = RecordingRequestHandler()
+        set_request_handler(self.handler)
+
+    def tearDown(self):
+        set_request_handler(DEFAULT_REQUEST_HANDLER)
+
+    def test_all_results(self):
+        uris = ["http://host{0}/item/{1}".format(index % 3, index) for index in range(50)]
+        results = list(request_many(uris, max_workers=8))
+        self.assertEqual(list(range(50)), sorted(result.index for result in results))
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(uris[result.index], str(result.uri))
+            self.assertEqual(uris[result.index].encode("utf-8"), result.response.body)
+        self.assertLessEqual(self.handler.max_total, 8)
+
+    def test_as_completed(self):
+        uris = ["http://host/slow?delay=0.2", "http://host/fast?delay=0"]
+        self.assertEqual([1, 0], [result.index for result in request_many(uris, max_workers=2)])
+
+    def test_ordered(self):
+        uris = ["http://host/{0}?delay={1}".format(index, 0.05 if index % 4 == 0 else 0) for index in range(20)]
+        results = list(request_many(uris, max_workers=4, ordered=True))
+        self.assertEqual(list(range(20)), [result.index for result in results])
+
+    def test_per_host_limit(self):
+        uris = ["http://slow/{0}?delay=0.02".format(index) for index in range(20)] + \
+               ["http://fast/{0}?delay=0".format(index) for index in range(20)]
+        results = list(request_many(uris, max_workers=6, per_host_limit=2))
+        self.assertEqual(40, len(results))
+        self.assertEqual({"slow": 2, "fast": 2}, self.handler.max_in_flight)
+        # the fast host is not held behind the slow one
+        self.assertGreater(sum(result.uri.authority == "fast" for result in results[:20]), 10)
+
+    def test_per_host_limit_on_normalized_authority(self):
+        uris = ["http://HOST/{0}".format(index) for index in range(5)] + \
+               ["http://host:80/{0}".format(index) for index in range(5)]
+        list(request_many(uris, max_workers=10, per_host_limit=1))
+        self.assertEqual(1, self.handler.max_total)
+
+    def test_errors(self):
+        results = list(request_many(["http://host/ok", "http://host/error", "http://host/ok2"], ordered=True))
+        self.assertEqual([None, ValueError, None], [type(result.error) if result.error else None
+                                                    for result in results])
+        self.assertIsNone(results[1].response)
+        self.assertEqual(b"http://host/ok2", results[2].response.body)
+
+    def test_lazy_requests(self):
+        read = []
+
+        def requests():
+            for index in range(1000):
+                read.append(index)
+                yield "http://host/{0}?delay=0".format(index)
+        results = request_many(requests(), max_workers=2)
+        next(results)
+        self.assertLess(len(read), 20)
+        results.close()
+        self.assertLess(len(self.handler.requested), 20)
+
+    def test_request_arguments(self):
+        results = list(request_many([uri("http://host/a"), ("http://host/b", "POST", b"body", {"X": "1"}),
+                                     ("http://host/c",)], ordered=True))
+        self.assertEqual(["http://host/a", "http://host/b", "http://host/c"], sorted(self.handler.requested))
+        self.assertEqual([0, 1, 2], [result.index for result in results])
+
+    def test_illegal_arguments(self):
+        self.assertRaises(IllegalArgumentError, request_many, 12)
+        self.assertRaises(IllegalArgumentError, request_many, [], 0)
+        self.assertRaises(IllegalArgumentError, request_many, [], 1, 0)
+        self.assertRaises(IllegalArgumentError, list, request_many([12]))
+
+
+class RequestManyServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = [LocalServer().start() for _ in range(2)]
+        self.handler = HttpRequestHandler()
+        set_request_handler(self.handler)
+
+    def tearDown(self):
+        set_request_handler(DEFAULT_REQUEST_HANDLER)
+        self.handler.close()
+        for server in self.servers:
+            server.stop()
+
+    def test_shared_connection_pool(self):
+        uris = [server.uri("/slow?delay=0.01") for server in self.servers for _ in range(20)]
+        results = list(request_many(uris, max_workers=8, per_host_limit=3))
+        self.assertEqual([b"slow"] * 40, [result.response.body for result in results])
+        for server in self.servers:
+            self.assertLessEqual(server.connections, 3)
+        self.assertEqual(0, self.handler.pool.statistics().in_use)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(RequestManyTest),
+                               loader.loadTestsFromTestCase(RequestManyServerTest)))
+
+if __name__ == '__main__':
+    unittest.main()
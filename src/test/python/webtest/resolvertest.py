@@ -0,0 +1,226 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import socket
+from time import monotonic
+import unittest
+from web.assertion import IllegalArgumentError
+from web.pool import ConnectionPool, ConnectionFactory
+from web.resolver import CachingResolver, Connector, ResolverStatistics, interleave
+from web.urilib import HttpRequestHandler
+from webtest.httpserver import LocalServer
+
+__author__ = 'Romain Gilles'
+
+LOCALHOST = "127.0.0.1"
+
+
+def _entry(address, family=socket.AF_INET):
+    return family, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", address
+
+
+class FakeResolver(object):
+    """
+    Resolver returning the entries given by name and counting its calls.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.calls = 0
+
+    def __call__(self, host, port):
+        self.calls += 1
+        if host not in self.entries:
+            raise socket.gaierror(socket.EAI_NONAME, "unknown name")
+        return self.entries[host]
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _black_hole():
+    """
+    Returns a listening socket whose backlog is full: the connection attempts
+    to its address are not answered.
+    """
+    server = socket.socket()
+    server.bind((LOCALHOST, 0))
+    server.listen(0)
+    client = socket.create_connection(server.getsockname())
+    return server, client
+
+
+def _refused_address():
+    sock = socket.socket()
+    sock.bind((LOCALHOST, 0))
+    address = sock.getsockname()
+    sock.close()
+    return address
+
+
+class CachingResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeResolver({"a": [_entry(("10.0.0.1", 80))], "b": [_entry(("10.0.0.2", 80))]})
+        self.clock = FakeClock()
+        self.resolver = CachingResolver(self.fake, ttl=10, max_entries=2, clock=self.clock)
+
+    def test_entries_are_cached(self):
+        self.assertEqual(self.fake.entries["a"], self.resolver("a", 80))
+        self.assertEqual(self.fake.entries["a"], self.resolver("a", 80))
+        self.assertEqual(1, self.fake.calls)
+        self.assertEqual(ResolverStatistics(1, 1, 0, 1), self.resolver.statistics())
+
+    def test_ttl(self):
+        self.resolver("a", 80)
+        self.clock.now = 10
+        self.resolver("a", 80)
+        self.assertEqual(2, self.fake.calls)
+        self.assertEqual(ResolverStatistics(0, 2, 1, 1), self.resolver.statistics())
+
+    def test_least_recently_used_is_evicted(self):
+        self.resolver("a", 80)
+        self.resolver("b", 80)
+        self.resolver("a", 80)
+        self.resolver("a", 443)
+        self.resolver("a", 80)
+        self.resolver("b", 80)
+        self.assertEqual(4, self.fake.calls)
+
+    def test_failures_are_not_cached(self):
+        self.assertRaises(socket.gaierror, self.resolver, "c", 80)
+        self.assertRaises(socket.gaierror, self.resolver, "c", 80)
+        self.assertEqual(2, self.fake.calls)
+
+    def test_invalidate(self):
+        self.resolver("a", 80)
+        self.resolver.invalidate("a", 80)
+        self.resolver("a", 80)
+        self.assertEqual(2, self.fake.calls)
+
+    def test_invalid_arguments(self):
+        self.assertRaises(IllegalArgumentError, CachingResolver, ttl=-1)
+        self.assertRaises(IllegalArgumentError, CachingResolver, max_entries=0)
+        self.assertRaises(IllegalArgumentError, Connector, delay=-1)
+
+
+class InterleaveTest(unittest.TestCase):
+
+    def test_families_alternate(self):
+        entries = [_entry(("::{0}".format(index), 80, 0, 0), socket.AF_INET6) for index in range(1, 4)] + \
+            [_entry(("10.0.0.{0}".format(index), 80)) for index in range(1, 3)]
+        self.assertEqual(["::1", "10.0.0.1", "::2", "10.0.0.2", "::3"],
+                         [entry[4][0] for entry in interleave(entries)])
+        self.assertEqual(["::1", "::2", "10.0.0.1", "::3", "10.0.0.2"],
+                         [entry[4][0] for entry in interleave(entries, 2)])
+
+    def test_one_family(self):
+        entries = [_entry(("10.0.0.{0}".format(index), 80)) for index in range(1, 4)]
+        self.assertEqual(entries, interleave(entries))
+
+
+class ConnectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind((LOCALHOST, 0))
+        self.server.listen(8)
+        self.address = self.server.getsockname()
+
+    def tearDown(self):
+        self.server.close()
+
+    def __connector(self, entries, delay=0.1):
+        return Connector(CachingResolver(FakeResolver({"host": entries})), delay=delay)
+
+    def test_connect(self):
+        connector = self.__connector([_entry(self.address)])
+        with connector(("host", 80), 5) as sock:
+            self.assertEqual(self.address, sock.getpeername())
+            self.assertEqual(5, sock.gettimeout())
+        statistics = connector.statistics()
+        self.assertEqual((1, 0, 0), statistics[:3])
+        self.assertGreater(statistics.connect_time, 0)
+
+    def test_refused_address_falls_back_at_once(self):
+        connector = self.__connector([_entry(_refused_address()), _entry(self.address)], delay=10)
+        start = monotonic()
+        with connector(("host", 80)) as sock:
+            self.assertEqual(self.address, sock.getpeername())
+        self.assertLess(monotonic() - start, 1)
+        self.assertEqual(1, connector.statistics().fallbacks)
+
+    def test_unanswered_address_is_raced(self):
+        black_hole, client = _black_hole()
+        try:
+            connector = self.__connector([_entry(black_hole.getsockname()), _entry(self.address)], delay=0.05)
+            start = monotonic()
+            with connector(("host", 80), 10) as sock:
+                self.assertEqual(self.address, sock.getpeername())
+            self.assertLess(monotonic() - start, 1)
+            self.assertEqual(1, connector.statistics().fallbacks)
+        finally:
+            client.close()
+            black_hole.close()
+
+    def test_timeout(self):
+        black_hole, client = _black_hole()
+        try:
+            connector = self.__connector([_entry(black_hole.getsockname())])
+            self.assertRaises(TimeoutError, connector, ("host", 80), 0.2)
+            self.assertEqual(1, connector.statistics().failures)
+        finally:
+            client.close()
+            black_hole.close()
+
+    def test_first_error_is_raised(self):
+        resolver = CachingResolver(FakeResolver({"host": [_entry(_refused_address())] * 2}))
+        connector = Connector(resolver)
+        self.assertRaises(ConnectionRefusedError, connector, ("host", 80))
+        self.assertRaises(socket.gaierror, connector, ("unknown", 80))
+        self.assertEqual(2, connector.statistics().failures)
+        # the addresses of a server which can not be connected are resolved again
+        self.assertEqual(0, resolver.statistics().entries)
+
+
+class ConnectionFactoryTest(unittest.TestCase):
+
+    def test_name_is_resolved_once(self):
+        with LocalServer() as server:
+            resolver = CachingResolver(FakeResolver({"server.test": [_entry((LOCALHOST, server.port))]}))
+            connector = Connector(resolver)
+            handler = HttpRequestHandler(ConnectionPool(factory=ConnectionFactory(connector=connector)))
+            for _ in range(3):
+                self.assertEqual(200, handler.request("http://server.test:{0}/close".format(server.port)).status_code)
+            handler.close()
+        self.assertEqual(3, server.connections)
+        self.assertEqual(ResolverStatistics(2, 1, 0, 1), resolver.statistics())
+        self.assertEqual(3, connector.statistics().connections)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(CachingResolverTest),
+                               loader.loadTestsFromTestCase(InterleaveTest),
+                               loader.loadTestsFromTestCase(ConnectorTest),
+                               loader.loadTestsFromTestCase(ConnectionFactoryTest)))
+
+if __name__ == '__main__':
+    unittest.main()
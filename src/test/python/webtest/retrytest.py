@@ -0,0 +1,294 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from email.utils import formatdate
+import io
+import socket
+import tempfile
+import unittest
+from web import uri
+from web.asynclib import AsyncHttpRequestHandler
+from web.assertion import IllegalArgumentError
+from web.pool import ConnectionPool
+from web.retry import RetryPolicy, RetryStatistics, NO_RETRY, rewinder, _retry_after
+from web.urilib import HttpRequestHandler
+from webtest.httpserver import LocalServer, LocalRequestHandler
+
+__author__ = 'Romain Gilles'
+
+
+class StaleHandler(LocalRequestHandler):
+    """
+    Closes its connection instead of answering the second request, as a server
+    closing an idle connection at the time a request arrives.
+    """
+
+    def setup(self):
+        super().setup()
+        self.handled = 0
+
+    def _stale(self):
+        self.handled += 1
+        if self.handled > 1:
+            self.close_connection = True
+            return
+        self._handle()
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_OPTIONS = _stale
+
+
+class UnavailableHandler(LocalRequestHandler):
+    """
+    Answers 503 to the first requests, as many as failures.
+    """
+    failures = 0
+    retry_after = "0"
+
+    def _unavailable(self):
+        if UnavailableHandler.failures > 0:
+            UnavailableHandler.failures -= 1
+            self.server.requested(self)
+            self._read_body()
+            self._send(503, b"unavailable", (("Retry-After", self.retry_after),))
+            return
+        self._handle()
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_OPTIONS = _unavailable
+
+
+def _refused_uri():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return "http://127.0.0.1:{0}/".format(port)
+
+
+class DeadConnection(object):
+    """
+    Reused connection closed by the server.
+    """
+    sock = object()
+
+    def request(self, *args, **kwargs):
+        raise BrokenPipeError()
+
+
+class DeadPool(object):
+    """
+    Pool whose idle connections are all closed by the server.
+    """
+    max_size = 2
+
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, scheme, host, port):
+        self.acquired += 1
+        return DeadConnection()
+
+    def release(self, connection, reusable=True):
+        pass
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_exponential_backoff(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=0)
+        self.assertEqual([1, 2, 4, 5, 5], [policy.backoff(retry) for retry in range(1, 6)])
+
+    def test_jitter(self):
+        policy = RetryPolicy(backoff_factor=1, jitter=0.5, random=lambda: 0.5)
+        self.assertEqual(3, policy.backoff(3))
+        policy = RetryPolicy(backoff_factor=1, random=lambda: 0.75)
+        self.assertEqual(1, policy.backoff(3))
+
+    def test_retry_after(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=0)
+        self.assertEqual(3, policy.backoff(1, "3"))
+        self.assertEqual(5, policy.backoff(1, "120"))
+        self.assertEqual(1, policy.backoff(1, "soon"))
+        self.assertAlmostEqual(30, _retry_after(formatdate(1030, usegmt=True), lambda: 1000))
+        self.assertEqual(0, _retry_after(formatdate(1000, usegmt=True), lambda: 2000))
+
+    def test_methods(self):
+        self.assertTrue(NO_RETRY.replays("GET"))
+        self.assertTrue(NO_RETRY.replays("delete"))
+        self.assertFalse(NO_RETRY.replays("POST"))
+        self.assertFalse(NO_RETRY.replays("PATCH"))
+        self.assertTrue(RetryPolicy(methods=("GET", "post")).replays("POST"))
+
+    def test_invalid_arguments(self):
+        self.assertRaises(IllegalArgumentError, RetryPolicy, max_retries=-1)
+        self.assertRaises(IllegalArgumentError, RetryPolicy, backoff_factor=-1)
+        self.assertRaises(IllegalArgumentError, RetryPolicy, jitter=2)
+
+    def test_rewinder(self):
+        for body in (None, b"body", "body", bytearray(b"body")):
+            self.assertIsNotNone(rewinder(body))
+        self.assertIsNone(rewinder(iter([b"body"])))
+        file = io.BytesIO(b"0123456789")
+        file.seek(4)
+        rewind = rewinder(file)
+        file.read()
+        rewind()
+        self.assertEqual(b"456789", file.read())
+
+
+class RetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(StaleHandler).start()
+        self.handler = HttpRequestHandler(ConnectionPool(max_size=2),
+                                          retry_policy=RetryPolicy(max_retries=2, backoff_factor=0.01))
+
+    def tearDown(self):
+        self.handler.close()
+        self.server.stop()
+
+    def test_stale_connection_is_replayed(self):
+        for name in ("a", "b", "c"):
+            response = self.handler.request(self.server.uri("/hello/" + name))
+            self.assertEqual("Hello {0}!".format(name).encode("utf-8"), response.body)
+        self.assertEqual(RetryStatistics(2, 0, 0), self.handler.statistics())
+        self.assertEqual(3, self.server.connections)
+
+    def test_stale_connection_is_replayed_without_retry_policy(self):
+        handler = HttpRequestHandler()
+        handler.request(self.server.uri("/hello/a"))
+        self.assertEqual(b"Hello b!", handler.request(self.server.uri("/hello/b")).body)
+        self.assertEqual(RetryStatistics(1, 0, 0), handler.statistics())
+        handler.close()
+
+    def test_replays_are_bounded(self):
+        handler = HttpRequestHandler(DeadPool())
+        self.assertRaises(BrokenPipeError, handler.request, "http://host/")
+        # every connection of the pool and a new one
+        self.assertEqual(DeadPool.max_size + 2, handler.pool.acquired)
+        self.assertEqual(RetryStatistics(DeadPool.max_size + 1, 0, 0), handler.statistics())
+
+    def test_file_body_is_rewound(self):
+        self.handler.request(self.server.uri("/hello/a"))
+        with tempfile.TemporaryFile() as file:
+            file.write(b"header:body")
+            file.seek(7)
+            response = self.handler.request(self.server.uri("/echo"), "PUT", None, file)
+        self.assertEqual(b"body", response.body)
+        self.assertEqual(1, self.handler.statistics().replayed)
+
+    def test_post_is_not_replayed(self):
+        self.handler.request(self.server.uri("/hello/a"))
+        self.assertRaises(ConnectionError, self.handler.request, self.server.uri("/echo"), "POST", None, b"body")
+        self.assertEqual(RetryStatistics(0, 0, 0), self.handler.statistics())
+
+    def test_iterable_body_is_not_replayed(self):
+        self.handler.request(self.server.uri("/hello/a"))
+        self.assertRaises(ConnectionError, self.handler.request, self.server.uri("/echo"), "PUT", None,
+                          iter([b"body"]))
+
+    def test_connection_failure_is_retried(self):
+        self.assertRaises(ConnectionRefusedError, self.handler.request, uri(_refused_uri()))
+        self.assertEqual(RetryStatistics(0, 2, 1), self.handler.statistics())
+
+
+class RetryStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(UnavailableHandler).start()
+        self.handler = HttpRequestHandler(retry_policy=RetryPolicy(max_retries=2, backoff_factor=0.01))
+
+    def tearDown(self):
+        UnavailableHandler.failures = 0
+        self.handler.close()
+        self.server.stop()
+
+    def test_unavailable_is_retried(self):
+        UnavailableHandler.failures = 2
+        response = self.handler.request(self.server.uri("/hello/a"))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, self.server.requests)
+        # the retried responses are read and their connection reused
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(RetryStatistics(0, 2, 0), self.handler.statistics())
+
+    def test_retries_are_exhausted(self):
+        UnavailableHandler.failures = 5
+        self.assertEqual(503, self.handler.request(self.server.uri("/hello/a")).status_code)
+        self.assertEqual(3, self.server.requests)
+        self.assertEqual(RetryStatistics(0, 2, 1), self.handler.statistics())
+
+    def test_no_retry_is_not_exhausted(self):
+        UnavailableHandler.failures = 1
+        handler = HttpRequestHandler()
+        self.assertEqual(503, handler.request(self.server.uri("/hello/a")).status_code)
+        self.assertEqual(RetryStatistics(0, 0, 0), handler.statistics())
+        self.assertRaises(ConnectionRefusedError, handler.request, _refused_uri())
+        self.assertEqual(RetryStatistics(0, 0, 0), handler.statistics())
+        handler.close()
+
+    def test_streamed_response_is_retried(self):
+        UnavailableHandler.failures = 1
+        with self.handler.request(self.server.uri("/bytes?size=10"), stream=True) as response:
+            self.assertEqual(10, len(response.read()))
+        self.assertEqual(1, self.server.connections)
+
+    def test_post_is_not_retried(self):
+        UnavailableHandler.failures = 1
+        self.assertEqual(503, self.handler.request(self.server.uri("/echo"), "POST", None, b"body").status_code)
+        self.assertEqual(RetryStatistics(0, 0, 0), self.handler.statistics())
+
+
+class AsyncRetryTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = LocalServer(StaleHandler).start()
+        self.handler = AsyncHttpRequestHandler(retry_policy=RetryPolicy(max_retries=1, backoff_factor=0.01))
+
+    async def asyncTearDown(self):
+        self.handler.close()
+
+    def tearDown(self):
+        UnavailableHandler.failures = 0
+        self.server.stop()
+
+    async def test_stale_connection_is_replayed(self):
+        for name in ("a", "b"):
+            response = await self.handler.request(self.server.uri("/hello/" + name))
+            self.assertEqual("Hello {0}!".format(name).encode("utf-8"), response.body)
+        self.assertEqual(RetryStatistics(1, 0, 0), self.handler.statistics())
+
+    async def test_post_is_not_replayed(self):
+        await self.handler.request(self.server.uri("/hello/a"))
+        with self.assertRaises(ConnectionError):
+            await self.handler.request(self.server.uri("/echo"), "POST", None, b"body")
+
+    async def test_unavailable_is_retried(self):
+        self.server.stop()
+        self.server = LocalServer(UnavailableHandler).start()
+        UnavailableHandler.failures = 1
+        response = await self.handler.request(self.server.uri("/hello/a"))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(RetryStatistics(0, 1, 0), self.handler.statistics())
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(RetryPolicyTest),
+                               loader.loadTestsFromTestCase(RetryTest),
+                               loader.loadTestsFromTestCase(RetryStatusTest),
+                               loader.loadTestsFromTestCase(AsyncRetryTest)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import gc
+import unittest
+from web import uri, request, set_request_handler
+from web.pool import ConnectionPool
+from web.urilib import HttpRequestHandler, Response, DEFAULT_REQUEST_HANDLER
+from webtest.httpserver import LocalServer
+
+__author__ = 'Romain Gilles'
+
+SIZE = 300000
+
+
+def _expected(size):
+    return bytes(index % 256 for index in range(size))
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.handler = HttpRequestHandler(ConnectionPool(max_size=1, timeout=1))
+        self.pool = self.handler.pool
+
+    def tearDown(self):
+        self.handler.close()
+        self.server.stop()
+
+    def _stream(self, path):
+        return self.handler.request(uri(self.server.uri(path)), stream=True)
+
+    def test_iter_bytes(self):
+        with self._stream("/bytes?size={0}".format(SIZE)) as response:
+            self.assertTrue(response.streamed)
+            self.assertEqual(200, response.status_code)
+            chunks = list(response.iter_bytes(4096))
+            self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks))
+            self.assertEqual(_expected(SIZE), b"".join(chunks))
+            # the connection is released as soon as the body is consumed
+            self.assertEqual((0, 1), (self.pool.statistics().in_use, self.pool.statistics().idle))
+        self.assertEqual(1, self.pool.statistics().idle)
+
+    def test_connection_is_held_until_consumed(self):
+        response = self._stream("/bytes?size={0}".format(SIZE))
+        self.assertEqual(1, self.pool.statistics().in_use)
+        self.assertEqual(_expected(10), response.read(10))
+        self.assertEqual(1, self.pool.statistics().in_use)
+        self.assertEqual(_expected(SIZE)[10:], response.body)
+        self.assertEqual(0, self.pool.statistics().in_use)
+        self.handler.request(uri(self.server.uri("/hello/a")))
+        self.assertEqual(1, self.server.connections)
+
+    def test_streamed_after_read_and_close(self):
+        response = self._stream("/bytes?size=10")
+        self.assertEqual(_expected(10), response.read())
+        self.assertTrue(response.streamed)
+        response.close()
+        self.assertTrue(response.streamed)
+        with self._stream("/bytes?size={0}".format(SIZE)) as response:
+            response.read(10)
+        self.assertTrue(response.streamed)
+
+    def test_close_before_the_end(self):
+        with self._stream("/bytes?size={0}".format(SIZE)) as response:
+            response.read(10)
+        statistics = self.pool.statistics()
+        self.assertEqual((0, 0), (statistics.in_use, statistics.idle))
+        # the connection is not reused, the rest of its body was not read
+        self.assertEqual(b"Hello a!", self.handler.request(uri(self.server.uri("/hello/a"))).body)
+        self.assertEqual(2, self.server.connections)
+
+    def test_dropped_response_releases_its_connection(self):
+        self._stream("/bytes?size={0}".format(SIZE))
+        gc.collect()
+        self.assertEqual(0, self.pool.statistics().in_use)
+
+    def test_readinto(self):
+        buffer = bytearray(1000)
+        received = bytearray()
+        with self._stream("/bytes?size={0}".format(SIZE)) as response:
+            while True:
+                count = response.readinto(buffer)
+                if not count:
+                    break
+                received += buffer[:count]
+        self.assertEqual(_expected(SIZE), bytes(received))
+        self.assertEqual(1, self.pool.statistics().idle)
+
+    def test_iter_lines_of_chunked_body(self):
+        with self._stream("/lines?count=1000") as response:
+            lines = list(response.iter_lines(chunk_size=7))
+        self.assertEqual(["line {0}".format(index).encode("ascii") for index in range(1000)], lines)
+        self.assertEqual(1, self.pool.statistics().idle)
+        with self._stream("/lines?count=2") as response:
+            self.assertEqual([b"line 0\r\n", b"line 1\r\n"], list(response.iter_lines(keepends=True)))
+
+    def test_buffered_response(self):
+        response = self.handler.request(uri(self.server.uri("/bytes?size=100")))
+        self.assertFalse(response.streamed)
+        self.assertEqual(1, self.pool.statistics().idle)
+        self.assertEqual(_expected(100), b"".join(response.iter_bytes(30)))
+        self.assertEqual(_expected(100), response.body)
+        lines = Response({}, b"a\nb\r\nc", 200, "OK", 11)
+        self.assertEqual([b"a", b"b", b"c"], list(lines.iter_lines()))
+
+    def test_iter_lines_across_chunks(self):
+        data = b"x" * 100000 + b"\r\n" + b"y" * 10 + b"\n\nz"
+        lines = Response({}, data, 200, "OK", 11)
+        self.assertEqual([b"x" * 100000, b"y" * 10, b"", b"z"], list(lines.iter_lines(chunk_size=3)))
+        lines = Response({}, data, 200, "OK", 11)
+        self.assertEqual(data.splitlines(keepends=True), list(lines.iter_lines(chunk_size=100001, keepends=True)))
+
+    def test_web_request(self):
+        set_request_handler(self.handler)
+        try:
+            with request(self.server.uri("/bytes?size=10"), stream=True) as response:
+                self.assertEqual(_expected(10), response.read())
+        finally:
+            set_request_handler(DEFAULT_REQUEST_HANDLER)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(StreamTest)
+
+if __name__ == '__main__':
+    unittest.main()
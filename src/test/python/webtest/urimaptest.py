@@ -0,0 +1,138 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from web import uri, uri_map, uri_set
+from web.urimap import URIMap, URISet
+from web.assertion import IllegalArgumentError
+
+__author__ = 'Romain Gilles'
+
+
+class URIMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.routes = uri_map([("https://api.example.com", "root"),
+                               ("https://api.example.com/v1", "v1"),
+                               ("https://api.example.com/v1/accounts/*/items", "items"),
+                               ("https://api.example.com/v1/accounts/admin", "admin"),
+                               ("http://api.example.com/v1", "http")])
+
+    def test_longest_prefix_match(self):
+        self.assertEqual("v1", self.routes.match("https://api.example.com/v1/users?page=2"))
+        self.assertEqual("v1", self.routes.match(uri("https://api.example.com/v1")))
+        self.assertEqual("root", self.routes.match("https://api.example.com/v2"))
+        self.assertEqual("root", self.routes.match("https://api.example.com"))
+        self.assertEqual("http", self.routes.match("http://api.example.com/v1/users"))
+        self.assertIsNone(self.routes.match("http://api.example.com/v2"))
+        self.assertIsNone(self.routes.match("https://www.example.com/v1"))
+        self.assertEqual("none", self.routes.match("ftp://api.example.com/v1", "none"))
+
+    def test_match_is_segment_based(self):
+        self.assertEqual("root", self.routes.match("https://api.example.com/v10"))
+
+    def test_wildcard_segment(self):
+        self.assertEqual("items", self.routes.match("https://api.example.com/v1/accounts/42/items/7"))
+        self.assertEqual("v1", self.routes.match("https://api.example.com/v1/accounts/42/orders"))
+        self.assertEqual("admin", self.routes.match("https://api.example.com/v1/accounts/admin/orders"))
+        # the wildcard branch is explored when the segment branch does not match deeper
+        self.assertEqual("items", self.routes.match("https://api.example.com/v1/accounts/admin/items"))
+
+    def test_segment_wins_over_wildcard_at_same_depth(self):
+        routes = URIMap({"http://host/*/a": "wildcard", "http://host/b/a": "segment"})
+        self.assertEqual("segment", routes.match("http://host/b/a/c"))
+        self.assertEqual("wildcard", routes.match("http://host/c/a/c"))
+
+    def test_longest_prefix(self):
+        prefix, value = self.routes.longest_prefix("https://api.example.com/v1/accounts/42/items/7?x=1#top")
+        self.assertEqual("https://api.example.com/v1/accounts/42/items", str(prefix))
+        self.assertEqual("items", value)
+        self.assertRaises(KeyError, self.routes.longest_prefix, "https://www.example.com/v1")
+
+    def test_normalized_keys(self):
+        routes = URIMap({"HTTP://API.example.com:80/a/": "a"})
+        self.assertEqual("a", routes.match("http://api.EXAMPLE.com/a/b"))
+        self.assertEqual("a", routes.match("http://api.example.com:80/%61/b"))
+        self.assertEqual("a", routes.match("http://api.example.com/b/../a"))
+        self.assertIsNone(routes.match("http://api.example.com:8080/a"))
+        self.assertEqual("a", routes["http://api.example.com/a"])
+
+    def test_mapping(self):
+        routes = URIMap()
+        routes["http://host/a/b"] = 1
+        routes["http://host/a"] = 2
+        routes["http://host/a/b/"] = 3
+        self.assertEqual(2, len(routes))
+        self.assertEqual(3, routes["http://host/a/b"])
+        self.assertIn("http://host/a", routes)
+        self.assertNotIn("http://host/a/b/c", routes)
+        self.assertRaises(KeyError, routes.__getitem__, "http://host")
+        self.assertEqual(0, routes.get("http://other", 0))
+        self.assertEqual({("http://host/a", 2), ("http://host/a/b", 3)},
+                         {(str(rule), value) for rule, value in routes.items()})
+
+    def test_delete(self):
+        del self.routes["https://api.example.com/v1/accounts/*/items"]
+        self.assertEqual(4, len(self.routes))
+        self.assertEqual("v1", self.routes.match("https://api.example.com/v1/accounts/42/items"))
+        self.assertRaises(KeyError, self.routes.__delitem__, "https://api.example.com/v1/accounts")
+        del self.routes["http://api.example.com/v1"]
+        self.assertIsNone(self.routes.match("http://api.example.com/v1"))
+        self.assertEqual(["https://api.example.com/v1/accounts/admin"],
+                         [str(rule) for rule in self.routes if "accounts" in str(rule)])
+
+    def test_invalid_rules(self):
+        self.assertRaises(IllegalArgumentError, URIMap, [("/relative", 1)])
+        self.assertRaises(IllegalArgumentError, URIMap, [("http://host/a?q", 1)])
+        self.assertRaises(IllegalArgumentError, URIMap, [("http://host/a#top", 1)])
+        self.assertRaises(IllegalArgumentError, URIMap, [("urn:isbn:0451450523", 1)])
+        self.assertRaises(IllegalArgumentError, URIMap, [(1, 1)])
+        self.assertRaises(IllegalArgumentError, URIMap, 1)
+
+    def test_lookup_against_linear_scan(self):
+        rules = ["http://host{0}/{1}".format(index % 7, "/".join(str(segment) for segment in range(index % 5)))
+                 for index in range(200)]
+        routes = URIMap((rule, rule.rstrip("/")) for rule in rules)
+        for index in range(300):
+            target = "http://host{0}/{1}".format(index % 9, "/".join(str(segment) for segment in range(index % 6)))
+            candidates = [rule.rstrip("/") for rule in rules
+                          if (target + "/").startswith(rule.rstrip("/") + "/")]
+            self.assertEqual(max(candidates, key=len) if candidates else None, routes.match(target))
+
+
+class URISetTest(unittest.TestCase):
+
+    def test_set(self):
+        rules = uri_set(["http://host/a", "http://host/b/*/c"])
+        self.assertTrue(rules.matches("http://host/a/b"))
+        self.assertTrue(rules.matches("http://host/b/x/c"))
+        self.assertFalse(rules.matches("http://host/b/x"))
+        self.assertEqual("http://host/b/x/c", str(rules.longest_prefix("http://host/b/x/c/d")))
+        self.assertIn("http://host/a", rules)
+        self.assertNotIn("http://host/a/b", rules)
+        rules.add("http://host/b")
+        self.assertEqual(3, len(rules))
+        rules.discard("http://host/a")
+        rules.discard("http://host/a")
+        self.assertRaises(KeyError, rules.remove, "http://host/a")
+        self.assertEqual(["http://host/b", "http://host/b/*/c"], sorted(str(rule) for rule in URISet(rules)))
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite((loader.loadTestsFromTestCase(URIMapTest), loader.loadTestsFromTestCase(URISetTest)))
+
+if __name__ == '__main__':
+    unittest.main()
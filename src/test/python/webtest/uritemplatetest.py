@@ -0,0 +1,121 @@
+#
+# Copyright 2012 Romain Gilles
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from web import uri, uri_template
+from web.assertion import IllegalArgumentError
+
+__author__ = 'Romain Gilles'
+
+# variables of the RFC 6570 section 3.2 examples
+VARIABLES = {"count": ("one", "two", "three"), "dom": ("example", "com"), "dub": "me/too", "hello": "Hello World!",
+             "half": "50%", "var": "value", "who": "fred", "base": "http://example.com/home/", "path": "/foo/bar",
+             "list": ["red", "green", "blue"], "keys": {"semi": ";", "dot": ".", "comma": ","}, "v": "6",
+             "x": "1024", "y": "768", "empty": "", "empty_keys": {}, "undef": None}
+
+EXAMPLES = (
+    ("{count}", "one,two,three"), ("{count*}", "one,two,three"), ("{/count}", "/one,two,three"),
+    ("{/count*}", "/one/two/three"), ("{;count}", ";count=one,two,three"),
+    ("{;count*}", ";count=one;count=two;count=three"), ("{?count}", "?count=one,two,three"),
+    ("{?count*}", "?count=one&count=two&count=three"), ("{&count*}", "&count=one&count=two&count=three"),
+    # simple string expansion
+    ("{var}", "value"), ("{hello}", "Hello%20World%21"), ("{half}", "50%25"), ("O{empty}X", "OX"),
+    ("O{undef}X", "OX"), ("{x,y}", "1024,768"), ("{x,hello,y}", "1024,Hello%20World%21,768"),
+    ("?{x,empty}", "?1024,"), ("?{x,undef}", "?1024"), ("?{undef,y}", "?768"), ("{var:3}", "val"),
+    ("{var:30}", "value"), ("{list}", "red,green,blue"), ("{list*}", "red,green,blue"),
+    ("{keys}", "semi,%3B,dot,.,comma,%2C"), ("{keys*}", "semi=%3B,dot=.,comma=%2C"),
+    # reserved expansion
+    ("{+var}", "value"), ("{+hello}", "Hello%20World!"), ("{+half}", "50%25"),
+    ("{base}index", "http%3A%2F%2Fexample.com%2Fhome%2Findex"), ("{+base}index", "http://example.com/home/index"),
+    ("O{+empty}X", "OX"), ("O{+undef}X", "OX"), ("{+path}/here", "/foo/bar/here"),
+    ("here?ref={+path}", "here?ref=/foo/bar"), ("up{+path}{var}/here", "up/foo/barvalue/here"),
+    ("{+x,hello,y}", "1024,Hello%20World!,768"), ("{+path,x}/here", "/foo/bar,1024/here"),
+    ("{+path:6}/here", "/foo/b/here"), ("{+list}", "red,green,blue"), ("{+list*}", "red,green,blue"),
+    ("{+keys}", "semi,;,dot,.,comma,,"), ("{+keys*}", "semi=;,dot=.,comma=,"),
+    # fragment expansion
+    ("{#var}", "#value"), ("{#hello}", "#Hello%20World!"), ("{#half}", "#50%25"), ("foo{#empty}", "foo#"),
+    ("foo{#undef}", "foo"), ("{#x,hello,y}", "#1024,Hello%20World!,768"), ("{#path,x}/here", "#/foo/bar,1024/here"),
+    ("{#path:6}/here", "#/foo/b/here"), ("{#list}", "#red,green,blue"), ("{#list*}", "#red,green,blue"),
+    ("{#keys}", "#semi,;,dot,.,comma,,"), ("{#keys*}", "#semi=;,dot=.,comma=,"),
+    # label expansion
+    ("{.who}", ".fred"), ("{.who,who}", ".fred.fred"), ("{.half,who}", ".50%25.fred"), ("www{.dom*}", "www.example.com"),
+    ("X{.var}", "X.value"), ("X{.empty}", "X."), ("X{.undef}", "X"), ("X{.var:3}", "X.val"),
+    ("X{.list}", "X.red,green,blue"), ("X{.list*}", "X.red.green.blue"), ("X{.keys}", "X.semi,%3B,dot,.,comma,%2C"),
+    ("X{.keys*}", "X.semi=%3B.dot=..comma=%2C"), ("X{.empty_keys}", "X"), ("X{.empty_keys*}", "X"),
+    # path segment expansion
+    ("{/who}", "/fred"), ("{/who,who}", "/fred/fred"), ("{/half,who}", "/50%25/fred"), ("{/who,dub}", "/fred/me%2Ftoo"),
+    ("{/var}", "/value"), ("{/var,empty}", "/value/"), ("{/var,undef}", "/value"), ("{/var,x}/here", "/value/1024/here"),
+    ("{/var:1,var}", "/v/value"), ("{/list}", "/red,green,blue"), ("{/list*}", "/red/green/blue"),
+    ("{/list*,path:4}", "/red/green/blue/%2Ffoo"), ("{/keys}", "/semi,%3B,dot,.,comma,%2C"),
+    ("{/keys*}", "/semi=%3B/dot=./comma=%2C"),
+    # path style parameter expansion
+    ("{;who}", ";who=fred"), ("{;half}", ";half=50%25"), ("{;empty}", ";empty"), ("{;v,empty,who}", ";v=6;empty;who=fred"),
+    ("{;v,bar,who}", ";v=6;who=fred"), ("{;x,y}", ";x=1024;y=768"), ("{;x,y,empty}", ";x=1024;y=768;empty"),
+    ("{;x,y,undef}", ";x=1024;y=768"), ("{;hello:5}", ";hello=Hello"), ("{;list}", ";list=red,green,blue"),
+    ("{;list*}", ";list=red;list=green;list=blue"), ("{;keys}", ";keys=semi,%3B,dot,.,comma,%2C"),
+    ("{;keys*}", ";semi=%3B;dot=.;comma=%2C"),
+    # form style query expansion
+    ("{?who}", "?who=fred"), ("{?half}", "?half=50%25"), ("{?x,y}", "?x=1024&y=768"),
+    ("{?x,y,empty}", "?x=1024&y=768&empty="), ("{?x,y,undef}", "?x=1024&y=768"), ("{?var:3}", "?var=val"),
+    ("{?list}", "?list=red,green,blue"), ("{?list*}", "?list=red&list=green&list=blue"),
+    ("{?keys}", "?keys=semi,%3B,dot,.,comma,%2C"), ("{?keys*}", "?semi=%3B&dot=.&comma=%2C"),
+    # form style query continuation
+    ("{&who}", "&who=fred"), ("{&half}", "&half=50%25"), ("?fixed=yes{&x}", "?fixed=yes&x=1024"),
+    ("{&x,y,empty}", "&x=1024&y=768&empty="), ("{&var:3}", "&var=val"), ("{&list}", "&list=red,green,blue"),
+    ("{&list*}", "&list=red&list=green&list=blue"), ("{&keys}", "&keys=semi,%3B,dot,.,comma,%2C"),
+    ("{&keys*}", "&semi=%3B&dot=.&comma=%2C"),
+)
+
+
+class URITemplateTest(unittest.TestCase):
+
+    def test_rfc_examples(self):
+        for pattern, expected in EXAMPLES:
+            self.assertEqual(expected, uri_template(pattern).expand_to_string(VARIABLES), pattern)
+
+    def test_expanded_uri_components(self):
+        for prefix in ("http://example.com", "http://example.com/", "//example.com/", "/", "http://{who}.com",
+                       "https://user@{who}:8080{/var}", "relative/"):
+            for pattern, _ in EXAMPLES:
+                template = uri_template(prefix + pattern)
+                expanded = template.expand(VARIABLES)
+                parsed = uri(template.expand_to_string(VARIABLES))
+                self.assertEqual(str(parsed), str(expanded), template)
+                for name in ("scheme", "authority", "path", "query", "fragment", "hostname", "port", "segments"):
+                    self.assertEqual(getattr(parsed, name), getattr(expanded, name), "{0} of {1}".format(name, template))
+
+    def test_expand_keywords(self):
+        template = uri_template("https://api.example.com/v1/accounts/{id}/items{?cursor,limit}")
+        self.assertEqual("https://api.example.com/v1/accounts/42/items?limit=10", str(template.expand(id=42, limit=10)))
+        self.assertEqual("https://api.example.com/v1/accounts/42/items?cursor=c&limit=10",
+                         str(template.expand({"id": 42, "cursor": "c"}, limit=10)))
+        self.assertEqual(["id", "cursor", "limit"], template.variables)
+        self.assertEqual("https://api.example.com/v1/accounts/{id}/items{?cursor,limit}", str(template))
+
+    def test_non_ascii_value(self):
+        self.assertEqual("/caf%C3%A9", uri_template("/{name}").expand_to_string(name="café"))
+        self.assertEqual("/caf%C3%A9", uri_template("/{+name}").expand_to_string(name="café"))
+
+    def test_invalid_templates(self):
+        for pattern in ("/{unclosed", "/closed}", "/{}", "/{a{b}", "/{=a}", "/{a:0}", "/{a:10000}", "/{a:3*}",
+                        "/{a b}", "/{a..b}"):
+            self.assertRaises(IllegalArgumentError, uri_template, pattern)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(URITemplateTest)
+
+if __name__ == '__main__':
+    unittest.main()